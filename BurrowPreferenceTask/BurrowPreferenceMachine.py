@@ -1,11 +1,35 @@
 from LickBehaviorConfigurations import BurrowPreferenceConfig
-from threading import Thread
+from threading import Thread, Condition
+from heapq import heappush, heappop
 from transitions import Machine
 from time import time
 
 
 class BurrowPreferenceTask(Thread):
+    """
+    Burrow preference state machine
+
+    Runs as an event-driven scheduler: the thread sleeps on a condition until the earliest stage deadline (a heap of
+    stage ends) or until proceed_sync, saving_complete or start_run change, instead of polling the clock.
+    Transitions still only happen in sync with a DAQ buffer (proceed_sync).
+
+    Stage durations run on the wall clock by default. After use_sample_clock the clock is the DAQ sample count passed
+    to update_sample_clock with every buffer, and transitions are taken right there (in the caller's thread), so
+    stages begin exactly at buffer boundaries; the thread itself then only takes Saving -> End.
+    """
     def __init__(self, *args):
+        # Scheduling (created first, the flags below notify it)
+        self._condition = Condition()
+        self._deadlines = []  # heap of (stage end, stage)
+        self._proceed_sync = False
+        self._last_sync = float("-inf")  # last time a buffer synced (stage_time clock)
+        self._saving_complete = False
+        self._start_run = False
+        self._start_requested = float("-inf")
+        self.clock = "wall"  # "wall" or "samples"
+        self.samples = int()  # DAQ samples acquired (sample clock)
+        self.sampling_rate = None  # (units: Hz)
+
         # Passed from config
         if args:
             _config = args[0]
@@ -23,7 +47,6 @@ class BurrowPreferenceTask(Thread):
         # Internal
         self.proceed_sync = False
         self.start_run = False
-        self.stage_time = float()
 
         # Retract
         self.retract_start = float()
@@ -68,61 +91,163 @@ class BurrowPreferenceTask(Thread):
 
         Thread.__init__(self)
 
+    @property
+    def proceed_sync(self):
+        return self._proceed_sync
+
+    @proceed_sync.setter
+    def proceed_sync(self, Value):
+        with self._condition:
+            self._proceed_sync = Value
+            if Value:
+                self._last_sync = self.stage_time
+            self._condition.notify_all()
+
+    @property
+    def saving_complete(self):
+        return self._saving_complete
+
+    @saving_complete.setter
+    def saving_complete(self, Value):
+        with self._condition:
+            self._saving_complete = Value
+            self._condition.notify_all()
+
+    @property
+    def start_run(self):
+        return self._start_run
+
+    @start_run.setter
+    def start_run(self, Value):
+        with self._condition:
+            self._start_run = Value
+            if Value:
+                self._start_requested = self.stage_time
+            self._condition.notify_all()
+
+    @property
+    def stage_time(self):
+        """
+        Current time on the clock stage deadlines are measured with (units: s)
+
+        :rtype: float
+        """
+        if self.clock == "samples":
+            return self.samples / self.sampling_rate
+        return time()
+
+    def use_sample_clock(self, SamplingRate):
+        """
+        Measure stage durations on the DAQ sample count instead of the wall clock (call before starting)
+
+        :param SamplingRate: DAQ sampling rate (units: Hz)
+        :rtype: None
+        """
+        self.sampling_rate = SamplingRate
+        self.clock = "samples"
+
+    def update_sample_clock(self, Samples):
+        """
+        Advance the sample clock & take any transition due (called in sync with a DAQ buffer)
+
+        :param Samples: DAQ samples acquired before the buffer being handled
+        :rtype: None
+        """
+        with self._condition:
+            self.samples = Samples
+            if self.clock == "samples":
+                while self.state not in ('Saving', 'End') and self.allowedToProceed():
+                    self.advance()
+            self._condition.notify_all()
+
     def run(self):
-        while True:
-            if self.state is 'Setup':
-                if self.start_run:
-                    # print("Transitioning from Setup to Retract\n")
-                    self.startBehavior()
-            elif self.state is 'Retract':
-                self.stage_time = time()
-                if self.checkStageTime(self.stage_time, self.retract_end):
-                    # print("Transitioning from Retraction to Habituation\n")
-                    self.graduateRetraction()
-            elif self.state is 'Habituation':
-                self.stage_time = time()
-                if self.checkStageTime(self.stage_time, self.hab_end):
-                    self.habituation_complete = True
-                    # print("Transitioning from Habituation to Release\n")
-                    self.graduateHabituation()
-            elif self.state is 'Release':
-                self.stage_time = time()
-                if self.checkStageTime(self.stage_time, self.release_end):
-                    # print("Transitioning from Release to Preference\n")
-                    self.graduateRelease()
-            elif self.state is 'PreferenceTest':
-                self.stage_time = time()
-                if self.checkStageTime(self.stage_time, self.pref_end):
-                    self.preference_complete = True
-                    # print("Transitioning from Preference to Saving\n")
-                    self.graduatePreference()
-            elif self.state is 'Saving':
-                if self.saving_complete:
-                    # print("Transitioning from Saving to End\n")
-                    self.finishedSaving()
-            elif self.state is 'End':
-                self.start_run = False
-                # print("Ending...")
-                return
+        with self._condition:
+            while self.state != 'End':
+                if (self.clock == "wall" and self.allowedToProceed()) or \
+                        (self.state == 'Saving' and self._saving_complete):
+                    self.advance()
+                else:
+                    self._condition.wait(self._timeout())
+            self._start_run = False
+            # print("Ending...")
+
+    def advance(self):
+        # Take the transition out of the current state
+        if self.state == 'Setup':
+            # print("Transitioning from Setup to Retract\n")
+            self.startBehavior()
+        elif self.state == 'Saving':
+            # print("Transitioning from Saving to End\n")
+            self.finishedSaving()
+        else:
+            self.graduate()
+            heappop(self._deadlines)  # The stage just left (earlier than the deadline of the stage just entered)
+
+    def graduate(self):
+        # Leave the current timed stage
+        if self.state == 'Retract':
+            # print("Transitioning from Retraction to Habituation\n")
+            self.graduateRetraction()
+        elif self.state == 'Habituation':
+            self.habituation_complete = True
+            # print("Transitioning from Habituation to Release\n")
+            self.graduateHabituation()
+        elif self.state == 'Release':
+            # print("Transitioning from Release to Preference\n")
+            self.graduateRelease()
+        elif self.state == 'PreferenceTest':
+            self.preference_complete = True
+            # print("Transitioning from Preference to Saving\n")
+            self.graduatePreference()
+
+    def schedule(self, Deadline, Stage):
+        """
+        Push the end of a stage onto the deadline heap
+
+        :param Deadline: stage end (units: s, on the stage_time clock)
+        :param Stage: stage ending at the deadline
+        :rtype: None
+        """
+        heappush(self._deadlines, (Deadline, Stage))
 
     def allowedToProceed(self):
-        return self.proceed_sync
+        # Only proceed in sync with a DAQ buffer (one handled after the stage ended or the run was started)
+        if self.state == 'Setup':
+            return self._start_run and self._synced_since(self._start_requested)
+        if self.state == 'Saving' or not self._deadlines:
+            return False
+        _deadline = self._deadlines[0][0]
+        return self.checkStageTime(self.stage_time, _deadline) and self._synced_since(_deadline)
+
+    def _synced_since(self, Time):
+        return self._proceed_sync or self._last_sync >= Time
+
+    def _timeout(self):
+        # Sleep until the current stage ends; otherwise until a flag changes (or the sample clock moves)
+        if self.clock == "samples" or self.state in ('Setup', 'Saving') or not self._deadlines:
+            return None
+        _remaining = self._deadlines[0][0] - self.stage_time
+        return _remaining if _remaining > 0 else None
 
     def initializeHabituation(self):
-        self.hab_start = time()
+        self.hab_start = self.stage_time
         self.hab_end = self.hab_start + self.habituation_duration
+        self.schedule(self.hab_end, "Habituation")
 
     def initializePreference(self):
-        self.pref_start = time()
+        self.pref_start = self.stage_time
         self.pref_end = self.pref_start + self.behavior_duration
+        self.schedule(self.pref_end, "PreferenceTest")
 
     def initializeRetract(self):
-        self.retract_start = time()
+        self.retract_start = self.stage_time
         self.retract_end = self.retract_start + self.retract_duration
+        self.schedule(self.retract_end, "Retract")
 
     def initializeRelease(self):
-        self.release_start = time()
+        self.release_start = self.stage_time
         self.release_end = self.release_start + self.release_duration
+        self.schedule(self.release_end, "Release")
 
     @staticmethod
     def checkStageTime(stagetime, stageend):
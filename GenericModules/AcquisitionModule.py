@@ -0,0 +1,407 @@
+from GenericModules.DAQBackend import *
+from HardwareConfiguration import HardConfig
+from GenericModules.SaveModule import Saver, Pickler, session_store, digital_store, save_scaling, DigitalEdges, \
+    PackedDigitalSaver, PackedDigital
+from GenericModules.BufferModule import SessionBuffer, expected_buffers
+from GenericModules.MetadataModule import CodeTable, buffer_record_dtype
+from GenericModules.PipelineModule import BufferPipeline
+from GenericModules.LatencyModule import CallbackInstrumentation
+from GenericModules.SyncModule import FrameSyncTable
+from GenericModules.ContainerModule import SessionContainer
+
+from ctypes import byref, create_string_buffer
+from os import path
+from time import perf_counter_ns
+import numpy as np
+
+global DAQmx_Val_RSE, DAQmx_Val_Volts, DAQmx_Val_Rising, DAQmx_Val_ContSamps, DAQmx_Val_Acquired_Into_Buffer
+global DAQmx_Val_GroupByScanNumber  # These are globals for the DAQ Interface & all globals are scary!
+
+
+class BufferView:
+    """
+    One acquired buffer as handed to AcquisitionEngine.on_buffer
+
+    Everything is a view into the session slots, nothing is copied.
+
+    index: buffer index within the session
+    analog: (channels, samples) analog data, volts (or raw int16 counts, see analog_scaling)
+    digital: one (channels, samples) array (or (samples, ) for port reads) per digital input, in the order added
+    record: the buffer's metadata record (see MetadataModule)
+    """
+    __slots__ = ("index", "analog", "digital", "record")
+
+    def __init__(self, Index, Analog, Digital, Record):
+        self.index = Index
+        self.analog = Analog
+        self.digital = Digital
+        self.record = Record
+
+
+class AcquisitionEngine(Task):
+    """
+    Master-clock analog acquisition shared by all assays
+
+    Owns the analog input task (the master clock), the digital inputs read alongside it, preallocated session buffers,
+    persistence during acquisition, the processing thread & latency instrumentation. The DAQ callback reads straight
+    into the next session slots (interleaved, so a slot is the contiguous (samples, channels) target of the read) and
+    neither allocates nor copies; everything else runs on the processing thread, which hands each buffer to on_buffer.
+
+    An assay subclasses the engine, sets up its own outputs & digital inputs, then prepares the session:
+
+        AcquisitionEngine.__init__(self, States, Spouts)
+        ...self.add_task(...) / self.add_digital_input(...)...
+        self.prepare_session(DataPath, SessionDuration)
+
+    and implements on_buffer(View). The state, spout & trial of each buffer are recorded from current_state,
+    current_spout & current_trial when the buffer is handed over (on_buffer may update View.record).
+    """
+    def __init__(self, States, Spouts=()):
+        Task.__init__(self)
+
+        # Import Hardware Configuration
+        self.hardware_config = HardConfig()
+        _hardware_config = self.hardware_config
+
+        # Session Descriptors (recorded for every buffer)
+        self.states = list(States)
+        self.current_state = None
+        self.current_spout = None
+        self.current_trial = 0
+        self.state_codes = CodeTable(self.states)
+        self.spout_codes = CodeTable(Spouts)
+
+        # Setup DAQ - General DAQ Parameters - Put into class because might be iterated on
+        self.timeout = _hardware_config.timeout  # timeout parameter must be type floating 64 (units: seconds, double)
+        self.sampling_rate = _hardware_config.sampling_rate  # DAQ sampling rate (units: Hz, integer)
+        self.buffer_time = _hardware_config.buffer_time  # DAQ buffering time (units: ms, integer)
+        self.buffers_per_second = _hardware_config.buffers_per_second  # DAQ buffers each second (units: Hz, round integer)
+        # Samples per Buffer (units: samples, round integer) (Comment for below)
+        self.buffer_size = _hardware_config.buffer_size
+        self.totNumBuffers = int()  # integer record of number of buffers collected (running)
+
+        # Setup DAQ - Analog Inputs ( Multi-Channel Matrix with Single Grab, Master Clock!!! )
+        self.DAQAnalogInBuffer = np.tile(np.zeros((self.buffer_size,), dtype=np.float64),
+                                         (_hardware_config.num_analog_in, 1))
+        self.numSamplesPerBlock = np.uint32(_hardware_config.num_analog_in * self.buffer_size)
+        self.voltage_range_in = _hardware_config.analog_voltage_range
+        self.units = int32()  # read units (type 32b integer, this implies default units)
+        self.analog_storage = _hardware_config.analog_storage  # "float64" (volts) or "int16" (raw ADC counts)
+        self.CreateAIVoltageChan(_hardware_config.analog_chans_in, "Analog In", DAQmx_Val_RSE, self.voltage_range_in[0],
+                                 self.voltage_range_in[1], DAQmx_Val_Volts, None)
+        # RSE is reference single-ended, Val_Volts flags voltage units
+        self.CfgSampClkTiming("", self.sampling_rate, DAQmx_Val_Rising, DAQmx_Val_ContSamps, self.buffer_size)
+        # Val rising means on the rising edge, cont samps is continuous sampling
+        self.AutoRegisterEveryNSamplesEvent(DAQmx_Val_Acquired_Into_Buffer, self.buffer_size, 0, name='EveryNCallback')
+        # Callback every buffer_size over time = buffer_size*sampling_rate
+        self.AutoRegisterDoneEvent(0, name='DoneCallback')  # Flag Callback Executed
+
+        # Auxiliary Tasks (started after & stopped before the master clock) & Digital Inputs
+        self.tasks = []
+        self.digital_inputs = []  # (read callable, slot shape, data type, file name)
+
+        # Passed Data Variables
+        self.grabbedAnalogBuffer = self.DAQAnalogInBuffer.copy()
+
+        # DAQ Callback Tracking (latency histograms per stage & overrun flag)
+        self.instrumentation = CallbackInstrumentation(self.buffer_time)
+        self.session_saved = False
+
+    def add_task(self, AuxiliaryTask):
+        """
+        Register an output or input task started, stopped & cleared with the master clock
+
+        :rtype: Task
+        """
+        self.tasks.append(AuxiliaryTask)
+        return AuxiliaryTask
+
+    def add_digital_input(self, Reader, Read, SlotShape, DataType=np.uint8, Name="digital"):
+        """
+        Register a digital input read in the DAQ callback & persisted alongside the analog data
+
+        :param Reader: the task (registered with add_task)
+        :param Read: callable reading one buffer into the C-contiguous array it is passed (the next session slot)
+        :param SlotShape: shape of one buffer, (samples, channels) or (samples, ) for port reads
+        :param DataType: data type of the read
+        :param Name: file name of the persisted data (without extension)
+        :rtype: None
+        """
+        self.add_task(Reader)
+        self.digital_inputs.append((Read, tuple(SlotShape), np.dtype(DataType), Name))
+
+    def prepare_session(self, DataPath, SessionDuration):
+        """
+        Preallocate the session buffers, savers & processing thread (after all digital inputs are added)
+
+        :param DataPath: folder the session is saved to
+        :param SessionDuration: expected duration of the session (units: s)
+        :rtype: None
+        """
+        _hardware_config = self.hardware_config
+        self.data_path = DataPath
+
+        # Prep Data Buffers - Preallocated for the expected session & grown in chunks (one slot per buffer)
+        _expected_buffers = expected_buffers(SessionDuration, self.buffers_per_second)
+        _chunk_buffers = expected_buffers(_hardware_config.session_chunk_duration, self.buffers_per_second)
+        _ring_buffers = expected_buffers(_hardware_config.digital_ring_duration, self.buffers_per_second)
+        # Slots are (samples, channels) so the saved session is a (channels, samples) view without copying
+        # Analog & digital data are persisted during acquisition (streamed or memory-mapped, see HardConfig)
+        # Raw int16 counts are read with ReadBinaryI16 & their scaling saved alongside (see SaveModule.load_analog)
+        _raw_analog = self.analog_storage == "int16"
+        self._read_analog = self.ReadBinaryI16 if _raw_analog else self.ReadAnalogF64
+        self.bufferedAnalogDataToSave, self.save_module_analog = session_store(
+            _hardware_config.session_storage, DataPath + "\\analog.npy",
+            (self.buffer_size, _hardware_config.num_analog_in), np.int16 if _raw_analog else np.float64,
+            _expected_buffers, _chunk_buffers)
+        if _raw_analog:
+            save_scaling(DataPath + "\\analog.npy", self.analog_scaling())
+        self.bufferedDigitalDataToSave = []
+        self.save_modules_digital = []
+        for _read, _slot_shape, _data_type, _name in self.digital_inputs:
+            _buffer, _saver = digital_store(_hardware_config.session_storage, _hardware_config.digital_storage,
+                                            "".join([DataPath, "\\", _name, ".npy"]), _slot_shape, _data_type,
+                                            _expected_buffers, _chunk_buffers, _ring_buffers)
+            self.bufferedDigitalDataToSave.append(_buffer)
+            self.save_modules_digital.append(_saver)
+        # One compact record (buffer, state code, spout code, trial, timestamp) per buffer
+        self.bufferedMetadataToSave = SessionBuffer((), buffer_record_dtype, _expected_buffers, _chunk_buffers)
+
+        self.save_module_metadata = Saver()
+        self.save_module_metadata.filename = DataPath + "\\metadata.npy"
+        self.save_module_codes = Pickler()
+        self.save_module_codes.filename = DataPath + "\\metadata_codes"
+        self.save_module_pipeline = Pickler()
+        self.save_module_pipeline.filename = DataPath + "\\pipeline_stats"
+        self.latency_report_filename = DataPath + "\\latency_report.txt"
+        self.frame_sync_filename = DataPath + "\\frame_sync.npz"
+        self.container_filename = DataPath + "\\session.bin"
+
+        # We don't care enough let's just keep the attribute space clean for coding purposes
+        _save_module_hardware = Pickler()
+        _save_module_hardware.filename = DataPath + "\\hardware_config"
+        _save_module_hardware.pickledPickles = _hardware_config
+        _ = _save_module_hardware.timeToSave()
+
+        # Leading placeholder buffer keeps saved sessions aligned with previous recordings
+        self.save_module_analog.put(self.bufferedAnalogDataToSave.write(self.DAQAnalogInBuffer.T))
+        for _buffer, _saver in zip(self.bufferedDigitalDataToSave, self.save_modules_digital):
+            _saver.put(_buffer.next_slot())
+        self.bufferedMetadataToSave.write((0, 0, 0, 0, perf_counter_ns()))
+
+        # Processing Thread (everything but the hardware reads happens off the DAQ callback)
+        self.pipeline = BufferPipeline(self.process_buffer, self.buffer_time)
+        self._digital_reads = tuple(zip([_input[0] for _input in self.digital_inputs], self.bufferedDigitalDataToSave))
+
+    def analog_scaling(self):
+        """
+        Per-channel polynomial coefficients the driver scales raw ADC counts with, volts = sum(c[i] * counts ** i)
+
+        :returns: (channels, 4) coefficients, in the order of the analog channels
+        :rtype: numpy.ndarray
+        """
+        _names = create_string_buffer(4096)
+        self.GetTaskChannels(_names, 4096)
+        _channels = [_name.strip() for _name in _names.value.decode().split(",")]
+        _coefficients = np.zeros((_channels.__len__(), 4), dtype=np.float64)
+        for _row, _channel in enumerate(_channels):
+            self.GetAIDevScalingCoeff(_channel, _coefficients[_row], 4)
+        return _coefficients
+
+    def EveryNCallback(self):
+        # Only hardware reads into the next session slots here, the processing thread handles the rest
+        _timestamp = self.instrumentation.callback_started()
+        _index = self.bufferedAnalogDataToSave.__len__()
+
+        # Claim the next slots (no copy: the reads below fill them in place)
+        _analog_slot = self.bufferedAnalogDataToSave.next_slot()
+        _lap = self.instrumentation.lap("copy", _timestamp)
+
+        # Read Analog Inputs, interleaved so samples land as (samples, channels)
+        self._read_analog(self.buffer_size, self.timeout, DAQmx_Val_GroupByScanNumber, _analog_slot,
+                          self.numSamplesPerBlock, byref(self.units), None)
+
+        # Read Digital Inputs
+        for _read, _buffer in self._digital_reads:
+            _read(_buffer.next_slot())
+        _ = self.instrumentation.lap("read", _lap)
+
+        _record = self.bufferedMetadataToSave.next_slot()
+        _record["buffer"] = _index
+        _record["timestamp"] = _timestamp
+
+        # Count Total Buffers
+        self.totNumBuffers += 1
+
+        self.pipeline.submit(_index)
+        self.instrumentation.callback_finished(_timestamp)
+
+        return 0
+
+    def process_buffer(self, Index):
+        # Runs on the processing thread, once per buffer & in order
+        _start = perf_counter_ns()
+        _view = BufferView(Index, self.bufferedAnalogDataToSave.slot(Index).T,
+                           tuple(_buffer.slot(Index).T for _buffer in self.bufferedDigitalDataToSave),
+                           self.bufferedMetadataToSave.slot(Index))
+        self.grabbedAnalogBuffer = _view.analog
+
+        _view.record["state"] = self.state_codes.code(self.current_state)
+        _view.record["spout"] = self.spout_codes.code(self.current_spout)
+        _view.record["trial"] = self.current_trial
+
+        self.on_buffer(_view)
+
+        # Export (unless the session was saved while handling this buffer)
+        if not self.session_saved:
+            _lap = perf_counter_ns()
+            self.save_module_analog.put(self.bufferedAnalogDataToSave.slot(Index))
+            for _buffer, _saver in zip(self.bufferedDigitalDataToSave, self.save_modules_digital):
+                _saver.put(_buffer.slot(Index))
+            _ = self.instrumentation.lap("append", _lap)
+        _ = self.instrumentation.lap("process", _start)
+
+    def on_buffer(self, View):
+        """
+        Assay-specific handling of one buffer (runs on the processing thread, once per buffer & in order)
+
+        :param View: BufferView of the buffer
+        :rtype: None
+        """
+        return
+
+    @staticmethod
+    def DoneCallback(status):
+        print("Status ", status.value)  # Not sure why we print but that's fine
+        return 0
+
+    def startAcquisition(self):
+        # Analog & Digital Savers
+        self.save_module_analog.start()
+        for _saver in self.save_modules_digital:
+            _saver.start()
+        self.pipeline.start()
+        self.StartTask()  # Analog Inputs (Master Clock!!!)
+        for _task in self.tasks:
+            _task.StartTask()
+
+    def stopDAQ(self):
+        for _task in self.tasks:
+            _task.StopTask()
+        self.StopTask()
+
+    def clearDAQ(self):
+        for _task in self.tasks:
+            _task.StopTask()
+            _task.ClearTask()
+        self.StopTask()
+        self.ClearTask()
+
+    def save_session(self):
+        """
+        Stop processing & persist the acquired session (data, metadata, pipeline statistics & latency report)
+
+        :rtype: None
+        """
+        self.pipeline.stop()
+        self.session_saved = True
+
+        print("Saving Analog Data...")
+        _ = self.save_module_analog.timeToSave()  # Closes the persisted file
+
+        print("Saving Digital Data...")
+        for _saver in self.save_modules_digital:
+            _ = _saver.timeToSave()  # Closes the persisted file
+
+        print("Saving Metadata...")
+        self.save_module_metadata.bufferedData = self.bufferedMetadataToSave.data
+        _ = self.save_module_metadata.timeToSave()
+        self.save_module_codes.pickledPickles = {"state": self.state_codes.as_dict(),
+                                                 "spout": self.spout_codes.as_dict()}
+        _ = self.save_module_codes.timeToSave()
+
+        print("Saving Pipeline Statistics...")
+        self.save_module_pipeline.pickledPickles = self.pipeline.report()
+        _ = self.save_module_pipeline.timeToSave()
+
+        print("Saving Latency Report...")
+        self.instrumentation.write_report(self.latency_report_filename)
+        if self.instrumentation.overrun:
+            print("".join(["Warning: ", str(self.instrumentation.overrun_buffers), " DAQ callbacks overran"]))
+
+    def save_frame_sync(self, Cameras):
+        """
+        Map the recorded frames of every camera to DAQ sample indices & save the sync table (after the cameras saved)
+
+        :param Cameras: camera name -> file prefix of its saved frame times
+        :rtype: FrameSyncTable
+        """
+        print("Saving Frame Sync Table...")
+        _table = FrameSyncTable.from_records(self.bufferedMetadataToSave.data, self.buffer_size, self.sampling_rate)
+        for _camera, _file_prefix in Cameras.items():
+            if path.exists(_file_prefix + "_FrameTimes.npy"):
+                _table.add_camera(_camera, np.load(_file_prefix + "_FrameTimes.npy"))
+        _table.save(self.frame_sync_filename)
+        return _table
+
+    def pack_session(self, Objects=None, Cameras=None):
+        """
+        Gather the saved session into one chunked container (session.bin, see ContainerModule), after everything saved
+
+        Datasets: analog (samples, channels), every digital input as read (samples, channels) or (samples, ) with the
+        edges of edge-encoded inputs (<name>/rising/<channel> & <name>/falling/<channel>), per-buffer metadata, the
+        frame sync table & per-camera frame IDs, buffer IDs, grab times & motion energy. Objects: metadata codes,
+        pipeline statistics, hardware configuration & the Objects given (e.g., the behavior configuration).
+
+        Does nothing unless HardConfig.session_container is set: packing re-reads the whole session once saved & keeps
+        the separate files, so it costs time at the end of the session & twice the disk space.
+
+        :param Objects: name -> picklable object saved with the session
+        :param Cameras: camera name -> file prefix of its saved frames
+        :rtype: None
+        """
+        _hardware_config = self.hardware_config
+        if not _hardware_config.session_container:
+            return
+        print("Packing Session Container...")
+        _chunk_samples = int(_hardware_config.container_chunk_duration * self.sampling_rate)
+        _chunk_buffers = int(_hardware_config.container_chunk_duration * self.buffers_per_second)
+        with SessionContainer(self.container_filename, _hardware_config.session_compression) as _container:
+            _attributes = {"channels": _hardware_config.analog_chans_in}
+            if self.analog_storage == "int16":
+                _attributes["scaling"] = self.analog_scaling()
+            _container.write_dataset("analog", np.load(self.save_module_analog.filename, mmap_mode="r").T,
+                                     _chunk_samples, self.sampling_rate, _attributes)
+            for (_, _slot_shape, _data_type, _name), _saver in zip(self.digital_inputs, self.save_modules_digital):
+                if isinstance(_saver, (PackedDigitalSaver, DigitalEdges)):
+                    # Expanded chunk by chunk, the session is never expanded whole
+                    _lines = PackedDigital(_saver.filename) if isinstance(_saver, PackedDigitalSaver) else _saver
+                    _container.create_dataset(_name, _slot_shape[1:], _data_type, _chunk_samples, self.sampling_rate)
+                    for _start in range(0, _lines.__len__(), _chunk_samples):
+                        _container.append(_name, _lines.unpack(_start, _start + _chunk_samples).T.reshape(
+                            -1, *_slot_shape[1:]))
+                else:
+                    _container.write_dataset(_name, np.load(_saver.filename, mmap_mode="r").T, _chunk_samples,
+                                             self.sampling_rate)
+                if isinstance(_saver, DigitalEdges):
+                    for _channel in range(_saver.num_channels):
+                        _rising, _falling = _saver.edges(_channel)
+                        _container.write_dataset("".join([_name, "/rising/", str(_channel)]), _rising, 4096)
+                        _container.write_dataset("".join([_name, "/falling/", str(_channel)]), _falling, 4096)
+            _container.write_dataset("metadata", self.bufferedMetadataToSave.data, _chunk_buffers,
+                                     self.buffers_per_second)
+            if path.exists(self.frame_sync_filename):
+                _table = FrameSyncTable.load(self.frame_sync_filename)
+                _container.write_object("frame_sync", _table)
+            for _camera, _file_prefix in (Cameras or {}).items():
+                for _suffix, _dataset in (("_FramesIDS.npy", "frame_ids"), ("_BufferIDs.npy", "buffer_ids"),
+                                          ("_FrameTimes.npy", "frame_times"), ("_MotionEnergy.npy", "motion_energy")):
+                    if path.exists(_file_prefix + _suffix):
+                        _container.write_dataset("".join([_camera, "/", _dataset]),
+                                                 np.load(_file_prefix + _suffix, mmap_mode="r"), 65536)
+            _container.write_object("metadata_codes", {"state": self.state_codes.as_dict(),
+                                                       "spout": self.spout_codes.as_dict()})
+            _container.write_object("pipeline_stats", self.pipeline.report())
+            _container.write_object("hardware_config", _hardware_config)
+            for _name, _object in (Objects or {}).items():
+                _container.write_object(_name, _object)
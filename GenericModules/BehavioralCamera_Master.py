@@ -2,8 +2,11 @@ import numpy as np
 import cv2 as cv
 from time import time
 from threading import Thread
+from multiprocessing import Process, Queue
 import imageio
 from GenericModules.BehavioralCamera_Slave import BehavCam
+from GenericModules.BufferModule import SharedFrameRing
+from GenericModules.FrameModule import reduced_shape
 
 
 class BehavCamMaster:
@@ -18,18 +21,133 @@ class BehavCamMaster:
         self.cam_2 = None
         self.cam_1_started = False
         self.cam_2_started = False
+        self.process_cameras = False  # run each camera in its own process (see CameraProcess)
+        self.rois = {}  # window name -> (x, y, width, height) kept for recording (see BehavCam.roi)
+        self.binning = {}  # window name -> mean binning (1, 2 or 4)
+        self.motion_rois = {}  # window name -> regions to trace motion energy in (see BehavCam.motion_rois)
 
     def start(self):
         if not self.cam_1_started:
-            self.cam_1 = BehavCam(self.device_id_1, self.height_1, self.width_1, "CAM1")
+            self.cam_1 = self.create_camera(self.device_id_1, self.height_1, self.width_1, "CAM1", True)
             self.cam_1.isRunning1 = True
             self.cam_1.start()
 
         if not self.cam_2_started:
-            self.cam_2 = BehavCam(self.device_id_2, self.height_2, self.width_2, "CAM2")
+            self.cam_2 = self.create_camera(self.device_id_2, self.height_2, self.width_2, "CAM2", False)
             self.cam_2.isRunning2 = True
             self.cam_2.start()
 
+    def create_camera(self, DeviceID, Height, Width, WindowName, Gray):
+        _cam = create_camera(DeviceID, Height, Width, WindowName, Gray, self.process_cameras,
+                             self.rois.get(WindowName), self.binning.get(WindowName, 1))
+        _cam.motion_rois = self.motion_rois.get(WindowName)
+        return _cam
+
+
+def create_camera(DeviceID, Height, Width, WindowName, Gray=False, OwnProcess=False, ROI=None, Binning=1):
+    """
+    BehavCam (thread) or CameraProcess with its region of interest & binning
+
+    :rtype: BehavCam or CameraProcess
+    """
+    if OwnProcess:
+        return CameraProcess(DeviceID, Height, Width, WindowName, Gray, ROI=ROI, Binning=Binning)
+    _cam = BehavCam(DeviceID, Height, Width, WindowName)
+    _cam.roi = ROI
+    _cam.binning = Binning
+    return _cam
+
+
+class CameraProcess:
+    """
+    Parent-side handle of a BehavCam running in its own process
+
+    Capture, conversion, preview & recording all happen in the camera process, away from the GIL of the acquisition
+    thread. The parent only sends small control messages: setting any of the BehavCam attributes below (recording
+    flag, current trial & buffer, file prefix, ...) forwards the new value, unchanged values are not resent. Captured
+    frames are published to a SharedFrameRing the parent reads without copies between processes (latest_frame).
+    Until set, the forwarded attributes read the BehavCam defaults (forwarded_defaults).
+    """
+    def __init__(self, deviceID, height, width, window_name, Gray=False, RingSlots=8, ROI=None, Binning=1):
+        self.window_name = window_name
+        self.ring = SharedFrameRing(reduced_shape((height, width) if Gray else (height, width, 3), ROI, Binning),
+                                    RingSlots)
+        self.commands = Queue()
+        self.results = Queue()
+        self.process = Process(target=run_camera_process, args=(deviceID, height, width, window_name, self.ring.name,
+                                                                 self.ring.frame_shape, self.ring.slots,
+                                                                 self.commands, self.results), daemon=True)
+        self.settings = dict(forwarded_defaults)  # the camera process starts from the same BehavCam defaults
+        self.report = None  # frame rates & timing returned by the camera process when saved
+        self.unsaved = True
+        self.roi = ROI
+        self.binning = Binning
+
+    def start(self):
+        self.process.start()
+        self.commands.put(("start", ))
+
+    def latest_frame(self, Out=None):
+        """
+        Newest captured frame & its (frame number, grab time, buffer id), see SharedFrameRing.latest
+
+        :rtype: tuple
+        """
+        return self.ring.latest(Out)
+
+    def save_data(self):
+        if self.unsaved:
+            self.commands.put(("save", ))
+            _, self.report = self.results.get()
+            self.process.join()
+            self.ring.close()
+            self.ring.unlink()
+            self.unsaved = False
+
+
+def _forwarded(Name):
+    def _get(self):
+        return self.settings[Name]
+
+    def _set(self, Value):
+        if Name not in self.settings or self.settings[Name] != Value:
+            self.settings[Name] = Value
+            self.commands.put(("set", Name, Value))
+    return property(_get, _set)
+
+
+# BehavCam attributes forwarded by CameraProcess & their defaults (as set in BehavCam.__init__)
+forwarded_defaults = {"is_recording_time": False, "shutdown_mode": False, "isRunning1": False, "isRunning2": False,
+                      "currentTrial": 1, "currentBuffer": int(), "file_prefix": "C:\\Users\\YUSTE\\Desktop\\",
+                      "frame_rate": 30.0, "recording_format": "video", "video_backend": "opencv", "video_codec": "FFV1",
+                      "video_quality": None, "chunk_duration": 60.0, "headless": False, "preview_rate": 10.0,
+                      "preview_scale": 1.0, "roi": None, "binning": 1, "motion_rois": None, "motion_downsample": 4}
+
+for _name in forwarded_defaults:
+    setattr(CameraProcess, _name, _forwarded(_name))
+
+
+def run_camera_process(DeviceID, Height, Width, WindowName, RingName, FrameShape, RingSlots, Commands, Results):
+    """
+    Entry point of a camera process: applies forwarded settings to its BehavCam until asked to save
+
+    :rtype: None
+    """
+    _ring = SharedFrameRing(FrameShape, RingSlots, Name=RingName)
+    _cam = BehavCam(DeviceID, Height, Width, WindowName)
+    _cam.ring = _ring
+    while True:
+        _command = Commands.get()
+        if _command[0] == "set":
+            setattr(_cam, _command[1], _command[2])
+        elif _command[0] == "start":
+            _cam.start()
+        elif _command[0] == "save":
+            _cam.save_data()
+            _cam.ring = None
+            Results.put(("saved", {"frame_rates": _cam.frame_rates(), "timing": _cam.frame_timing.report()}))
+            break
+    _ring.close()
 
 
 if __name__ == '__main__':
@@ -1,8 +1,77 @@
 import cv2 as cv
 import numpy as np
-from time import time
-from threading import Thread
+from time import time, perf_counter, perf_counter_ns, sleep
+from threading import Thread, Event
 import imageio
+from GenericModules.SaveModule import FrameStore, JPEGStore
+from GenericModules.VideoModule import VideoEncoder
+from GenericModules.LatencyModule import RateCounter, FrameTiming
+from GenericModules.FrameModule import crop_frame, bin_frame, MotionEnergy
+
+
+class CameraPreview(Thread):
+    """
+    Display stage of a camera, decoupled from capture
+
+    The capture loop only hands over its latest frame; this thread owns the window and redraws at most Rate times a
+    second (optionally downscaled), so GUI redraws never hold up acquisition. Frames handed over between redraws are
+    skipped, compressed (MJPEG passthrough) frames are only decoded when drawn.
+    """
+    def __init__(self, WindowName, Rate=10.0, Scale=1.0):
+        Thread.__init__(self, daemon=True)
+        # Collect
+        self.window_name = WindowName
+        self.period = 1 / Rate  # (units: s)
+        self.scale = Scale
+
+        # Running
+        self.running = True
+        self.fps = RateCounter()
+        self._latest = None
+        self._new_frame = Event()
+
+    def show(self, Frame, Decode=None):
+        """
+        Hand over the latest frame (called from the capture loop, never blocks)
+
+        :param Frame: frame or compressed payload
+        :param Decode: cv.IMREAD_* flag when Frame is a compressed payload
+        :rtype: None
+        """
+        self._latest = (Frame, Decode)
+        self._new_frame.set()
+
+    def run(self):
+        cv.namedWindow(self.window_name, cv.WINDOW_NORMAL)
+        _next = perf_counter()
+        while self.running:
+            if not self._new_frame.wait(timeout=self.period):
+                cv.waitKey(1) & 0xFF  # Keep the window responsive
+                continue
+            self._new_frame.clear()
+            _frame, _decode = self._latest
+            if _decode is not None:
+                _frame = cv.imdecode(_frame, _decode)
+            if _frame is not None:
+                if self.scale != 1.0:
+                    _frame = cv.resize(_frame, None, fx=self.scale, fy=self.scale, interpolation=cv.INTER_AREA)
+                cv.imshow(self.window_name, _frame)
+                self.fps.tick()
+            cv.waitKey(1) & 0xFF
+            _next += self.period
+            _wait = _next - perf_counter()
+            if _wait > 0:
+                sleep(_wait)
+            else:
+                _next = perf_counter()
+        cv.destroyWindow(self.window_name)
+        cv.waitKey(1) & 0xFF
+
+    def stop(self):
+        self.running = False
+        self._new_frame.set()
+        if self.is_alive():
+            self.join()
 
 
 class BehavCam(Thread):
@@ -20,9 +89,34 @@ class BehavCam(Thread):
         self.is_recording_time = False
         self.shutdown_mode = False
         self.isTrial = False
-        self.runFrames = []
-        self.runFramesIDs = []
+        self.frame_rate = 30.0
+        self.roi = None  # (x, y, width, height) of the sensor kept for preview & recording, None keeps everything
+        self.binning = 1  # mean binning of the kept region (1, 2 or 4; not applied to mjpeg payloads)
+        self.motion_rois = None  # regions of recorded frames to trace motion energy in ([None] is the whole frame)
+        self.motion_downsample = 4
+        self.motion_energy = None  # MotionEnergy; motion_energy.recent(Seconds) feeds the GUI
+        self.sensor_shape = (height, width)  # frame size the camera actually delivers, read back once opened
+        self.recording_format = "video"  # "video" encodes while recording, "frames" keeps raw frames, "mjpeg" keeps
+        # the camera's own JPEG payloads without decoding them
+        self.passthrough_shape = None
+        self.passthrough_supported = True
+        self.video_backend = "opencv"  # see VideoEncoder
+        self.video_codec = "FFV1"  # lossless
+        self.video_quality = None
+        self.chunk_duration = 60.0  # raw frames are stored in memory-mapped chunk files of this duration (units: s)
+        self.frame_store = None  # created with the first recorded frame, once the file prefix is known
         self.video = []
+        # Stages: capture (this thread), preview (CameraPreview) & recording (frame store)
+        self.headless = False  # no preview window at all
+        self.preview_rate = 10.0  # (units: Hz)
+        self.preview_scale = 1.0
+        self.preview = None
+        self.ring = None  # SharedFrameRing the latest frames are published to, if any
+        self.capture_fps = RateCounter()
+        self.recording_fps = RateCounter()
+        self.frame_timing = None
+        self.grab_time = int()  # perf_counter_ns at the latest grab (units: ns)
+        self.camera_time = int()  # backend timestamp of the latest frame, -1 if unavailable (units: us)
         self.currentTrial = 1
         self.unsaved = bool(1)
         self.file_prefix = "C:\\Users\\YUSTE\\Desktop\\"
@@ -30,8 +124,7 @@ class BehavCam(Thread):
         self.filename2 = []
         self.filename3 = []
         self.filename4 = []
-        self.bufferNum = []
-        self.currentBuffer = []
+        self.currentBuffer = int()
         self.isRunning1 = False
         self.isRunning2 = False
         Thread.__init__(self)
@@ -39,64 +132,163 @@ class BehavCam(Thread):
     def run(self):
         while True:
             if not self.cam_started:
-                # cv.namedWindow("Dingus", 0)
-                cv.namedWindow(self.window_name, cv.WINDOW_NORMAL)
+                self.frame_timing = FrameTiming(self.frame_rate)
+                if self.motion_rois is not None and self.recording_format != "mjpeg":  # Payloads are not decoded
+                    self.motion_energy = MotionEnergy(self.frame_rate, self.motion_rois, self.motion_downsample)
+                if not self.headless:
+                    self.preview = CameraPreview(self.window_name, self.preview_rate, self.preview_scale)
+                    self.preview.start()
                 self.cam = cv.VideoCapture(self.deviceID, cv.CAP_DSHOW)
                 self.cam.set(cv.CAP_PROP_FRAME_WIDTH, self.width)
                 self.cam.set(cv.CAP_PROP_FRAME_HEIGHT, self.height)
-                self.cam.set(cv.CAP_PROP_FPS, 30.0)
+                self.cam.set(cv.CAP_PROP_FPS, self.frame_rate)
                 self.cam.set(cv.CAP_PROP_FOURCC, cv.VideoWriter_fourcc('M', 'J', 'P', 'G'))
+                self.sensor_shape = (int(self.cam.get(cv.CAP_PROP_FRAME_HEIGHT)),
+                                     int(self.cam.get(cv.CAP_PROP_FRAME_WIDTH)))
+                if self.recording_format == "mjpeg":
+                    self.passthrough_shape = (*self.sensor_shape, 3)
+                    self.cam.set(cv.CAP_PROP_FORMAT, -1)  # Raw stream, frames are not decoded
+                    self.cam.set(cv.CAP_PROP_CONVERT_RGB, 0)
                 self.cam_started = True
             if self.cam_started:
                 while(self.cam.isOpened()):
-                    ret, frame = self.cam.read()
+                    ret = self.cam.grab()
+                    self.grab_time = perf_counter_ns()
+                    if ret == True:
+                        ret, frame = self.cam.retrieve()
                     if ret == True:
-                        if self.isRunning2:
-                            cv.imshow(self.window_name, frame)
-                            cv.waitKey(1) & 0xFF
+                        self.stamp_frame()
+                        if self.recording_format == "mjpeg" and (self.isRunning1 or self.isRunning2):
+                            self.passthrough_frame(frame)
+                        elif self.isRunning2:
+                            frame = bin_frame(crop_frame(frame, self.roi), self.binning)
+                            self.hand_off(frame)
                             if self.is_recording_time:
-                                self.runFrames.append(frame)
-                                self.runFramesIDs.append(self.currentTrial)
-                                self.bufferNum.append(self.currentBuffer)
+                                self.record_frame(frame)
                         elif self.isRunning1:
-                            frame = cv.cvtColor(frame, cv.COLOR_BGR2GRAY)
-                            cv.imshow(self.window_name, frame)
-                            cv.waitKey(1) & 0xFF
+                            frame = bin_frame(cv.cvtColor(crop_frame(frame, self.roi), cv.COLOR_BGR2GRAY), self.binning)
+                            self.hand_off(frame)
                             if self.is_recording_time:
-                                self.runFrames.append(frame)
-                                self.runFramesIDs.append(self.currentTrial)
-                                self.bufferNum.append(self.currentBuffer)
+                                self.record_frame(frame)
                         elif self.shutdown_mode:
                             break
                     else:
                         break
                 if self.shutdown_mode:
                     self.cam.release()
-                    cv.waitKey(1) & 0xFF
-                    cv.destroyWindow(self.window_name)
-                    cv.waitKey(1) & 0xFF
+                    if self.preview is not None:
+                        self.preview.stop()
                     return
 
+    def passthrough_frame(self, Payload):
+        """
+        Record a compressed frame as is & leave decoding to the preview, which only decodes the frames it draws
+
+        :rtype: None
+        """
+        if Payload.ndim != 2 or Payload.shape[0] != 1:
+            # The backend decoded the frame anyway; re-encode so the container stays uniform
+            if self.passthrough_supported:
+                print(self.window_name + " does not support MJPEG passthrough, frames are re-encoded")
+                self.passthrough_supported = False
+            Payload = cv.imencode(".jpg", Payload)[1].reshape(1, -1)
+        self.hand_off(Payload, cv.IMREAD_GRAYSCALE if self.isRunning1 else cv.IMREAD_COLOR)
+        if self.is_recording_time:
+            self.record_frame(Payload)
+
+    def stamp_frame(self):
+        _camera_time = self.cam.get(cv.CAP_PROP_POS_MSEC)
+        self.camera_time = int(_camera_time * 1000) if _camera_time > 0 else -1
+        self.frame_timing.frame_grabbed(self.grab_time)
+        self.capture_fps.tick(self.grab_time)
+
+    def hand_off(self, Frame, Decode=None):
+        """
+        Hand a captured frame to the streaming stages: preview, shared frame ring (process-based cameras) & motion
+        energy
+
+        :rtype: None
+        """
+        if self.motion_energy is not None and Decode is None:
+            self.motion_energy.update(Frame)
+        if self.preview is not None:
+            self.preview.show(Frame, Decode)
+        if self.ring is not None and Decode is None and Frame.shape == self.ring.frame_shape:
+            self.ring.write(Frame, self.grab_time, self.currentBuffer)
+
+    def frame_rates(self):
+        """
+        Current rate of each stage (units: fps)
+
+        :rtype: dict
+        """
+        return {
+            "capture": self.capture_fps.rate,
+            "preview": self.preview.fps.rate if self.preview is not None else 0.0,
+            "recording": self.recording_fps.rate,
+        }
+
+    def record_frame(self, Frame):
+        """
+        Hand a frame to the frame store (video encoder or raw frames) with the current trial & DAQ buffer
+
+        :rtype: None
+        """
+        if self.frame_store is None:
+            self.frame_store = self.create_frame_store(Frame.shape)
+        self.frame_store.write(Frame, self.currentTrial, self.currentBuffer)
+        self.frame_timing.frame_recorded(self.grab_time, self.camera_time)
+        if self.motion_energy is not None:
+            self.motion_energy.record()
+        self.recording_fps.tick()
+
+    def create_frame_store(self, FrameShape):
+        if self.recording_format == "mjpeg":
+            # Payload shapes vary; the container records the decoded (color) frame shape
+            return JPEGStore(self.file_prefix, self.passthrough_shape or (self.height, self.width, 3), self.frame_rate)
+        if self.recording_format == "video":
+            return VideoEncoder(self.file_prefix, FrameShape, self.frame_rate, self.video_backend, self.video_codec,
+                                self.video_quality)
+        return FrameStore(self.file_prefix, FrameShape, self.frame_rate, self.chunk_duration)
+
     def save_data(self):
         if self.unsaved:
             _start = time()
             self.unsaved = True
-            self.filename1 = self.file_prefix + "_Frame.npy"
+            if self.is_alive():
+                self.join(timeout=1.0)  # Let the capture loop finish its last frame
+            if self.frame_store is None:
+                self.frame_store = self.create_frame_store((self.height, self.width))
+            self.frame_store.close()
+            self.filename1 = self.frame_store.filenames
             self.filename2 = self.file_prefix + "_FramesIDS.npy"
             self.filename3 = self.file_prefix + "_BufferIDs.npy"
             self.filename4 = self.file_prefix + "_meta.txt"
-            np.save(self.filename3, self.bufferNum, allow_pickle=True)
+            if self.frame_timing is None:
+                self.frame_timing = FrameTiming(self.frame_rate)
+            np.save(self.file_prefix + "_FrameTimes.npy", self.frame_timing.grab_times.data)
+            np.save(self.file_prefix + "_CameraTimes.npy", self.frame_timing.camera_times.data)
+            self.frame_timing.write_report(self.file_prefix + "_frame_timing.txt")
+            print(self.window_name + "Frame Times Saved")
+            if self.motion_energy is not None:
+                np.save(self.file_prefix + "_MotionEnergy.npy", self.motion_energy.trace.data)
+                print(self.window_name + "Motion Energy Saved")
+            np.save(self.filename3, self.frame_store.buffer_ids.data)
             print(self.window_name + "Buffer IDs Saved")
-            np.save(self.filename2, self.runFramesIDs, allow_pickle=True)
+            np.save(self.filename2, self.frame_store.frame_ids.data)
             print(self.window_name + "Frames IDs Saved")
-            np.save(self.filename1, self.runFrames, allow_pickle=True)
-            self.runFrames = np.array(self.runFrames, dtype=np.uint8)
             with open(self.filename4, 'w') as f:
-                f.writelines([str(self.runFrames.shape[0]), ",", str(self.runFrames.shape[1]), ",",
-                              str(self.runFrames.shape[2])])
+                f.writelines([str(self.frame_store.num_frames), ",", str(self.frame_store.frame_shape[0]), ",",
+                              str(self.frame_store.frame_shape[1])])
+            # Region of interest (x, y, width, height) & binning of the recorded frames
+            _roi = self.roi if self.roi is not None and self.recording_format != "mjpeg" else \
+                (0, 0, self.sensor_shape[1], self.sensor_shape[0])
+            with open(self.file_prefix + "_roi.txt", 'w') as f:
+                f.writelines([",".join([str(_value) for _value in _roi]), ",",
+                              str(self.binning if self.recording_format != "mjpeg" else 1)])
             print(self.window_name + "Meta Saved")
-            self.runFrames.tofile(self.filename1)
             print(self.window_name + "Frames Saved")
+            print(self.window_name + " Frame Rates: " + str(self.frame_rates()))
             __end = time() - _start
             print("Writing Took " + str(__end))
             self.unsaved = False
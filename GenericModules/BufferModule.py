@@ -0,0 +1,286 @@
+import numpy as np
+from multiprocessing.shared_memory import SharedMemory
+
+
+class SessionBuffer:
+    """
+    Preallocated, chunk-growing slab of fixed-shape slots (one slot per DAQ buffer)
+
+    The first chunk is sized from the expected session length. When it is exhausted another chunk is appended instead
+    of reallocating, so writing a slot is O(1) for the whole session and a slot never moves once handed out.
+    """
+    def __init__(self, SlotShape, DataType, ExpectedSlots, ChunkSlots=None):
+        self.slot_shape = tuple(SlotShape)
+        self.dtype = np.dtype(DataType)
+        self.expected_slots = max(int(ExpectedSlots), 1)
+        if ChunkSlots is None:
+            self.chunk_slots = self.expected_slots
+        else:
+            self.chunk_slots = max(int(ChunkSlots), 1)
+
+        # Chunks are only ever appended; filled slots are counted across all of them
+        self.capacity = int()
+        self.chunks = [self._allocate(self.expected_slots)]
+        self.capacity = self.expected_slots
+        self.num_slots = int()
+
+        # Session index of the first slot in the newest chunk (avoids searching the chunk list)
+        self._chunk_start = int()
+
+    def __len__(self):
+        return self.num_slots
+
+    def next_slot(self):
+        """
+        Claim the next slot and return a writable view of it
+
+        :rtype: numpy.ndarray
+        """
+        if self.num_slots == self.capacity:
+            self.grow()
+        _slot = self.chunks[-1][self.num_slots - self._chunk_start, ...]
+        self.num_slots += 1
+        return _slot
+
+    def write(self, Data):
+        """
+        Copy one buffer of data into the next slot
+
+        :param Data: array broadcastable to the slot shape
+        :rtype: numpy.ndarray
+        """
+        _slot = self.next_slot()
+        _slot[...] = Data
+        return _slot
+
+    def extend(self, Rows):
+        """
+        Copy several slots of data into the next slots (one copy per chunk spanned)
+
+        :param Rows: array of shape (slots, *slot_shape)
+        :rtype: None
+        """
+        _offset = int()
+        while _offset < Rows.shape[0]:
+            if self.num_slots == self.capacity:
+                self.grow()
+            _start = self.num_slots - self._chunk_start
+            _count = min(self.chunks[-1].shape[0] - _start, Rows.shape[0] - _offset)
+            self.chunks[-1][_start:_start + _count] = Rows[_offset:_offset + _count]
+            self.num_slots += _count
+            _offset += _count
+
+    def grow(self):
+        """
+        Append a new chunk of chunk_slots
+
+        :rtype: None
+        """
+        self._chunk_start = self.capacity
+        self.chunks.append(self._allocate(self.chunk_slots))
+        self.capacity += self.chunk_slots
+
+    def _allocate(self, Slots):
+        # Storage backends override this to place chunks elsewhere (e.g., memory-mapped files)
+        return np.zeros((Slots, *self.slot_shape), dtype=self.dtype)
+
+    def slot(self, Index):
+        """
+        View of a previously written slot
+
+        :param Index: slot index (supports negative indexing)
+        :rtype: numpy.ndarray
+        """
+        if Index < 0:
+            Index += self.num_slots
+        if not 0 <= Index < self.num_slots:
+            raise IndexError("Slot index out of range")
+        _start = int()
+        for _chunk in self.chunks:
+            if Index < _start + _chunk.shape[0]:
+                return _chunk[Index - _start, ...]
+            _start += _chunk.shape[0]
+
+    @property
+    def data(self):
+        """
+        Filled slots as one contiguous array of shape (slots, *slot_shape)
+
+        Only copies when the session outgrew the first chunk.
+
+        :rtype: numpy.ndarray
+        """
+        if len(self.chunks) == 1:
+            return self.chunks[0][:self.num_slots]
+        _filled = []
+        _remaining = self.num_slots
+        for _chunk in self.chunks:
+            _filled.append(_chunk[:_remaining])
+            _remaining -= _filled[-1].shape[0]
+            if _remaining <= 0:
+                break
+        return np.concatenate(_filled, axis=0)
+
+    def as_samples(self):
+        """
+        Filled slots flattened along time
+
+        Slots shaped (samples, channels) are returned as a (channels, samples) view, slots shaped (samples, ) as a
+        single (samples, ) vector and scalar slots as one entry per buffer.
+
+        :rtype: numpy.ndarray
+        """
+        _data = self.data
+        if len(self.slot_shape) == 0:
+            return _data
+        _data = _data.reshape((-1, *self.slot_shape[1:]))
+        return _data.T
+
+
+class SlotRing:
+    """
+    Fixed ring of slots standing in for a SessionBuffer when the data is persisted in another form (e.g., bit-packed)
+
+    Same next_slot / write / slot interface, indexed by session slot, but only the newest slots stay readable: the
+    ring is sized to cover the processing backlog, so memory no longer scales with session length.
+    """
+    def __init__(self, SlotShape, DataType, Slots):
+        self.slot_shape = tuple(SlotShape)
+        self.dtype = np.dtype(DataType)
+        self.slots = max(int(Slots), 1)
+        self.ring = np.zeros((self.slots, *self.slot_shape), dtype=self.dtype)
+        self.num_slots = int()
+
+    def __len__(self):
+        return self.num_slots
+
+    def next_slot(self):
+        """
+        Claim the next slot (overwriting the oldest) and return a writable view of it
+
+        :rtype: numpy.ndarray
+        """
+        _slot = self.ring[self.num_slots % self.slots, ...]
+        self.num_slots += 1
+        return _slot
+
+    def write(self, Data):
+        _slot = self.next_slot()
+        _slot[...] = Data
+        return _slot
+
+    def slot(self, Index):
+        """
+        View of one of the newest slots
+
+        :param Index: slot index (supports negative indexing)
+        :rtype: numpy.ndarray
+        """
+        if Index < 0:
+            Index += self.num_slots
+        if not max(self.num_slots - self.slots, 0) <= Index < self.num_slots:
+            raise IndexError("Slot index out of range (or already overwritten)")
+        return self.ring[Index % self.slots, ...]
+
+
+class SharedFrameRing:
+    """
+    Ring of fixed-shape uint8 frames in shared memory, written by one process & read by any other
+
+    Layout: frames written (int64), per-slot metadata (frame number, grab time, buffer id; int64) & the frames. The
+    writer fills a slot before publishing it by bumping the frame count, so readers attached by name never see a
+    partially written frame unless they fall a whole ring behind (latest() retries then). Nothing is pickled or copied
+    between processes.
+    """
+    def __init__(self, FrameShape, Slots, Name=None):
+        # Collect
+        self.frame_shape = tuple(FrameShape)
+        self.slots = max(int(Slots), 2)
+        self.owner = Name is None  # the creating process unlinks the shared memory
+
+        # Derivations
+        self.frame_bytes = int(np.prod(self.frame_shape, dtype=np.int64))
+        _metadata_offset = 8
+        _frames_offset = _metadata_offset + self.slots * 3 * 8
+
+        # Shared memory & views into it
+        self.shared_memory = SharedMemory(name=Name, create=self.owner,
+                                          size=_frames_offset + self.slots * self.frame_bytes if self.owner else 0)
+        self._count = np.ndarray((1, ), dtype=np.int64, buffer=self.shared_memory.buf)
+        self.metadata = np.ndarray((self.slots, 3), dtype=np.int64, buffer=self.shared_memory.buf,
+                                   offset=_metadata_offset)
+        self.frames = np.ndarray((self.slots, *self.frame_shape), dtype=np.uint8, buffer=self.shared_memory.buf,
+                                 offset=_frames_offset)
+        if self.owner:
+            self._count[0] = 0
+
+    @property
+    def name(self):
+        return self.shared_memory.name
+
+    @property
+    def frames_written(self):
+        return int(self._count[0])
+
+    def write(self, Frame, GrabTime, BufferID):
+        """
+        Copy a frame into the next slot & publish it
+
+        :param Frame: uint8 array of frame_shape
+        :param GrabTime: perf_counter_ns at grab (units: ns)
+        :param BufferID: DAQ buffer acquired with the frame
+        :rtype: None
+        """
+        _frame_number = int(self._count[0])
+        _slot = _frame_number % self.slots
+        self.frames[_slot] = Frame
+        self.metadata[_slot] = (_frame_number, GrabTime, BufferID)
+        self._count[0] = _frame_number + 1
+
+    def latest(self, Out=None):
+        """
+        Copy of the newest frame & its (frame number, grab time, buffer id)
+
+        :param Out: optional array of frame_shape to copy into
+        :returns: (frame, metadata) or None before the first frame
+        :rtype: tuple
+        """
+        while True:
+            _written = int(self._count[0])
+            if _written == 0:
+                return None
+            _slot = (_written - 1) % self.slots
+            if Out is None:
+                _frame = self.frames[_slot].copy()
+            else:
+                _frame = Out
+                _frame[...] = self.frames[_slot]
+            _metadata = tuple(int(_value) for _value in self.metadata[_slot])
+            if int(self._count[0]) - _written < self.slots - 1:
+                return _frame, _metadata
+
+    def close(self):
+        """
+        Detach from the shared memory (views must go first)
+
+        :rtype: None
+        """
+        self._count = None
+        self.metadata = None
+        self.frames = None
+        self.shared_memory.close()
+
+    def unlink(self):
+        if self.owner:
+            self.shared_memory.unlink()
+
+
+def expected_buffers(Duration, BuffersPerSecond):
+    """
+    Number of DAQ buffers expected over a session
+
+    :param Duration: session duration (units: s)
+    :param BuffersPerSecond: DAQ buffers each second (units: Hz, round integer)
+    :rtype: int
+    """
+    return int(np.ceil(Duration * BuffersPerSecond))
@@ -0,0 +1,244 @@
+"""
+Single-file chunked session container
+
+Layout: magic, chunk payloads (raw or zlib-compressed bytes), the pickled index, index length (uint64) & magic again.
+Datasets are arrays chunked along their first (time) axis; the index holds, per dataset, its row shape, dtype,
+sampling rate, attributes & the (first row, rows, offset, bytes) of every chunk. Objects (configurations, statistics,
+...) are pickled into a single chunk each. Readers load the index from the footer, then seek to & decode only the chunks
+overlapping the requested rows.
+"""
+import pickle
+import zlib
+import numpy as np
+
+
+_MAGIC = b"BHSESS01"
+
+
+class SessionContainer:
+    """
+    Writer of a session container
+
+    Rows appended to a dataset are copied into a preallocated chunk & written (compressed or not) whenever it fills, so
+    memory is bounded by one chunk per dataset. The index is written by close.
+    """
+    def __init__(self, Filename, Compression="zlib", Level=1):
+        self.filename = Filename
+        self.compression = Compression  # "zlib" or None
+        self.level = Level  # zlib level (1 - 9)
+        self.index = {"datasets": {}, "objects": {}}
+        self.closed = False
+        self._pending = {}  # dataset name -> (chunk array, rows filled)
+        self._file = open(self.filename, "wb")
+        self._file.write(_MAGIC)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *Exception):
+        self.close()
+
+    def create_dataset(self, Name, RowShape, DataType, ChunkRows, Rate=None, Attributes=None, Compression="default"):
+        """
+        Add an empty dataset rows are appended to
+
+        :param Name: dataset name (e.g., "analog" or "cam1/frame_ids")
+        :param RowShape: shape of one row, e.g., (channels, ) or () for one value per row
+        :param DataType: data type (structured types included)
+        :param ChunkRows: rows per chunk
+        :param Rate: rows per second along time, None when rows are not samples in time
+        :param Attributes: anything picklable describing the dataset (e.g., scaling coefficients)
+        :param Compression: "zlib" or None, defaults to the container's
+        :rtype: None
+        """
+        self.index["datasets"][Name] = {"row_shape": tuple(RowShape), "dtype": np.dtype(DataType),
+                                        "rows": int(), "rate": Rate, "attributes": Attributes or {},
+                                        "compression": self.compression if Compression == "default" else Compression,
+                                        "chunks": []}  # (first row, rows, offset, bytes)
+        self._pending[Name] = [np.zeros((max(int(ChunkRows), 1), *RowShape), dtype=DataType), int()]
+
+    def append(self, Name, Rows):
+        """
+        Append rows to a dataset
+
+        :param Rows: array of shape (rows, *row shape)
+        :rtype: None
+        """
+        _chunk = self._pending[Name]
+        _offset = int()
+        while _offset < Rows.shape[0]:
+            _count = min(_chunk[0].shape[0] - _chunk[1], Rows.shape[0] - _offset)
+            _chunk[0][_chunk[1]:_chunk[1] + _count] = Rows[_offset:_offset + _count]
+            _chunk[1] += _count
+            _offset += _count
+            if _chunk[1] == _chunk[0].shape[0]:
+                self._write_chunk(Name)
+
+    def write_dataset(self, Name, Data, ChunkRows, Rate=None, Attributes=None, Compression="default"):
+        """
+        Create a dataset holding a whole array (e.g., a memory-mapped recording), chunk by chunk
+
+        :rtype: None
+        """
+        _data = Data if hasattr(Data, "shape") else np.asarray(Data)
+        self.create_dataset(Name, _data.shape[1:], _data.dtype, ChunkRows, Rate, Attributes, Compression)
+        for _start in range(0, _data.shape[0], max(int(ChunkRows), 1)):
+            self.append(Name, _data[_start:_start + max(int(ChunkRows), 1)])
+        self._write_chunk(Name)
+        del self._pending[Name]  # complete
+
+    def write_object(self, Name, Object):
+        """
+        Pickle an object (configuration, statistics, ...) into the container
+
+        :rtype: None
+        """
+        _payload = self._encode(pickle.dumps(Object), self.compression)
+        self.index["objects"][Name] = (self._file.tell(), _payload.__len__(), self.compression)
+        self._file.write(_payload)
+
+    def close(self):
+        """
+        Write the chunks still pending & the index
+
+        :rtype: None
+        """
+        if self.closed:
+            return
+        self.closed = True
+        for _name in self._pending:
+            self._write_chunk(_name)
+        _index = pickle.dumps(self.index)
+        self._file.write(_index)
+        self._file.write(np.array(_index.__len__(), dtype="<u8").tobytes())
+        self._file.write(_MAGIC)
+        self._file.close()
+
+    def _write_chunk(self, Name):
+        _chunk, _rows = self._pending[Name]
+        if _rows == 0:
+            return
+        _dataset = self.index["datasets"][Name]
+        _payload = self._encode(memoryview(np.ascontiguousarray(_chunk[:_rows])).cast("B"), _dataset["compression"])
+        _dataset["chunks"].append((_dataset["rows"], _rows, self._file.tell(), _payload.__len__()))
+        _dataset["rows"] += _rows
+        self._file.write(_payload)
+        self._pending[Name][1] = int()
+
+    def _encode(self, Payload, Compression):
+        if Compression == "zlib":
+            return zlib.compress(Payload, self.level)
+        return bytes(Payload)
+
+
+class SessionFile:
+    """
+    Reader of a session container
+
+    Only the footer is read when opening; read & read_time decode the chunks overlapping the requested rows & nothing
+    else, so any time range of any channel loads without touching the rest of the session.
+    """
+    def __init__(self, Filename):
+        self.filename = Filename
+        self._file = open(self.filename, "rb")
+        if self._file.read(_MAGIC.__len__()) != _MAGIC:
+            raise ValueError("".join(["Not a session container: ", Filename]))
+        self._file.seek(-(_MAGIC.__len__() + 8), 2)
+        _footer = self._file.tell()
+        _length = int(np.frombuffer(self._file.read(8), dtype="<u8")[0])
+        if self._file.read(_MAGIC.__len__()) != _MAGIC:
+            raise ValueError("".join(["Session container was not closed: ", Filename]))
+        self._file.seek(_footer - _length)
+        self.index = pickle.loads(self._file.read(_length))
+        self._chunk_starts = {_name: np.array([_chunk[0] for _chunk in _dataset["chunks"]], dtype=np.int64)
+                              for _name, _dataset in self.index["datasets"].items()}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *Exception):
+        self.close()
+
+    @property
+    def datasets(self):
+        return list(self.index["datasets"].keys())
+
+    @property
+    def objects(self):
+        return list(self.index["objects"].keys())
+
+    def shape(self, Name):
+        """
+        Shape of a dataset, (rows, *row shape)
+
+        :rtype: tuple
+        """
+        _dataset = self.index["datasets"][Name]
+        return (_dataset["rows"], *_dataset["row_shape"])
+
+    def rate(self, Name):
+        """
+        Rows per second of a dataset (None when rows are not samples in time)
+
+        :rtype: float
+        """
+        return self.index["datasets"][Name]["rate"]
+
+    def attributes(self, Name):
+        return self.index["datasets"][Name]["attributes"]
+
+    def read(self, Name, Start=0, Stop=None, Columns=None):
+        """
+        Rows [Start, Stop) of a dataset, optionally only some columns (second axis, e.g., channels)
+
+        :param Columns: column index, slice or list of indices, None for every column
+        :rtype: numpy.ndarray
+        """
+        _dataset = self.index["datasets"][Name]
+        Stop = _dataset["rows"] if Stop is None else min(Stop, _dataset["rows"])
+        Start = min(max(Start, 0), Stop)
+        _shape = _dataset["row_shape"]
+        if Columns is not None:
+            _shape = np.empty(_shape, dtype=np.bool_)[Columns].shape
+        _rows = np.empty((Stop - Start, *_shape), dtype=_dataset["dtype"])
+        _first = max(int(np.searchsorted(self._chunk_starts[Name], Start, side="right")) - 1, 0)
+        for _chunk_start, _chunk_rows, _offset, _bytes in _dataset["chunks"][_first:]:
+            if _chunk_start >= Stop:
+                break
+            self._file.seek(_offset)
+            _chunk = np.frombuffer(self._decode(self._file.read(_bytes), _dataset["compression"]),
+                                   dtype=_dataset["dtype"]).reshape(_chunk_rows, *_dataset["row_shape"])
+            _begin = max(Start, _chunk_start)
+            _end = min(Stop, _chunk_start + _chunk_rows)
+            _chunk = _chunk[_begin - _chunk_start:_end - _chunk_start]
+            _rows[_begin - Start:_end - Start] = _chunk if Columns is None else _chunk[:, Columns]
+        return _rows
+
+    def read_time(self, Name, StartTime=0.0, StopTime=None, Columns=None):
+        """
+        Rows of a dataset acquired during [StartTime, StopTime) (units: s, from the first row)
+
+        :rtype: numpy.ndarray
+        """
+        _rate = self.rate(Name)
+        return self.read(Name, int(round(StartTime * _rate)),
+                         None if StopTime is None else int(round(StopTime * _rate)), Columns)
+
+    def load_object(self, Name):
+        """
+        Object saved with write_object
+
+        :rtype: object
+        """
+        _offset, _bytes, _compression = self.index["objects"][Name]
+        self._file.seek(_offset)
+        return pickle.loads(self._decode(self._file.read(_bytes), _compression))
+
+    def close(self):
+        self._file.close()
+
+    @staticmethod
+    def _decode(Payload, Compression):
+        if Compression == "zlib":
+            return zlib.decompress(Payload)
+        return Payload
@@ -0,0 +1,17 @@
+"""
+DAQ backend used by the tasks
+
+PyDAQmx drives the National Instruments hardware. Setting the environment variable DAQ_BACKEND=simulated (before
+importing the tasks) swaps in GenericModules.SimulatedDAQ so sessions can run & be profiled without hardware or
+NI-DAQmx drivers.
+"""
+from os import environ
+
+backend = environ.get("DAQ_BACKEND", "pydaqmx").lower()
+
+if backend == "simulated":
+    from GenericModules.SimulatedDAQ import *
+    from GenericModules.SimulatedDAQ import device
+else:
+    from PyDAQmx import *
+    device = None
@@ -1,5 +1,5 @@
 import numpy as np
-from PyDAQmx import *
+from GenericModules.DAQBackend import *
 from ctypes import byref
 
 global DAQmx_Val_RSE, DAQmx_Val_Volts, DAQmx_Val_Rising, DAQmx_Val_ContSamps, DAQmx_Val_Acquired_Into_Buffer
@@ -32,8 +32,29 @@ class DigitalGroupReader(Task):
 
         self.CreateDIChan(self.use_channels, self.reader_name, DAQmx_Val_ChanPerLine)
 
+    @property
+    def slot_shape(self):
+        """
+        Shape of the arrays read_into fills, (samples, channels)
+
+        :rtype: tuple
+        """
+        return self.samples_per_read, self.num_channels
+
     def ReadSignals(self):
         self.ReadDigitalLines(self.numSampsPerChan, self.timeout, self.fillMode, self.readData,
                               self.arraySizeInBytes, self.sampsPerChanRead,
                               byref(self.numBytesPerSamp), None)
         return 0
+
+    def read_into(self, Target):
+        """
+        Read one buffer straight into Target (e.g., a session slot), interleaved as (samples, channels)
+
+        :param Target: C-contiguous uint8 array of slot_shape
+        :rtype: int
+        """
+        self.ReadDigitalLines(self.numSampsPerChan, self.timeout, DAQmx_Val_GroupByScanNumber, Target,
+                              self.arraySizeInBytes, self.sampsPerChanRead,
+                              byref(self.numBytesPerSamp), None)
+        return 0
@@ -0,0 +1,194 @@
+"""
+Offline feature extraction over saved camera sessions
+
+Every camera session (<file prefix>_meta.txt & its frames) is split into chunks of frames processed in a pool of
+worker processes. Workers reopen the frames themselves (memory maps for raw frames, per-frame decoding for compressed
+ones) and write their rows of the feature table straight into one shared output array, so memory stays bounded by
+the chunk size times the number of workers whatever the session length.
+
+Features (one float32 column each): mean intensity & motion energy per region of interest, and the pupil area (pixels
+darker than a threshold inside the pupil region) when a pupil region is given.
+
+    python -m GenericModules.FeatureModule <cohort directory> [workers]
+"""
+import sys
+import numpy as np
+from os import path, walk
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from GenericModules.SaveModule import frame_chunks, jpeg_frame
+
+
+def frame_source(FilePrefix):
+    """
+    Description of the saved frames of a camera session, enough for any process to reopen them
+
+    Recognized layouts (newest first): chunked frame store (_Frame_0000.npy, ...), MJPEG container (_MJPEG.bin),
+    encoded video (_Video.avi / _Video.mkv) & the original headerless raw frames (_Frame.npy).
+
+    :param FilePrefix: camera file prefix (e.g., <data path>\\_cam1_)
+    :rtype: dict
+    """
+    with open(FilePrefix + "_meta.txt", "r") as f:
+        _frames, _height, _width = [int(_value) for _value in f.readline().split(",")[:3]]
+    _source = {"file_prefix": FilePrefix, "frames": _frames, "frame_shape": (_height, _width)}
+    if path.exists(FilePrefix + "_Frame_0000.npy"):
+        _source["kind"] = "chunks"
+        _source["frame_shape"] = frame_chunks(FilePrefix)[0].shape[1:]
+    elif path.exists(FilePrefix + "_MJPEG.bin"):
+        _source["kind"] = "mjpeg"
+    elif path.exists(FilePrefix + "_Video.avi") or path.exists(FilePrefix + "_Video.mkv"):
+        _source["kind"] = "video"
+        _source["filename"] = FilePrefix + ("_Video.avi" if path.exists(FilePrefix + "_Video.avi") else "_Video.mkv")
+    else:
+        _source["kind"] = "raw"
+        _colors = path.getsize(FilePrefix + "_Frame.npy") // max(_frames * _height * _width, 1)
+        if _colors > 1:
+            _source["frame_shape"] = (_height, _width, _colors)
+    return _source
+
+
+def read_frames(Source, Start, Stop):
+    """
+    Frames [Start, Stop) of a session as gray uint8 (frames, height, width)
+
+    Raw frames are memory-mapped (only the requested frames are paged in), compressed ones are decoded.
+
+    :rtype: numpy.ndarray
+    """
+    if Source["kind"] == "raw":
+        _frames = np.memmap(Source["file_prefix"] + "_Frame.npy", dtype=np.uint8, mode="r",
+                            shape=(Source["frames"], *Source["frame_shape"]))[Start:Stop]
+    elif Source["kind"] == "chunks":
+        _chunks = frame_chunks(Source["file_prefix"])
+        _chunk_frames = _chunks[0].shape[0]
+        _frames = np.concatenate([_chunks[_chunk][max(Start - _chunk * _chunk_frames, 0):
+                                                  max(Stop - _chunk * _chunk_frames, 0)]
+                                  for _chunk in range(Start // _chunk_frames, (Stop - 1) // _chunk_frames + 1)])
+    else:
+        import cv2 as cv  # Only compressed sessions need decoding
+        if Source["kind"] == "mjpeg":
+            _container = np.memmap(Source["file_prefix"] + "_MJPEG.bin", dtype=np.uint8, mode="r")
+            _index = np.load(Source["file_prefix"] + "_MJPEG_index.npy", mmap_mode="r")
+            _frames = np.stack([cv.imdecode(np.asarray(jpeg_frame(_container, _index, _frame)), cv.IMREAD_GRAYSCALE)
+                                for _frame in range(Start, Stop)])
+        else:
+            _video = cv.VideoCapture(Source["filename"])
+            _video.set(cv.CAP_PROP_POS_FRAMES, Start)
+            _decoded = []
+            for _ in range(Start, Stop):
+                _ret, _frame = _video.read()
+                if not _ret:
+                    break
+                _decoded.append(cv.cvtColor(_frame, cv.COLOR_BGR2GRAY))
+            _video.release()
+            _frames = np.stack(_decoded)
+    if _frames.ndim == 4:
+        _frames = _frames.mean(axis=3, dtype=np.float32).round().astype(np.uint8)
+    return _frames
+
+
+def feature_names(ROIs, PupilROI=None):
+    """
+    Column names of the feature table
+
+    :rtype: list
+    """
+    _names = ["".join(["mean_", str(_region)]) for _region in range(ROIs.__len__())]
+    _names.extend(["".join(["motion_", str(_region)]) for _region in range(ROIs.__len__())])
+    if PupilROI is not None:
+        _names.append("pupil_area")
+    return _names
+
+
+def extract_chunk(Source, Start, Stop, OutputName, OutputShape, ROIs, PupilROI, PupilThreshold):
+    """
+    Compute the features of frames [Start, Stop) & write them into the shared output array (worker process)
+
+    :rtype: None
+    """
+    _shared = SharedMemory(name=OutputName)
+    _output = np.ndarray(OutputShape, dtype=np.float32, buffer=_shared.buf)
+    _first = max(Start - 1, 0)  # previous frame for motion energy
+    _frames = read_frames(Source, _first, Stop)
+    _column = int()
+    for _roi in ROIs:
+        _output[Start:Stop, _column] = _crop_stack(_frames[Start - _first:], _roi).mean(axis=(1, 2),
+                                                                                       dtype=np.float32)
+        _column += 1
+    for _roi in ROIs:
+        _region = _crop_stack(_frames, _roi)
+        # |a - b| in uint8 arithmetic, as MotionEnergy does online
+        _energy = (np.maximum(_region[1:], _region[:-1]) - np.minimum(_region[1:], _region[:-1])).mean(
+            axis=(1, 2), dtype=np.float32)
+        if Start == 0:
+            _energy = np.concatenate([np.zeros(1, dtype=np.float32), _energy])
+        _output[Start:Stop, _column] = _energy
+        _column += 1
+    if PupilROI is not None:
+        _output[Start:Stop, _column] = np.count_nonzero(_crop_stack(_frames[Start - _first:], PupilROI) <
+                                                        PupilThreshold, axis=(1, 2))
+    del _output
+    _shared.close()
+
+
+def extract_features(FilePrefix, ROIs=(None, ), PupilROI=None, PupilThreshold=40, ChunkFrames=256, Workers=None):
+    """
+    Feature table of one camera session, computed chunk by chunk in a process pool
+
+    :param FilePrefix: camera file prefix
+    :param ROIs: regions (x, y, width, height) of the saved frames, None for the whole frame
+    :param PupilROI: region holding the pupil, None skips the pupil area
+    :param PupilThreshold: pixels darker than this are pupil (0 - 255)
+    :param ChunkFrames: frames per task
+    :param Workers: worker processes (defaults to all cores)
+    :returns: feature name -> float32 array, one entry per frame
+    :rtype: dict
+    """
+    _source = frame_source(FilePrefix)
+    _names = feature_names(ROIs, PupilROI)
+    _shape = (_source["frames"], _names.__len__())
+    _shared = SharedMemory(create=True, size=max(int(np.prod(_shape)) * 4, 1))
+    _output = np.ndarray(_shape, dtype=np.float32, buffer=_shared.buf)
+    try:
+        with ProcessPoolExecutor(Workers) as _pool:
+            _tasks = [_pool.submit(extract_chunk, _source, _start, min(_start + ChunkFrames, _shape[0]), _shared.name,
+                                   _shape, tuple(ROIs), PupilROI, PupilThreshold)
+                      for _start in range(0, _shape[0], ChunkFrames)]
+            for _task in _tasks:
+                _task.result()
+        _features = {_name: _output[:, _column].copy() for _column, _name in enumerate(_names)}
+    finally:
+        del _output
+        _shared.close()
+        _shared.unlink()
+    return _features
+
+
+def extract_cohort(Directory, Workers=None, **Parameters):
+    """
+    Extract & save (<file prefix>_features.npz) the features of every camera session below a directory
+
+    :returns: file prefixes processed
+    :rtype: list
+    """
+    _prefixes = []
+    for _root, _, _files in walk(Directory):
+        for _file in sorted(_files):
+            if _file.endswith("_meta.txt"):
+                _prefixes.append(path.join(_root, _file[:-len("_meta.txt")]))
+    for _prefix in _prefixes:
+        print("".join(["Extracting Features: ", _prefix]))
+        np.savez(_prefix + "_features.npz", **extract_features(_prefix, Workers=Workers, **Parameters))
+    return _prefixes
+
+
+def _crop_stack(Frames, ROI):
+    if ROI is None:
+        return Frames
+    _x, _y, _width, _height = ROI
+    return Frames[:, _y:_y + _height, _x:_x + _width]
+
+
+if __name__ == '__main__':
+    extract_cohort(sys.argv[1], int(sys.argv[2]) if sys.argv.__len__() > 2 else None)
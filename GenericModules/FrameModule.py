@@ -0,0 +1,141 @@
+import numpy as np
+from GenericModules.BufferModule import SessionBuffer
+
+
+def crop_frame(Frame, ROI):
+    """
+    View of the region of interest of a frame (no copy)
+
+    :param Frame: (height, width) or (height, width, colors) frame
+    :param ROI: (x, y, width, height) in pixels of the frame, None keeps the whole frame
+    :rtype: numpy.ndarray
+    """
+    if ROI is None:
+        return Frame
+    _x, _y, _width, _height = ROI
+    return Frame[_y:_y + _height, _x:_x + _width]
+
+
+def bin_frame(Frame, Binning):
+    """
+    Mean of every Binning x Binning block of pixels (rounded, uint8)
+
+    Blocks are formed by reshaping a view of the frame; trailing rows & columns that do not fill a block are dropped.
+
+    :param Frame: uint8 (height, width) or (height, width, colors) frame
+    :param Binning: block size (1, 2 or 4)
+    :rtype: numpy.ndarray
+    """
+    if Binning == 1:
+        return Frame
+    _height = Frame.shape[0] // Binning
+    _width = Frame.shape[1] // Binning
+    _blocks = Frame[:_height * Binning, :_width * Binning].reshape(_height, Binning, _width, Binning,
+                                                                   *Frame.shape[2:])
+    _sums = _blocks.sum(axis=(1, 3), dtype=np.uint16)  # 4 x 4 blocks of 255 still fit
+    _sums += (Binning * Binning) // 2
+    _sums //= Binning * Binning
+    return _sums.astype(np.uint8)
+
+
+def reduce_frame(Frame, ROI=None, Binning=1):
+    """
+    Crop a frame to its region of interest, then bin it
+
+    :rtype: numpy.ndarray
+    """
+    return bin_frame(crop_frame(Frame, ROI), Binning)
+
+
+def reduced_shape(FrameShape, ROI=None, Binning=1):
+    """
+    Shape of frames after reduce_frame
+
+    :rtype: tuple
+    """
+    _height, _width = FrameShape[:2]
+    if ROI is not None:
+        _height = max(min(ROI[3], _height - ROI[1]), 0)
+        _width = max(min(ROI[2], _width - ROI[0]), 0)
+    return (_height // Binning, _width // Binning, *FrameShape[2:])
+
+
+class MotionEnergy:
+    """
+    Online frame-difference motion energy, per frame & region of interest
+
+    Each frame is downsampled by striding (a view), differenced against the previous one in uint8 arithmetic into
+    preallocated buffers (|a - b| = max(a, b) - min(a, b), never wrapping) and averaged inside every region of interest.
+    Every captured frame enters a rolling history (the last HistoryDuration seconds, for the GUI); recorded frames
+    also append to a float32 trace of shape (frames, regions) parallel to the frame store.
+
+    Regions are (x, y, width, height) in pixels of the frames handed to update; None covers the whole frame.
+    """
+    def __init__(self, FrameRate, ROIs=(None, ), Downsample=4, HistoryDuration=30.0, ExpectedDuration=3600.0):
+        # Collect
+        self.frame_rate = FrameRate  # (units: Hz)
+        self.rois = tuple(ROIs)
+        self.downsample = max(int(Downsample), 1)
+
+        # Derivations
+        self._rois = [None if _roi is None else (_roi[0] // self.downsample, _roi[1] // self.downsample,
+                                                 -(-_roi[2] // self.downsample), -(-_roi[3] // self.downsample))
+                      for _roi in self.rois]
+        _expected_frames = max(int(np.ceil(ExpectedDuration * FrameRate)), 1)
+
+        # Outputs
+        self.energy = np.zeros(self.rois.__len__(), dtype=np.float32)  # of the latest frame
+        self.trace = SessionBuffer((self.rois.__len__(), ), np.float32, _expected_frames)
+        self.history = np.zeros((max(int(np.ceil(HistoryDuration * FrameRate)), 1), self.rois.__len__()),
+                                dtype=np.float32)
+        self.frames = int()
+
+        # Preallocated on the first frame
+        self._previous = None
+        self._difference = None
+        self._scratch = None
+
+    def update(self, Frame):
+        """
+        Motion energy of a frame relative to the previous one (0 for the first frame)
+
+        :param Frame: uint8 (height, width) or (height, width, colors) frame
+        :rtype: numpy.ndarray
+        """
+        _small = Frame[::self.downsample, ::self.downsample]
+        if self._previous is None or self._previous.shape != _small.shape:
+            self._previous = np.array(_small)
+            self._difference = np.empty_like(self._previous)
+            self._scratch = np.empty_like(self._previous)
+            self.energy[:] = 0
+        else:
+            np.maximum(_small, self._previous, out=self._difference)
+            np.minimum(_small, self._previous, out=self._scratch)
+            np.subtract(self._difference, self._scratch, out=self._difference)
+            for _region, _roi in enumerate(self._rois):
+                self.energy[_region] = crop_frame(self._difference, _roi).mean(dtype=np.float32)
+            np.copyto(self._previous, _small)
+        self.history[self.frames % self.history.shape[0]] = self.energy
+        self.frames += 1
+        return self.energy
+
+    def record(self):
+        """
+        Append the motion energy of the latest frame to the trace (call for every recorded frame)
+
+        :rtype: None
+        """
+        self.trace.write(self.energy)
+
+    def recent(self, Duration=None):
+        """
+        Motion energy of the last Duration seconds of captured frames, oldest first (frames, regions)
+
+        :param Duration: defaults to the whole history (units: s)
+        :rtype: numpy.ndarray
+        """
+        _count = min(self.frames, self.history.shape[0])
+        if Duration is not None:
+            _count = min(_count, int(round(Duration * self.frame_rate)))
+        _indices = np.arange(self.frames - _count, self.frames) % self.history.shape[0]
+        return self.history[_indices]
@@ -0,0 +1,371 @@
+import numpy as np
+from time import perf_counter_ns
+from GenericModules.BufferModule import SessionBuffer
+
+
+class LatencyHistogram:
+    """
+    Fixed-size log-linear (HDR-style) histogram of latencies in nanoseconds
+
+    Values below 2 ** (SignificantBits + 1) ns are counted exactly; above, every power of two is split into
+    2 ** SignificantBits buckets, so any recorded value is known to within 1 / 2 ** SignificantBits (< 1% with the
+    default of 7 bits). Recording is a couple of integer operations & one increment, memory never grows.
+    """
+    def __init__(self, MaxValue=10000000000, SignificantBits=7):
+        # Collect
+        self.significant_bits = SignificantBits
+        self.max_value = int(MaxValue)  # larger values are counted in the last bucket (units: ns)
+
+        # Derivations
+        self.sub_buckets = 1 << SignificantBits
+        self.counts = np.zeros(self._bucket(self.max_value) + 1, dtype=np.int64)
+
+        # Running
+        self.count = int()
+        self.total = int()  # sum of recorded values (units: ns)
+        self.saturated = int()  # values beyond max_value
+        self._extremes = np.zeros(2, dtype=np.int64)  # min & max, held in place so recording retains no new objects
+
+    def record(self, Value):
+        """
+        Count one latency
+
+        :param Value: latency (units: ns)
+        :rtype: None
+        """
+        Value = int(Value)
+        if Value > self.max_value:
+            self.saturated += 1
+            _bucket = self.counts.shape[0] - 1
+        else:
+            _bucket = self._bucket(max(Value, 0))
+        self.counts[_bucket] += 1
+        self.count += 1
+        self.total += Value
+        if self.count == 1 or Value < self._extremes[0]:
+            self._extremes[0] = Value
+        if Value > self._extremes[1]:
+            self._extremes[1] = Value
+
+    @property
+    def min(self):
+        """
+        Smallest recorded latency, None before any (units: ns)
+
+        :rtype: int
+        """
+        return int(self._extremes[0]) if self.count else None
+
+    @property
+    def max(self):
+        """
+        Largest recorded latency (units: ns)
+
+        :rtype: int
+        """
+        return int(self._extremes[1])
+
+    def percentile(self, Percentile):
+        """
+        Latency below which a percentage of the recorded values fall (lower edge of its bucket)
+
+        :param Percentile: 0 - 100
+        :rtype: int
+        """
+        if self.count == 0:
+            return int()
+        _rank = max(int(np.ceil(self.count * Percentile / 100)), 1)
+        _bucket = int(np.searchsorted(np.cumsum(self.counts), _rank))
+        return min(self._value(_bucket), self.max)
+
+    @property
+    def mean(self):
+        """
+        Mean latency (units: ns)
+
+        :rtype: float
+        """
+        return self.total / self.count if self.count else 0.0
+
+    def summary(self):
+        """
+        Count, mean, percentiles & extremes (units: ns)
+
+        :rtype: dict
+        """
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "min": self.min if self.min is not None else int(),
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "p99.9": self.percentile(99.9),
+            "max": self.max,
+            "saturated": self.saturated,
+        }
+
+    def _bucket(self, Value):
+        _shift = max(Value.bit_length() - self.significant_bits - 1, 0)
+        return self.sub_buckets * _shift + (Value >> _shift)
+
+    def _value(self, Bucket):
+        if Bucket < 2 * self.sub_buckets:
+            return Bucket
+        _shift = Bucket // self.sub_buckets - 1
+        return (Bucket - self.sub_buckets * _shift) << _shift
+
+
+class CallbackInstrumentation:
+    """
+    Always-on latency instrumentation for DAQ callbacks & the buffer processing that follows them
+
+    Every stage keeps a LatencyHistogram. The gap between successive callbacks is tracked against the buffer time: a
+    callback arriving more than OverrunTolerance buffer periods after the previous one, or a callback taking longer
+    than a buffer period, sets the overrun flag (the DAQ buffer is at risk of being overwritten).
+
+    Typical use inside a callback:
+
+        _start = self.instrumentation.callback_started()
+        ...read...
+        _lap = self.instrumentation.lap("read", _start)
+        ...copy...
+        self.instrumentation.callback_finished(_start)
+    """
+    def __init__(self, BufferTime, Stages=("read", "copy", "process", "append", "camera"), OverrunTolerance=1.5):
+        # Collect
+        self.buffer_time = BufferTime  # (units: ms)
+        self.buffer_period = int(BufferTime * 1000000)  # (units: ns)
+        self.overrun_tolerance = OverrunTolerance
+
+        # Histograms
+        self.stages = tuple(Stages)
+        self.histograms = {_stage: LatencyHistogram() for _stage in (*self.stages, "callback", "gap")}
+
+        # Running
+        self.overrun = False
+        self.overrun_buffers = int()
+        self.first_overrun = None  # callback number of the first overrun
+        self.callbacks = int()
+        self._last_start = None
+
+    def callback_started(self):
+        """
+        Mark the start of a callback & track the gap to the previous one
+
+        :returns: start of the callback (units: ns)
+        :rtype: int
+        """
+        _start = perf_counter_ns()
+        self.callbacks += 1
+        if self._last_start is not None:
+            _gap = _start - self._last_start
+            self.histograms["gap"].record(_gap)
+            if _gap > self.overrun_tolerance * self.buffer_period:
+                self._flag_overrun()
+        self._last_start = _start
+        return _start
+
+    def reset_gap(self):
+        """
+        Forget the previous callback so a deliberate pause (e.g., between test steps) is not taken for an overrun
+
+        :rtype: None
+        """
+        self._last_start = None
+
+    def lap(self, Stage, Start):
+        """
+        Record the time spent in a stage since Start
+
+        :param Stage: name of the stage
+        :param Start: start of the stage (units: ns)
+        :returns: now, the start of the next stage (units: ns)
+        :rtype: int
+        """
+        _now = perf_counter_ns()
+        self.histograms[Stage].record(_now - Start)
+        return _now
+
+    def callback_finished(self, Start):
+        """
+        Record the duration of a callback
+
+        :param Start: value returned by callback_started (units: ns)
+        :rtype: None
+        """
+        _duration = perf_counter_ns() - Start
+        self.histograms["callback"].record(_duration)
+        if _duration > self.buffer_period:
+            self._flag_overrun()
+
+    def report(self):
+        """
+        Per-stage latency summaries & overrun state
+
+        :rtype: dict
+        """
+        return {
+            "buffer_time": self.buffer_time,
+            "callbacks": self.callbacks,
+            "overrun": self.overrun,
+            "overrun_buffers": self.overrun_buffers,
+            "first_overrun": self.first_overrun,
+            "stages": {_stage: _histogram.summary() for _stage, _histogram in self.histograms.items()},
+        }
+
+    def write_report(self, Filename):
+        """
+        Write the latency report as a plain text table (units: us)
+
+        :rtype: None
+        """
+        _report = self.report()
+        _columns = ("count", "mean", "min", "p50", "p90", "p99", "p99.9", "max")
+        _lines = [
+            "".join(["Buffer Time: ", str(self.buffer_time), " ms"]),
+            "".join(["Callbacks: ", str(self.callbacks)]),
+            "".join(["Overrun: ", str(self.overrun), " (", str(self.overrun_buffers), " buffers, first at callback ",
+                     str(self.first_overrun), ")"]),
+            "",
+            "".join(["{:<10}".format("stage"), *["{:>12}".format(_column) for _column in _columns]]),
+        ]
+        for _stage, _summary in _report["stages"].items():
+            _values = ["{:>12}".format(_summary["count"])]
+            _values.extend(["{:>12.1f}".format(_summary[_column] / 1000) for _column in _columns[1:]])
+            _lines.append("".join(["{:<10}".format(_stage), *_values]))
+        with open(Filename, "w") as f:
+            f.write("\n".join(_lines) + "\n")
+
+    def _flag_overrun(self):
+        self.overrun = True
+        self.overrun_buffers += 1
+        if self.first_overrun is None:
+            self.first_overrun = self.callbacks
+
+
+class RateCounter:
+    """
+    Event rate over consecutive windows (e.g., frames through a camera stage)
+
+    Ticking is a clock read & a couple of integer operations; the rate is updated once per window.
+    """
+    def __init__(self, Window=1.0):
+        self.window = int(Window * 1000000000)  # (units: ns)
+        self.count = int()  # events since creation
+        self.rate = 0.0  # events per second over the last complete window (units: Hz)
+        self._window_start = None
+        self._window_count = int()
+
+    def tick(self, Now=None):
+        """
+        Count one event
+
+        :param Now: time of the event, defaults to now (units: ns)
+        :rtype: None
+        """
+        _now = perf_counter_ns() if Now is None else Now
+        self.count += 1
+        if self._window_start is None:
+            self._window_start = _now
+            return
+        self._window_count += 1
+        _elapsed = _now - self._window_start
+        if _elapsed >= self.window:
+            self.rate = self._window_count * 1000000000 / _elapsed
+            self._window_start = _now
+            self._window_count = int()
+
+
+class FrameTiming:
+    """
+    Per-frame timestamps & dropped-frame detection for a camera
+
+    Every captured frame is checked online: an interval longer than GapTolerance nominal frame periods is a gap and
+    the frames it should have held are counted as missing. Recorded frames additionally keep their grab time
+    (perf_counter_ns, units: ns) & the backend's own timestamp (CAP_PROP_POS_MSEC, units: us, -1 when the backend has
+    none) in int64 arrays parallel to the frame store.
+    """
+    def __init__(self, FrameRate, ExpectedDuration=3600.0, GapTolerance=1.5):
+        # Collect
+        self.frame_rate = FrameRate  # (units: Hz)
+        self.period = int(1000000000 / FrameRate)  # (units: ns)
+        self.gap_tolerance = GapTolerance
+
+        # Online
+        self.intervals = LatencyHistogram()
+        self.frames = int()
+        self.gaps = int()
+        self.missing_frames = int()  # estimated from gap lengths
+        self.first_gap = None  # frame number of the first gap
+        self._last_grab = None
+
+        # Recorded frames
+        _expected_frames = max(int(np.ceil(ExpectedDuration * FrameRate)), 1)
+        self.grab_times = SessionBuffer((), np.int64, _expected_frames)
+        self.camera_times = SessionBuffer((), np.int64, _expected_frames)
+
+    def frame_grabbed(self, GrabTime):
+        """
+        Track the interval to the previous captured frame
+
+        :param GrabTime: perf_counter_ns at grab (units: ns)
+        :rtype: None
+        """
+        self.frames += 1
+        if self._last_grab is not None:
+            _interval = GrabTime - self._last_grab
+            self.intervals.record(_interval)
+            if _interval > self.gap_tolerance * self.period:
+                self.gaps += 1
+                self.missing_frames += max(int(round(_interval / self.period)) - 1, 1)
+                if self.first_gap is None:
+                    self.first_gap = self.frames
+        self._last_grab = GrabTime
+
+    def frame_recorded(self, GrabTime, CameraTime):
+        """
+        Keep the timestamps of a recorded frame
+
+        :param GrabTime: perf_counter_ns at grab (units: ns)
+        :param CameraTime: backend timestamp (units: us, -1 if unavailable)
+        :rtype: None
+        """
+        self.grab_times.write(GrabTime)
+        self.camera_times.write(CameraTime)
+
+    def report(self):
+        """
+        Frame counts, gaps & interval summary (units: ns); camera gaps are found from the backend timestamps of the
+        recorded frames when it provides them
+
+        :rtype: dict
+        """
+        _camera_times = self.camera_times.data
+        _camera_times = _camera_times[_camera_times >= 0]
+        _camera_intervals = np.diff(_camera_times) * 1000
+        return {
+            "frame_rate": self.frame_rate,
+            "frames": self.frames,
+            "recorded_frames": self.grab_times.__len__(),
+            "gaps": self.gaps,
+            "missing_frames": self.missing_frames,
+            "first_gap": self.first_gap,
+            "camera_gaps": int(np.count_nonzero(_camera_intervals > self.gap_tolerance * self.period)),
+            "intervals": self.intervals.summary(),
+        }
+
+    def write_report(self, Filename):
+        """
+        Write the frame timing report as plain text (units: ms)
+
+        :rtype: None
+        """
+        _report = self.report()
+        _lines = ["".join([_key.replace("_", " ").title(), ": ", str(_value)]) for _key, _value in _report.items()
+                  if _key != "intervals"]
+        _lines.append("")
+        _lines.extend(["".join(["Interval ", _key, ": ", "{:.3f}".format(_value / 1000000), " ms"])
+                       for _key, _value in _report["intervals"].items() if _key not in ("count", "saturated")])
+        with open(Filename, "w") as f:
+            f.write("\n".join(_lines) + "\n")
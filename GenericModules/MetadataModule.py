@@ -0,0 +1,65 @@
+import numpy as np
+
+
+# One record per DAQ buffer (16 bytes, packed)
+buffer_record_dtype = np.dtype([
+    ("buffer", np.uint32),  # buffer index (units: buffers)
+    ("state", np.uint8),  # state code (see CodeTable)
+    ("spout", np.uint8),  # spout code (see CodeTable)
+    ("trial", np.int16),  # trial number
+    ("timestamp", np.int64),  # perf_counter_ns at the callback (units: ns)
+])
+
+
+class CodeTable:
+    """
+    Lookup between state (or spout) names & the uint8 codes stored in buffer records
+
+    Code 0 is reserved for the placeholder (anything recorded before a name is known).
+    """
+    def __init__(self, Names, Placeholder="None"):
+        self.names = (Placeholder, *Names)
+        if self.names.__len__() > 256:
+            raise ValueError("Code tables are limited to 255 names")
+        self.codes = {_name: np.uint8(_code) for _code, _name in enumerate(self.names)}
+
+    def code(self, Name):
+        """
+        Code of a name (unknown names map to the placeholder)
+
+        :rtype: numpy.uint8
+        """
+        return self.codes.get(Name, self.codes[self.names[0]])
+
+    def name(self, Code):
+        """
+        Name of a code
+
+        :rtype: str
+        """
+        return self.names[Code]
+
+    def as_dict(self):
+        """
+        Code to name lookup saved alongside the records
+
+        :rtype: dict
+        """
+        return {_code: _name for _code, _name in enumerate(self.names)}
+
+    def mask(self, Codes, Name):
+        """
+        Boolean mask of codes equal to a name (e.g., records["state"])
+
+        :rtype: numpy.ndarray
+        """
+        return np.asarray(Codes) == self.codes[Name]
+
+    def sample_mask(self, Codes, Name, BufferSize):
+        """
+        Boolean mask over samples (e.g., all samples in Habituation)
+
+        :param BufferSize: samples per buffer (units: samples)
+        :rtype: numpy.ndarray
+        """
+        return np.repeat(self.mask(Codes, Name), BufferSize)
@@ -0,0 +1,107 @@
+from queue import Queue, Full
+from threading import Thread, current_thread
+from time import perf_counter_ns
+
+
+class BufferPipeline(Thread):
+    """
+    Producer/consumer hand-off between the DAQ callback & a processing thread
+
+    The callback (producer) only submits the index of the session slot it just read into. The processing thread
+    (consumer) runs all bookkeeping for that slot. Submitting never blocks: when the bounded queue is full the index is
+    counted as dropped and the consumer catches up on it with the next index it receives, since session slots are never
+    overwritten (rings of digital lines saved packed or as edges keep HardConfig.digital_ring_duration of them).
+    """
+    def __init__(self, Process, BufferTime, QueueSize=64, LateTolerance=1.5):
+        Thread.__init__(self, daemon=True)
+        # Collect
+        self.process = Process  # callable taking a slot index
+        self.buffer_period = int(BufferTime * 1000000)  # expected gap between callbacks (units: ns)
+        self.late_tolerance = LateTolerance  # gaps beyond this many buffer periods are late
+
+        # Hand-off
+        self.queue = Queue(maxsize=QueueSize)
+        self.running = True
+        self.next_index = None  # next slot the consumer has to process
+
+        # Counters
+        self.submitted_buffers = int()
+        self.processed_buffers = int()
+        self.dropped_buffers = int()  # hand-offs that did not fit in the queue (processed by catching up)
+        self.late_buffers = int()  # callbacks arriving later than late_tolerance buffer periods
+        self.max_queue_depth = int()
+        self.last_index = None
+        self._last_submit = None
+
+    def submit(self, Index):
+        """
+        Hand a slot index to the processing thread (called from the DAQ callback, never blocks)
+
+        :param Index: index of the session slot
+        :rtype: None
+        """
+        _now = perf_counter_ns()
+        if self._last_submit is not None and (_now - self._last_submit) > self.late_tolerance * self.buffer_period:
+            self.late_buffers += 1
+        self._last_submit = _now
+        self.submitted_buffers += 1
+        self.last_index = Index
+        try:
+            self.queue.put_nowait(Index)
+        except Full:
+            self.dropped_buffers += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queue.qsize())
+
+    def run(self):
+        while self.running:
+            _index = self.queue.get()
+            if _index is None:
+                _index = self.last_index
+                self.running = False
+            if _index is not None:
+                self._process_through(_index)
+
+    def stop(self):
+        """
+        Process what is left & stop the thread (may be called from the processing thread itself)
+
+        :rtype: None
+        """
+        if current_thread() is self:
+            self.running = False  # Exits after the current slot
+        elif self.is_alive():
+            self.queue.put(None)  # Drains everything submitted so far
+            self.join()
+        else:
+            self.running = False
+
+    @property
+    def queue_depth(self):
+        """
+        Slot indices waiting for the processing thread
+
+        :rtype: int
+        """
+        return self.queue.qsize()
+
+    def report(self):
+        """
+        Pipeline counters
+
+        :rtype: dict
+        """
+        return {
+            "submitted_buffers": self.submitted_buffers,
+            "processed_buffers": self.processed_buffers,
+            "dropped_buffers": self.dropped_buffers,
+            "late_buffers": self.late_buffers,
+            "max_queue_depth": self.max_queue_depth,
+        }
+
+    def _process_through(self, Index):
+        if self.next_index is None:
+            self.next_index = Index
+        while self.next_index <= Index:
+            self.process(self.next_index)
+            self.processed_buffers += 1
+            self.next_index += 1
@@ -1,6 +1,13 @@
 import numpy as np
 import pickle
 from os import path
+from queue import Queue, Empty, Full
+from threading import Thread
+from GenericModules.BufferModule import SessionBuffer, SlotRing
+
+
+# Size of .npy headers written by streaming savers; keeps every data block aligned on disk (units: bytes)
+_HEADER_SIZE = 4096
 
 
 class Saver:
@@ -28,3 +35,741 @@ class Pickler:
             pickle.dump(self.pickledPickles, f)
         return True
 
+
+class StreamingSaver(Thread):
+    """
+    Append-only writer persisting DAQ buffers during acquisition
+
+    Buffers are queued from the DAQ callback and appended to an open .npy file by a background thread. Data reaches
+    disk in large blocks aligned to the 4 KiB header and the header (dtype, channels & samples) is rewritten after
+    every flush, so the file loads with np.load at any point of the session. Saving at the end only closes the file.
+
+    Buffers are (samples, channels) slots; the file holds them as a fortran-ordered (channels, samples) array exactly
+    like Saver would have written the session (the buffer count is samples // buffer size).
+    """
+    def __init__(self, SlotShape, DataType, BlockSize=1048576, FlushInterval=5.0, QueueSize=600):
+        Thread.__init__(self, daemon=True)
+        currentPath = path.dirname(path.realpath(__file__))
+        self.filename = currentPath + "\\stream.npy"  # default file path
+
+        # Collect
+        self.slot_shape = tuple(SlotShape)
+        self.dtype = np.dtype(DataType)
+        self.block_size = max(int(BlockSize) // _HEADER_SIZE, 1) * _HEADER_SIZE  # (units: bytes, aligned)
+        self.flush_interval = FlushInterval  # maximum time data waits in memory (units: s)
+
+        # Derivations
+        self.bytes_per_sample = int(np.prod(self.slot_shape[1:], dtype=np.int64)) * self.dtype.itemsize
+
+        # Running
+        self.queue = Queue(maxsize=QueueSize)
+        self.num_buffers = int()  # buffers received
+        self.bytes_written = int()  # bytes of data on disk (excluding header)
+        self.queue_full_events = int()  # times the callback had to wait on the writer
+        self.closed = False
+        self._block = np.empty(self.block_size, dtype=np.uint8)
+        self._block_fill = int()
+        self._file = None
+
+    def put(self, Buffer):
+        """
+        Queue one buffer for writing (called from the DAQ callback)
+
+        The buffer is not copied & must not be modified afterwards.
+
+        :param Buffer: array of slot shape
+        :rtype: None
+        """
+        if self.closed:
+            return
+        self.num_buffers += 1
+        try:
+            self.queue.put_nowait(Buffer)
+        except Full:
+            self.queue_full_events += 1
+            self.queue.put(Buffer)
+
+    def run(self):
+        self._file = open(self.filename, "wb")
+        self._write_header()
+        while True:
+            try:
+                _buffer = self.queue.get(timeout=self.flush_interval)
+            except Empty:
+                self._flush(Final=False)
+                continue
+            if _buffer is None:
+                break
+            self._append(_buffer)
+        self._flush(Final=True)
+        self._file.close()
+
+    def timeToSave(self):
+        if self.closed:
+            return True
+        if not self.is_alive() and self._file is None:
+            self.start()
+        self.closed = True
+        self.queue.put(None)
+        self.join()
+        return True
+
+    @property
+    def shape(self):
+        """
+        Shape of the array on disk, (channels, samples)
+
+        :rtype: tuple
+        """
+        _samples = self.bytes_written // self.bytes_per_sample
+        return tuple(reversed(self.slot_shape[1:])) + (_samples, )
+
+    def _append(self, Buffer):
+        _bytes = memoryview(np.ascontiguousarray(Buffer, dtype=self.dtype)).cast("B")
+        _offset = int()
+        while _offset < _bytes.nbytes:
+            _count = min(self.block_size - self._block_fill, _bytes.nbytes - _offset)
+            self._block[self._block_fill:self._block_fill + _count] = _bytes[_offset:_offset + _count]
+            self._block_fill += _count
+            _offset += _count
+            if self._block_fill == self.block_size:
+                self._flush(Final=False)
+
+    def _flush(self, Final):
+        # Only whole aligned pages are written until the file is closed, the remainder waits in the block
+        if Final:
+            _count = self._block_fill
+        else:
+            _count = self._block_fill - (self._block_fill % _HEADER_SIZE)
+        if _count == 0:
+            return
+        self._file.write(self._block[:_count].data)
+        self.bytes_written += _count
+        self._block[:self._block_fill - _count] = self._block[_count:self._block_fill]
+        self._block_fill -= _count
+        self._write_header()
+
+    def _write_header(self):
+        _position = self._file.tell()
+        self._file.seek(0)
+        self._file.write(_npy_header(self.dtype, self.shape, True))
+        self._file.seek(max(_position, _HEADER_SIZE))
+        self._file.flush()
+
+
+class MemmapSaver(SessionBuffer):
+    """
+    Session buffer whose slots live in a growable memory-mapped .npy file
+
+    The file is preallocated for the expected session and extended by whole chunks when needed; each extension is
+    mapped on its own, so slots already handed out stay valid. Callbacks write straight into the file and acquisition
+    memory no longer scales with session length. Saving fixes up the header to the filled length and trims the unused
+    preallocation, after which the session opens with np.load(mmap_mode='r').
+
+    Implements the same start/put/timeToSave interface as StreamingSaver (start & put have nothing left to do).
+    """
+    def __init__(self, Filename, SlotShape, DataType, ExpectedSlots, ChunkSlots=None):
+        self.filename = Filename
+        self.closed = False
+        self.slot_bytes = int(np.prod(SlotShape, dtype=np.int64)) * np.dtype(DataType).itemsize
+        with open(self.filename, "wb") as f:
+            f.write(_npy_header(DataType, (0, ), True))
+        SessionBuffer.__init__(self, SlotShape, DataType, ExpectedSlots, ChunkSlots)
+        self._write_header(self.capacity)  # Until saved the header spans the whole (zero-filled) preallocation
+
+    def start(self):
+        return
+
+    def put(self, Buffer):
+        return
+
+    def timeToSave(self):
+        if self.closed:
+            return True
+        self.closed = True
+        for _chunk in self.chunks:
+            _chunk.flush()
+        self._write_header(self.num_slots)
+        self.chunks = []
+        try:
+            with open(self.filename, "r+b") as f:
+                f.truncate(_HEADER_SIZE + self.num_slots * self.slot_bytes)
+        except OSError:
+            pass  # Windows refuses while views are still mapped elsewhere; the header already excludes the tail
+        return True
+
+    @property
+    def data(self):
+        return np.memmap(self.filename, dtype=self.dtype, mode="r", offset=_HEADER_SIZE,
+                         shape=(self.num_slots, *self.slot_shape))
+
+    def grow(self):
+        SessionBuffer.grow(self)
+        self._write_header(self.capacity)
+
+    def _allocate(self, Slots):
+        _offset = _HEADER_SIZE + self.capacity * self.slot_bytes
+        with open(self.filename, "r+b") as f:
+            f.truncate(_offset + Slots * self.slot_bytes)
+        return np.memmap(self.filename, dtype=self.dtype, mode="r+", offset=_offset, shape=(Slots, *self.slot_shape))
+
+    def _write_header(self, Slots):
+        _samples = Slots * (self.slot_shape[0] if self.slot_shape else 1)
+        with open(self.filename, "r+b") as f:
+            f.write(_npy_header(self.dtype, tuple(reversed(self.slot_shape[1:])) + (_samples, ), True))
+
+
+class PackedDigitalSaver:
+    """
+    Bit-packing codec in front of the saver of a digital input
+
+    Each (samples, channels) uint8 buffer of lines is packed along samples (np.packbits, little bit order, any nonzero
+    sample is high): a byte holds 8 consecutive samples of one line & buffers are padded to whole bytes. The file is a
+    (channels, packed bytes) <name>_packed.npy, one eighth of the lines as read, with a <name>_packed.txt sidecar
+    (samples per buffer, channels) for PackedDigital to unpack it.
+
+    Implements the same start/put/timeToSave interface as StreamingSaver.
+    """
+    def __init__(self, Storage, Filename, SlotShape, ExpectedSlots, ChunkSlots=None):
+        self.filename = Filename
+        self.slot_shape = tuple(SlotShape)
+        self.packed_shape = (-(-self.slot_shape[0] // 8), *self.slot_shape[1:])
+        self.packed, self.saver = session_store(Storage, _packed_filename(Filename), self.packed_shape, np.uint8,
+                                                ExpectedSlots, ChunkSlots)
+        with open(_packed_sidecar(Filename), "w") as f:
+            f.write(",".join([str(self.slot_shape[0]), str(int(np.prod(self.slot_shape[1:], dtype=np.int64)))]))
+
+    def start(self):
+        self.saver.start()
+
+    def put(self, Buffer):
+        """
+        Pack one buffer into the next packed slot & hand it to the saver
+
+        :param Buffer: uint8 array of slot shape
+        :rtype: None
+        """
+        _slot = self.packed.next_slot()
+        _slot[...] = np.packbits(Buffer, axis=0, bitorder="little")
+        self.saver.put(_slot)
+
+    def timeToSave(self):
+        return self.saver.timeToSave()
+
+
+class PackedDigital:
+    """
+    Reader of a digital input saved by PackedDigitalSaver
+
+    The packed file is memory-mapped; channel unpacks one line (only the bytes of its row & sample range), unpack
+    expands every line at once (vectorized over buffers).
+    """
+    def __init__(self, Filename):
+        # Filename as passed to the saver, i.e., <name>.npy
+        with open(_packed_sidecar(Filename), "r") as f:
+            self.samples_per_buffer, self.num_channels = [int(_value) for _value in f.readline().split(",")[:2]]
+        self.bytes_per_buffer = -(-self.samples_per_buffer // 8)
+        self.packed = np.load(_packed_filename(Filename), mmap_mode="r")
+        self.num_buffers = self.packed.shape[-1] // self.bytes_per_buffer
+        self.num_samples = self.num_buffers * self.samples_per_buffer
+
+    def __len__(self):
+        return self.num_samples
+
+    def channel(self, Channel, Start=0, Stop=None):
+        """
+        Samples [Start, Stop) of one line, the other lines stay packed
+
+        :rtype: numpy.ndarray
+        """
+        return self._unpack(self.packed[Channel] if self.packed.ndim == 2 else self.packed, Start, Stop)
+
+    def unpack(self, Start=0, Stop=None):
+        """
+        Samples [Start, Stop) of every line, (channels, samples) as the unpacked input would have been saved
+        ((samples, ) for single lines)
+
+        :rtype: numpy.ndarray
+        """
+        return self._unpack(self.packed, Start, Stop)
+
+    def _unpack(self, Packed, Start, Stop):
+        # Unpacks only the buffers overlapping [Start, Stop)
+        Stop = self.num_samples if Stop is None else min(Stop, self.num_samples)
+        if Stop <= Start:
+            return np.zeros((*Packed.shape[:-1], 0), dtype=np.uint8)
+        _first = Start // self.samples_per_buffer
+        _last = (Stop - 1) // self.samples_per_buffer + 1
+        _lines = _unpack_buffers(Packed[..., _first * self.bytes_per_buffer:_last * self.bytes_per_buffer],
+                                 self.samples_per_buffer)
+        return _lines[..., Start - _first * self.samples_per_buffer:Stop - _first * self.samples_per_buffer]
+
+
+def _unpack_buffers(Packed, SamplesPerBuffer):
+    # (..., buffers * packed bytes) -> (..., buffers * samples), dropping the padding bits of every buffer
+    _bytes_per_buffer = -(-SamplesPerBuffer // 8)
+    _packed = np.asarray(Packed).reshape(*Packed.shape[:-1], -1, _bytes_per_buffer)
+    _lines = np.unpackbits(_packed, axis=-1, bitorder="little")[..., :SamplesPerBuffer]
+    return _lines.reshape(*Packed.shape[:-1], -1)
+
+
+def _packed_filename(Filename):
+    return "".join([path.splitext(Filename)[0], "_packed.npy"])
+
+
+def _packed_sidecar(Filename):
+    return "".join([path.splitext(Filename)[0], "_packed.txt"])
+
+
+class DigitalEdges:
+    """
+    Edge-encoded digital input: per channel, the sample indices (int64) of its rising & falling edges
+
+    Built incrementally from every (samples, channels) buffer as it is persisted. The last sample of each line carries
+    over to the next buffer, so edges on buffer boundaries are neither lost nor doubled; lines start low, a line high
+    from the first sample rises at 0. Lines mostly constant for hours (licks, rewards, gate) cost a few bytes per
+    event instead of one byte per sample, and dense lines or [rise, fall) intervals are expanded on demand.
+
+    Saved as <name>_edges.npz; implements the same start/put/timeToSave interface as StreamingSaver.
+    """
+    def __init__(self, Channels, ExpectedEvents=4096, Filename=None):
+        self.filename = Filename
+        self.num_channels = int(Channels)
+        self.num_samples = int()
+        self.rising = [SessionBuffer((), np.int64, ExpectedEvents) for _ in range(self.num_channels)]
+        self.falling = [SessionBuffer((), np.int64, ExpectedEvents) for _ in range(self.num_channels)]
+        self._last = np.zeros(self.num_channels, dtype=np.int8)  # carry-over, last sample of the previous buffer
+
+    def __len__(self):
+        return self.num_samples
+
+    def update(self, Buffer):
+        """
+        Append the edges of one buffer
+
+        :param Buffer: (samples, channels) or (samples, ) lines, any nonzero sample is high
+        :rtype: None
+        """
+        _lines = (np.asarray(Buffer).reshape(Buffer.shape[0], -1) != 0).view(np.int8)
+        _changes = np.diff(_lines, axis=0, prepend=self._last[np.newaxis])
+        if _changes.any():
+            for _channel in range(self.num_channels):
+                self.rising[_channel].extend(self.num_samples + np.flatnonzero(_changes[:, _channel] > 0))
+                self.falling[_channel].extend(self.num_samples + np.flatnonzero(_changes[:, _channel] < 0))
+        self._last[:] = _lines[-1]
+        self.num_samples += _lines.shape[0]
+
+    def edges(self, Channel):
+        """
+        Rising & falling edges of one line (sample indices)
+
+        :rtype: tuple
+        """
+        return self.rising[Channel].data, self.falling[Channel].data
+
+    def intervals(self, Channel, Start=0, Stop=None):
+        """
+        [rise, fall) sample intervals the line was high, clipped to samples [Start, Stop); a line still high at the end
+        of the session closes at the last sample acquired
+
+        :rtype: numpy.ndarray
+        """
+        Stop = self.num_samples if Stop is None else min(Stop, self.num_samples)
+        _rising, _falling = self.edges(Channel)
+        _falling = np.concatenate([_falling, np.full(_rising.shape[0] - _falling.shape[0], self.num_samples,
+                                                     dtype=np.int64)])
+        _first = int(np.searchsorted(_falling, Start, side="right"))
+        _last = int(np.searchsorted(_rising, Stop, side="left"))
+        _intervals = np.stack([_rising[_first:_last], _falling[_first:_last]], axis=1)
+        return np.clip(_intervals, Start, max(Stop, Start))
+
+    def dense(self, Channel, Start=0, Stop=None):
+        """
+        Samples [Start, Stop) of one line expanded to uint8, as it was read
+
+        :rtype: numpy.ndarray
+        """
+        Stop = self.num_samples if Stop is None else min(Stop, self.num_samples)
+        _steps = np.zeros(max(Stop - Start, 0) + 1, dtype=np.int8)
+        _intervals = self.intervals(Channel, Start, Stop) - Start
+        np.add.at(_steps, _intervals[:, 0], 1)
+        np.add.at(_steps, _intervals[:, 1], -1)
+        return np.cumsum(_steps[:-1], dtype=np.int8).view(np.uint8)
+
+    def unpack(self, Start=0, Stop=None):
+        """
+        Samples [Start, Stop) of every line expanded, (channels, samples) as the lines were read
+
+        :rtype: numpy.ndarray
+        """
+        return np.stack([self.dense(_channel, Start, Stop) for _channel in range(self.num_channels)])
+
+    def start(self):
+        return
+
+    def put(self, Buffer):
+        self.update(Buffer)
+
+    def timeToSave(self):
+        np.savez(_edges_filename(self.filename), num_samples=np.int64(self.num_samples),
+                 **{"".join(["rising_", str(_channel)]): self.rising[_channel].data
+                    for _channel in range(self.num_channels)},
+                 **{"".join(["falling_", str(_channel)]): self.falling[_channel].data
+                    for _channel in range(self.num_channels)})
+        return True
+
+    @classmethod
+    def load(cls, Filename):
+        """
+        Edges saved by timeToSave (Filename as passed to the saver, i.e., <name>.npy)
+
+        :rtype: DigitalEdges
+        """
+        with np.load(_edges_filename(Filename)) as _file:
+            _channels = sum(1 for _key in _file.files if _key.startswith("rising_"))
+            _edges = cls(_channels, Filename=Filename)
+            _edges.num_samples = int(_file["num_samples"])
+            for _channel in range(_channels):
+                _edges.rising[_channel] = _event_buffer(_file["".join(["rising_", str(_channel)])])
+                _edges.falling[_channel] = _event_buffer(_file["".join(["falling_", str(_channel)])])
+        return _edges
+
+
+def _event_buffer(Events):
+    _buffer = SessionBuffer((), np.int64, Events.shape[0])
+    _buffer.chunks[0][:Events.shape[0]] = Events
+    _buffer.num_slots = Events.shape[0]
+    return _buffer
+
+
+def _edges_filename(Filename):
+    return "".join([path.splitext(Filename)[0], "_edges.npz"])
+
+
+class FrameStore:
+    """
+    Memory-mapped store of camera frames split over fixed-size chunk files
+
+    Every chunk file is a .npy of (chunk frames, height, width[, colors]) uint8 preallocated for ChunkDuration of
+    frames; only the chunk being filled is mapped, finished chunks are flushed & released, so memory stays bounded for
+    any session length. Frames are written straight into the mapped chunk. Frame (trial) IDs & DAQ buffer IDs are kept
+    in parallel fixed-dtype arrays, one entry per frame. Closing fixes up the header of the last chunk to its filled
+    length & trims the unused preallocation.
+
+    Chunks are named <file prefix>_Frame_0000.npy, _Frame_0001.npy, ... (see frame_chunks).
+    """
+    def __init__(self, FilePrefix, FrameShape, FrameRate, ChunkDuration=60.0, ExpectedDuration=3600.0):
+        # Collect
+        self.file_prefix = FilePrefix
+        self.frame_shape = tuple(FrameShape)
+        self.dtype = np.dtype(np.uint8)
+        self.frame_rate = FrameRate  # (units: Hz)
+
+        # Derivations
+        self.chunk_frames = max(int(np.ceil(ChunkDuration * FrameRate)), 1)
+        self.frame_bytes = int(np.prod(self.frame_shape, dtype=np.int64))
+        _expected_frames = max(int(np.ceil(ExpectedDuration * FrameRate)), 1)
+
+        # Parallel per-frame IDs
+        self.frame_ids = SessionBuffer((), np.int32, _expected_frames, self.chunk_frames)
+        self.buffer_ids = SessionBuffer((), np.int64, _expected_frames, self.chunk_frames)
+
+        # Running
+        self.filenames = []
+        self.num_frames = int()
+        self.closed = False
+        self._chunk = None
+        self._chunk_fill = int()
+
+    def __len__(self):
+        return self.num_frames
+
+    def next_frame(self, FrameID, BufferID):
+        """
+        Claim the next frame and return a writable view of it in the mapped chunk
+
+        :param FrameID: trial (or state) the frame belongs to
+        :param BufferID: DAQ buffer acquired with the frame
+        :rtype: numpy.ndarray
+        """
+        if self._chunk is None or self._chunk_fill == self.chunk_frames:
+            self._open_chunk()
+        _frame = self._chunk[self._chunk_fill]
+        self._chunk_fill += 1
+        self.num_frames += 1
+        self.frame_ids.write(FrameID)
+        self.buffer_ids.write(BufferID)
+        return _frame
+
+    def write(self, Frame, FrameID, BufferID):
+        """
+        Copy one frame into the next slot of the store
+
+        :rtype: numpy.ndarray
+        """
+        _frame = self.next_frame(FrameID, BufferID)
+        _frame[...] = Frame
+        return _frame
+
+    def close(self):
+        """
+        Flush the last chunk & trim it to the frames written
+
+        :rtype: None
+        """
+        if self.closed:
+            return
+        self.closed = True
+        self._close_chunk(self._chunk_fill)
+
+    def _open_chunk(self):
+        self._close_chunk(self.chunk_frames)
+        _filename = _frame_chunk_filename(self.file_prefix, self.filenames.__len__())
+        with open(_filename, "wb") as f:
+            f.write(_npy_header(self.dtype, (self.chunk_frames, *self.frame_shape), False))
+            f.truncate(_HEADER_SIZE + self.chunk_frames * self.frame_bytes)
+        self.filenames.append(_filename)
+        self._chunk = np.memmap(_filename, dtype=self.dtype, mode="r+", offset=_HEADER_SIZE,
+                                shape=(self.chunk_frames, *self.frame_shape))
+        self._chunk_fill = int()
+
+    def _close_chunk(self, Frames):
+        if self._chunk is None:
+            return
+        self._chunk.flush()
+        self._chunk = None
+        if Frames == self.chunk_frames:
+            return
+        with open(self.filenames[-1], "r+b") as f:
+            f.write(_npy_header(self.dtype, (Frames, *self.frame_shape), False))
+        try:
+            with open(self.filenames[-1], "r+b") as f:
+                f.truncate(_HEADER_SIZE + Frames * self.frame_bytes)
+        except OSError:
+            pass  # Windows refuses while views are still mapped elsewhere; the header already excludes the tail
+
+
+def frame_chunks(FilePrefix):
+    """
+    Read-only memory maps of the chunk files written by a FrameStore, in order
+
+    :param FilePrefix: file prefix the store was created with
+    :rtype: list
+    """
+    _chunks = []
+    while path.exists(_frame_chunk_filename(FilePrefix, _chunks.__len__())):
+        _chunks.append(np.load(_frame_chunk_filename(FilePrefix, _chunks.__len__()), mmap_mode="r"))
+    return _chunks
+
+
+def _frame_chunk_filename(FilePrefix, Chunk):
+    return "".join([FilePrefix, "_Frame_", "{:04d}".format(Chunk), ".npy"])
+
+
+class JPEGStore:
+    """
+    Length-prefixed container of compressed (MJPEG passthrough) camera frames with a frame-offset index
+
+    Each frame is appended to <file prefix>_MJPEG.bin as a little-endian uint32 payload length followed by the JPEG
+    payload exactly as the camera sent it. The byte offset of every payload is indexed in a parallel int64 array next
+    to the frame (trial) & DAQ buffer IDs; closing saves it as <file prefix>_MJPEG_index.npy (see jpeg_frame).
+    """
+    def __init__(self, FilePrefix, FrameShape, FrameRate, ExpectedDuration=3600.0, WriteBuffer=4194304):
+        # Collect
+        self.file_prefix = FilePrefix
+        self.frame_shape = tuple(FrameShape)  # decoded frame shape
+        self.frame_rate = FrameRate  # (units: Hz)
+        self.filename = "".join([FilePrefix, "_MJPEG.bin"])
+        self.index_filename = "".join([FilePrefix, "_MJPEG_index.npy"])
+
+        # Parallel per-frame offsets & IDs
+        _expected_frames = max(int(np.ceil(ExpectedDuration * FrameRate)), 1)
+        self.offsets = SessionBuffer((), np.int64, _expected_frames)
+        self.frame_ids = SessionBuffer((), np.int32, _expected_frames)
+        self.buffer_ids = SessionBuffer((), np.int64, _expected_frames)
+
+        # Running
+        self.num_frames = int()
+        self.bytes_written = int()
+        self.closed = False
+        self._file = open(self.filename, "wb", buffering=WriteBuffer)
+
+    def __len__(self):
+        return self.num_frames
+
+    @property
+    def filenames(self):
+        return [self.filename, self.index_filename]
+
+    def write(self, Frame, FrameID, BufferID):
+        """
+        Append one compressed frame
+
+        :param Frame: JPEG payload (uint8 array or bytes)
+        :param FrameID: trial (or state) the frame belongs to
+        :param BufferID: DAQ buffer acquired with the frame
+        :rtype: None
+        """
+        if self.closed:
+            return
+        _payload = memoryview(np.ascontiguousarray(Frame, dtype=np.uint8)).cast("B")
+        self._file.write(np.array(_payload.nbytes, dtype="<u4").tobytes())
+        self._file.write(_payload)
+        self.offsets.write(self.bytes_written + 4)
+        self.frame_ids.write(FrameID)
+        self.buffer_ids.write(BufferID)
+        self.bytes_written += 4 + _payload.nbytes
+        self.num_frames += 1
+
+    def close(self):
+        """
+        Close the container & save the frame-offset index
+
+        :rtype: None
+        """
+        if self.closed:
+            return
+        self.closed = True
+        self._file.close()
+        np.save(self.index_filename, self.offsets.data)
+
+
+def jpeg_frame(Container, Index, Frame):
+    """
+    JPEG payload of one frame of a JPEGStore container, without reading the rest of the file
+
+    :param Container: read-only np.memmap (uint8) of <file prefix>_MJPEG.bin
+    :param Index: frame-offset index (<file prefix>_MJPEG_index.npy)
+    :param Frame: frame number
+    :rtype: numpy.ndarray
+    """
+    _offset = int(Index[Frame])
+    _length = int(Container[_offset - 4:_offset].view("<u4")[0])
+    return Container[_offset:_offset + _length]
+
+
+def session_store(Storage, Filename, SlotShape, DataType, ExpectedSlots, ChunkSlots=None):
+    """
+    Session buffer & saver pair for one stream of DAQ buffers
+
+    :param Storage: "stream" (in-memory buffer & StreamingSaver) or "memmap" (MemmapSaver acting as both)
+    :rtype: tuple
+    """
+    if Storage == "memmap":
+        _buffer = MemmapSaver(Filename, SlotShape, DataType, ExpectedSlots, ChunkSlots)
+        return _buffer, _buffer
+    _buffer = SessionBuffer(SlotShape, DataType, ExpectedSlots, ChunkSlots)
+    _saver = StreamingSaver(SlotShape, DataType)
+    _saver.filename = Filename
+    return _buffer, _saver
+
+
+class ScaledAnalog:
+    """
+    Lazy float64 (volts) view of raw int16 analog data
+
+    Indexing reads only the requested counts from the (channels, samples) array (typically memory-mapped) & scales
+    them with the per-channel polynomial of the driver, volts = c0 + c1 * counts + c2 * counts ** 2 + ...
+    """
+    def __init__(self, Counts, Coefficients):
+        self.counts = Counts
+        self.coefficients = np.asarray(Coefficients, dtype=np.float64)  # (channels, coefficients)
+        self.dtype = np.dtype(np.float64)
+
+    def __len__(self):
+        return self.counts.shape[0]
+
+    @property
+    def shape(self):
+        return self.counts.shape
+
+    def __getitem__(self, Key):
+        _key = Key if isinstance(Key, tuple) else (Key, )
+        _counts = np.asarray(self.counts[_key]).astype(np.float64)
+        _coefficients = self.coefficients[_key[0]]
+        _coefficients = _coefficients.reshape(_coefficients.shape[:-1] + (1, ) * (_counts.ndim - _coefficients.ndim + 1)
+                                              + _coefficients.shape[-1:])
+        _volts = np.zeros(_counts.shape, dtype=np.float64)
+        for _order in reversed(range(_coefficients.shape[-1])):  # Horner
+            _volts *= _counts
+            _volts += _coefficients[..., _order]
+        return _volts
+
+    def __array__(self, dtype=None, copy=None):
+        return self[:, :] if dtype is None else self[:, :].astype(dtype)
+
+
+def save_scaling(Filename, Coefficients):
+    """
+    Save the per-channel scaling coefficients of raw analog data next to it (<name>_scaling.npy)
+
+    :rtype: None
+    """
+    np.save(_scaling_filename(Filename), np.asarray(Coefficients, dtype=np.float64))
+
+
+def load_analog(Filename):
+    """
+    Saved analog data as (channels, samples) volts: the memory-mapped array itself, or a ScaledAnalog view of raw
+    counts when scaling coefficients were saved with it
+
+    :rtype: numpy.ndarray or ScaledAnalog
+    """
+    _data = np.load(Filename, mmap_mode="r")
+    if not path.exists(_scaling_filename(Filename)):
+        return _data
+    return ScaledAnalog(_data, np.load(_scaling_filename(Filename)))
+
+
+def _scaling_filename(Filename):
+    return "".join([path.splitext(Filename)[0], "_scaling.npy"])
+
+
+def load_digital(Filename):
+    """
+    Saved digital input as (channels, samples) lines ((samples, ) for single lines saved as read or packed) whatever
+    its packing: the memory-mapped lines as read, or the packed or edge-encoded lines expanded
+
+    :param Filename: file name the input was saved with, i.e., <name>.npy
+    :rtype: numpy.ndarray
+    """
+    if path.exists(_packed_filename(Filename)):
+        return PackedDigital(Filename).unpack()
+    if path.exists(_edges_filename(Filename)):
+        return DigitalEdges.load(Filename).unpack()
+    return np.load(Filename, mmap_mode="r")
+
+
+def digital_store(Storage, Packing, Filename, SlotShape, DataType, ExpectedSlots, ChunkSlots=None, RingSlots=256):
+    """
+    Session buffer & saver pair for one digital input
+
+    Packed & edge-encoded inputs only keep the newest RingSlots buffers as read (a SlotRing, enough for the
+    processing backlog); the session itself is persisted packed or as edges.
+
+    :param Storage: "stream" or "memmap" (see session_store)
+    :param Packing: "packed" (uint8 lines saved at 1 bit per sample, see PackedDigitalSaver), "edges" (only the edges
+        of uint8 lines, see DigitalEdges) or "lines" (as read)
+    :rtype: tuple
+    """
+    if Packing == "packed" and np.dtype(DataType) == np.uint8:
+        _buffer = SlotRing(SlotShape, DataType, RingSlots)
+        return _buffer, PackedDigitalSaver(Storage, Filename, SlotShape, ExpectedSlots, ChunkSlots)
+    if Packing == "edges" and np.dtype(DataType) == np.uint8:
+        _buffer = SlotRing(SlotShape, DataType, RingSlots)
+        return _buffer, DigitalEdges(int(np.prod(SlotShape[1:], dtype=np.int64)), Filename=Filename)
+    return session_store(Storage, Filename, SlotShape, DataType, ExpectedSlots, ChunkSlots)
+
+
+def _npy_header(DataType, Shape, FortranOrder):
+    """
+    Fixed-size .npy (version 1.0) header so data can be appended & the header rewritten in place
+
+    :rtype: bytes
+    """
+    _dict = {"descr": np.lib.format.dtype_to_descr(np.dtype(DataType)), "fortran_order": FortranOrder,
+             "shape": tuple(int(_dim) for _dim in Shape)}
+    _header = repr(_dict).encode("latin1")
+    _header_length = _HEADER_SIZE - 10  # magic (6) + version (2) + header length (2)
+    _header = _header + b" " * (_header_length - _header.__len__() - 1) + b"\n"
+    return b"\x93NUMPY\x01\x00" + np.array(_header_length, dtype="<u2").tobytes() + _header
@@ -0,0 +1,368 @@
+"""
+Hardware-free stand-in for the parts of PyDAQmx used by the behavioral tasks
+
+Select it by setting the environment variable DAQ_BACKEND=simulated before importing the tasks (see DAQBackend.py).
+The master task (the one with a sample clock & an EveryNSamples event) is driven by a virtual clock:
+
+    realtime: callbacks fire every buffer on the wall clock, like the hardware
+    fast: callbacks fire back-to-back as fast as they are processed (benchmarks)
+    manual: callbacks only fire when device.step() is called (tests)
+
+The clock mode defaults to DAQ_SIMULATED_CLOCK (realtime if unset). Every other read is aligned to the samples
+acquired by the master clock & every physical channel can be scripted with a waveform, e.g.
+
+    device.script("BurrowDAQ/port0/line3", pulse_train(0.125, 0.02, Start=60.0))  # licks at 8 Hz after a minute
+    device.script("BurrowDAQ/ai1", steps((0.0, 5.0, 15.0), (0.0, 4.9, 0.0)))  # motor position
+"""
+import ctypes
+import re
+import numpy as np
+from os import environ
+from threading import Thread, Event, current_thread
+from time import perf_counter, sleep
+
+
+# Types
+int32 = ctypes.c_int32
+uInt32 = ctypes.c_uint32
+uInt64 = ctypes.c_uint64
+float64 = ctypes.c_double
+bool32 = ctypes.c_uint32
+
+# Constants (values match NIDAQmx.h)
+DAQmx_Val_Volts = 10348
+DAQmx_Val_RSE = 10083
+DAQmx_Val_Rising = 10280
+DAQmx_Val_ContSamps = 10123
+DAQmx_Val_FiniteSamps = 10178
+DAQmx_Val_OnDemand = 10390
+DAQmx_Val_Acquired_Into_Buffer = 1
+DAQmx_Val_GroupByChannel = 0
+DAQmx_Val_GroupByScanNumber = 1
+DAQmx_Val_ChanPerLine = 0
+DAQmx_Val_ChanForAllLines = 1
+
+
+class DAQException(Exception):
+    pass
+
+
+class DAQError(DAQException):
+    pass
+
+
+class DAQWarning(DAQException, Warning):
+    pass
+
+
+# Waveforms: callables mapping sample indices (int64 array) & the sampling rate (Hz) to channel values
+
+
+def constant(Value):
+    def _waveform(SampleIndices, SamplingRate):
+        return np.full(SampleIndices.shape, Value, dtype=np.float64)
+    return _waveform
+
+
+def pulse_train(Period, Width, Start=0.0, Stop=None, High=1.0, Low=0.0):
+    """
+    Periodic pulses (licks, rewards, gate triggers)
+
+    :param Period: time between pulse onsets (units: s)
+    :param Width: pulse duration (units: s)
+    :param Start: first pulse onset (units: s)
+    :param Stop: no pulses after this time (units: s)
+    """
+    def _waveform(SampleIndices, SamplingRate):
+        # Whole samples so pulses do not jitter with floating point error
+        _samples = SampleIndices - round(Start * SamplingRate)
+        _active = (_samples >= 0) & (np.mod(_samples, round(Period * SamplingRate)) < round(Width * SamplingRate))
+        if Stop is not None:
+            _active &= SampleIndices < round(Stop * SamplingRate)
+        return np.where(_active, High, Low)
+    return _waveform
+
+
+def steps(Times, Levels):
+    """
+    Piecewise-constant levels (e.g., motor position)
+
+    :param Times: onset of each level (units: s, ascending)
+    :param Levels: value held from the matching onset on
+    """
+    _times = np.asarray(Times, dtype=np.float64)
+    _levels = np.asarray(Levels, dtype=np.float64)
+
+    def _waveform(SampleIndices, SamplingRate):
+        _index = np.searchsorted(_times, SampleIndices / SamplingRate, side="right") - 1
+        return np.where(_index >= 0, _levels[np.clip(_index, 0, None)], 0.0)
+    return _waveform
+
+
+def noise(Scale, Offset=0.0, Seed=0):
+    def _waveform(SampleIndices, SamplingRate):
+        return Offset + Scale * np.random.default_rng(Seed + int(SampleIndices[:1].sum())).standard_normal(
+            SampleIndices.shape)
+    return _waveform
+
+
+class SimulatedDevice:
+    """
+    Shared state of the simulated devices: master sample clock, scripted inputs & last written outputs
+    """
+    def __init__(self):
+        self.mode = environ.get("DAQ_SIMULATED_CLOCK", "realtime").lower()
+        self.sampling_rate = 1000  # (units: Hz)
+        self.sample_index = int()  # samples acquired by the master clock
+        self.waveforms = {}
+        self.outputs = {}
+        self.master = None
+
+    def script(self, Channel, Waveform):
+        """
+        Drive a physical channel (e.g., "BurrowDAQ/port0/line3") with a waveform
+
+        :rtype: None
+        """
+        self.waveforms[Channel] = Waveform
+
+    def reset(self):
+        self.sample_index = int()
+        self.waveforms = {}
+        self.outputs = {}
+        self.master = None
+
+    def time(self):
+        """
+        Virtual time of the master clock (units: s)
+
+        :rtype: float
+        """
+        return self.sample_index / self.sampling_rate
+
+    def step(self, Buffers=1):
+        """
+        Acquire buffers on the master task & run its callbacks in the calling thread (any clock mode)
+
+        :rtype: None
+        """
+        for _ in range(Buffers):
+            self.master._tick()
+
+    def sample(self, Channels, Start, Count):
+        """
+        Scripted values of channels for samples [Start, Start + Count)
+
+        :rtype: numpy.ndarray
+        """
+        _indices = np.arange(Start, Start + Count, dtype=np.int64)
+        _values = np.zeros((Channels.__len__(), Count), dtype=np.float64)
+        for _row, _channel in enumerate(Channels):
+            if _channel in self.waveforms:
+                _values[_row] = self.waveforms[_channel](_indices, self.sampling_rate)
+        return _values
+
+
+device = SimulatedDevice()
+
+
+class Task:
+    """
+    Simulated DAQmx task
+    """
+    def __init__(self, name=""):
+        self.name = name
+        self.channels = []
+        self.sampling_rate = None
+        self.samples_per_event = None
+        self.read_position = int()  # next sample this task reads
+        self.running = False
+        self._every_n_name = None
+        self._done_name = None
+        self._clock = None
+        self._stop = Event()
+
+    # Channels
+
+    def CreateAIVoltageChan(self, physicalChannel, nameToAssignToChannel, terminalConfig, minVal, maxVal, units,
+                            customScaleName):
+        self.channels.extend(_expand_channels(physicalChannel))
+        self.voltage_range = (minVal, maxVal)
+        return 0
+
+    def CreateAOVoltageChan(self, physicalChannel, nameToAssignToChannel, minVal, maxVal, units, customScaleName):
+        self.channels.extend(_expand_channels(physicalChannel))
+        return 0
+
+    def CreateDIChan(self, lines, nameToAssignToLines, lineGrouping):
+        self.channels.extend(_expand_channels(lines))
+        return 0
+
+    def CreateDOChan(self, lines, nameToAssignToLines, lineGrouping):
+        self.channels.extend(_expand_channels(lines))
+        return 0
+
+    # Timing & Events
+
+    def CfgSampClkTiming(self, source, rate, activeEdge, sampleMode, sampsPerChan):
+        self.sampling_rate = rate
+        return 0
+
+    def AutoRegisterEveryNSamplesEvent(self, everyNsamplesEventType, nSamples, options, name='EveryNCallback'):
+        self.samples_per_event = int(nSamples)
+        self._every_n_name = name
+        return 0
+
+    def AutoRegisterDoneEvent(self, options, name='DoneCallback'):
+        self._done_name = name
+        return 0
+
+    def StartTask(self):
+        self.running = True
+        if self.sampling_rate is None or self._every_n_name is None:
+            return 0
+        # Master clock
+        device.master = self
+        device.sampling_rate = self.sampling_rate
+        self.read_position = device.sample_index
+        if device.mode in ("realtime", "fast"):
+            self._stop.clear()
+            self._clock = Thread(target=self._run_clock, daemon=True)
+            self._clock.start()
+        return 0
+
+    def StopTask(self):
+        self.running = False
+        self._stop.set()
+        if self._clock is not None and self._clock is not current_thread() and self._clock.is_alive():
+            self._clock.join()
+        return 0
+
+    def ClearTask(self):
+        self.StopTask()
+        return 0
+
+    # Reads
+
+    def ReadAnalogF64(self, numSampsPerChan, timeout, fillMode, readArray, arraySizeInSamps, sampsPerChanRead,
+                      reserved):
+        _count = self._read(numSampsPerChan, fillMode, readArray)
+        _set_reference(sampsPerChanRead, _count)
+        return 0
+
+    def ReadBinaryI16(self, numSampsPerChan, timeout, fillMode, readArray, arraySizeInSamps, sampsPerChanRead,
+                      reserved):
+        _count = self._read(numSampsPerChan, fillMode, readArray, VoltsPerCount=self._volts_per_count())
+        _set_reference(sampsPerChanRead, _count)
+        return 0
+
+    def ReadDigitalLines(self, numSampsPerChan, timeout, fillMode, readArray, arraySizeInBytes, sampsPerChanRead,
+                         numBytesPerSamp, reserved):
+        _count = self._read(numSampsPerChan, fillMode, readArray)
+        _set_reference(sampsPerChanRead, _count)
+        _set_reference(numBytesPerSamp, 1)
+        return 0
+
+    # Properties
+
+    def GetTaskChannels(self, data, bufferSize):
+        data.value = ", ".join(self.channels).encode()[:bufferSize - 1]
+        return 0
+
+    def GetAIDevScalingCoeff(self, channel, data, arraySizeInElements):
+        # Ideal 16 bit converter spanning the voltage range: volts = counts * range / 2 ** 16
+        _coefficients = np.zeros(arraySizeInElements, dtype=np.float64)
+        _coefficients[1] = self._volts_per_count()
+        np.asarray(data).reshape(-1)[:arraySizeInElements] = _coefficients
+        return 0
+
+    # Writes
+
+    def WriteDigitalLines(self, numSampsPerChan, autoStart, timeout, dataLayout, writeArray, sampsPerChanWritten,
+                          reserved):
+        for _channel, _value in zip(self.channels, np.asarray(writeArray).reshape(-1)):
+            device.outputs[_channel] = int(_value)
+        return 0
+
+    def WriteDigitalScalarU32(self, autoStart, timeout, value, reserved):
+        for _line, _channel in enumerate(self.channels):
+            device.outputs[_channel] = (int(value) >> _line) & 1
+        return 0
+
+    def WriteAnalogF64(self, numSampsPerChan, autoStart, timeout, dataLayout, writeArray, sampsPerChanWritten,
+                       reserved):
+        for _channel, _value in zip(self.channels, np.asarray(writeArray).reshape(-1)):
+            device.outputs[_channel] = float(_value)
+        return 0
+
+    # Clock
+
+    def _run_clock(self):
+        _period = self.samples_per_event / self.sampling_rate  # (units: s)
+        _next = perf_counter() + _period
+        while not self._stop.is_set():
+            if device.mode == "realtime":
+                _wait = _next - perf_counter()
+                if _wait > 0:
+                    sleep(_wait)
+                _next += _period
+            if self._stop.is_set():
+                break
+            self._tick()
+        if self._done_name is not None:
+            getattr(self, self._done_name)(int32(0))
+
+    def _tick(self):
+        device.sample_index += self.samples_per_event
+        getattr(self, self._every_n_name)()
+
+    def _volts_per_count(self):
+        return (self.voltage_range[1] - self.voltage_range[0]) / 65536
+
+    def _read(self, NumberOfSamples, FillMode, ReadArray, VoltsPerCount=None):
+        if not (ReadArray.flags.c_contiguous and ReadArray.flags.writeable):
+            raise TypeError("Read arrays must be C-contiguous & writeable")
+        if self is device.master:
+            _start = self.read_position
+            self.read_position += int(NumberOfSamples)
+        else:
+            _start = device.sample_index - int(NumberOfSamples)  # On-demand reads return the latest samples
+        _values = device.sample(self.channels, _start, int(NumberOfSamples))
+        if VoltsPerCount is not None:  # raw ADC counts
+            _values = np.clip(np.round(_values / VoltsPerCount), -32768, 32767)
+        if FillMode == DAQmx_Val_GroupByScanNumber:
+            _values = _values.T
+        ReadArray.reshape(-1)[:_values.size] = _values.reshape(-1)
+        return int(NumberOfSamples)
+
+
+def _expand_channels(Channels):
+    """
+    Physical channel ranges (e.g., "Dev/ai0:3" or "Dev/port0/line0:4") to single channel names
+
+    :rtype: list
+    """
+    _expanded = []
+    for _channel in Channels.split(","):
+        _channel = _channel.strip()
+        _match = re.match(r"^(.*?)(\d+):(\d+)$", _channel)
+        if _match is None:
+            _expanded.append(_channel)
+            continue
+        _prefix, _first, _last = _match.group(1), int(_match.group(2)), int(_match.group(3))
+        _expanded.extend(["".join([_prefix, str(_line)]) for _line in range(_first, _last + 1)])
+    return _expanded
+
+
+def _set_reference(Reference, Value):
+    # Outputs are passed either as ctypes objects or byref(...) of them
+    if Reference is None:
+        return
+    if hasattr(Reference, "_obj"):
+        Reference._obj.value = Value
+    elif hasattr(Reference, "value"):
+        Reference.value = Value
+
+
+__all__ = ["Task", "int32", "uInt32", "uInt64", "float64", "bool32", "DAQException", "DAQError", "DAQWarning",
+           *[_name for _name in dir() if _name.startswith("DAQmx_Val_")]]
@@ -0,0 +1,124 @@
+import numpy as np
+
+
+class FrameSyncTable:
+    """
+    Maps the frames of every camera to DAQ sample indices
+
+    Anchors are the DAQ callbacks: each one is timestamped (perf_counter_ns) once the samples of its buffer are
+    acquired. Frame grab times (perf_counter_ns, same clock) are linearly interpolated between the anchors (and
+    extrapolated from the first & last segment), giving one int64 sample index per frame. Sample indices never
+    decrease along a camera, so every lookup is a binary search (O(log n)) and aligned slices never touch the videos.
+    """
+    def __init__(self, AnchorTimes, AnchorSamples, SamplingRate):
+        _order = np.argsort(AnchorTimes, kind="stable")
+        self.anchor_times = np.asarray(AnchorTimes, dtype=np.int64)[_order]  # (units: ns)
+        self.anchor_samples = np.asarray(AnchorSamples, dtype=np.int64)[_order]
+        self.sampling_rate = SamplingRate  # (units: Hz)
+        self.cameras = {}  # camera name -> sample index of each frame (int64)
+
+    @classmethod
+    def from_records(cls, Records, BufferSize, SamplingRate):
+        """
+        Sync table anchored on the per-buffer records of a session
+
+        Record n holds the callback that completed samples [(n - 1) * BufferSize, n * BufferSize); the leading
+        placeholder record is not an anchor.
+
+        :param Records: buffer records (see buffer_record_dtype)
+        :param BufferSize: samples per buffer
+        :param SamplingRate: DAQ sampling rate (units: Hz)
+        :rtype: FrameSyncTable
+        """
+        _records = Records[Records["buffer"] > 0]
+        return cls(_records["timestamp"], _records["buffer"].astype(np.int64) * BufferSize, SamplingRate)
+
+    def add_camera(self, Camera, GrabTimes):
+        """
+        Interpolate the sample index of every frame of a camera
+
+        :param Camera: camera name
+        :param GrabTimes: perf_counter_ns at each grab (units: ns)
+        :rtype: numpy.ndarray
+        """
+        _grab_times = np.asarray(GrabTimes, dtype=np.int64)
+        if self.anchor_times.shape[0] == 0:
+            _samples = np.zeros(_grab_times.shape, dtype=np.int64)
+        elif self.anchor_times.shape[0] == 1:
+            _samples = self.anchor_samples[0] + (_grab_times - self.anchor_times[0]) * self.sampling_rate / 1e9
+        else:
+            _samples = np.interp(_grab_times, self.anchor_times, self.anchor_samples)
+            _first_slope = (self.anchor_samples[1] - self.anchor_samples[0]) / \
+                max(self.anchor_times[1] - self.anchor_times[0], 1)
+            _last_slope = (self.anchor_samples[-1] - self.anchor_samples[-2]) / \
+                max(self.anchor_times[-1] - self.anchor_times[-2], 1)
+            _before = _grab_times < self.anchor_times[0]
+            _after = _grab_times > self.anchor_times[-1]
+            _samples[_before] = self.anchor_samples[0] + (_grab_times[_before] - self.anchor_times[0]) * _first_slope
+            _samples[_after] = self.anchor_samples[-1] + (_grab_times[_after] - self.anchor_times[-1]) * _last_slope
+        # Jittery anchors must not reorder frames
+        self.cameras[Camera] = np.maximum.accumulate(np.round(_samples).astype(np.int64))
+        return self.cameras[Camera]
+
+    def frame_to_sample(self, Camera, Frame):
+        """
+        DAQ sample index of a frame
+
+        :rtype: int
+        """
+        return int(self.cameras[Camera][Frame])
+
+    def sample_to_frame(self, Camera, Sample):
+        """
+        Frame of a camera nearest to a DAQ sample
+
+        :rtype: int
+        """
+        _samples = self.cameras[Camera]
+        _frame = int(np.searchsorted(_samples, Sample))
+        if _frame == _samples.shape[0]:
+            return _frame - 1
+        if _frame > 0 and Sample - _samples[_frame - 1] <= _samples[_frame] - Sample:
+            return _frame - 1
+        return _frame
+
+    def sample_to_frames(self, Sample):
+        """
+        Nearest frame of every camera to a DAQ sample
+
+        :rtype: dict
+        """
+        return {_camera: self.sample_to_frame(_camera, Sample) for _camera in self.cameras}
+
+    def frames_between(self, Camera, Start, Stop):
+        """
+        Frames of a camera grabbed during DAQ samples [Start, Stop)
+
+        :rtype: slice
+        """
+        _samples = self.cameras[Camera]
+        return slice(int(np.searchsorted(_samples, Start, side="left")),
+                     int(np.searchsorted(_samples, Stop, side="left")))
+
+    def save(self, Filename):
+        """
+        Save anchors & per-camera sample indices (.npz)
+
+        :rtype: None
+        """
+        np.savez(Filename, anchor_times=self.anchor_times, anchor_samples=self.anchor_samples,
+                 sampling_rate=np.float64(self.sampling_rate), cameras=np.array(list(self.cameras.keys())),
+                 **{"".join(["camera_", _camera]): _samples for _camera, _samples in self.cameras.items()})
+
+    @classmethod
+    def load(cls, Filename):
+        """
+        Sync table saved by save
+
+        :rtype: FrameSyncTable
+        """
+        with np.load(Filename) as _file:
+            _table = cls(_file["anchor_times"], _file["anchor_samples"], float(_file["sampling_rate"]))
+            for _camera in _file["cameras"].tolist():
+                _table.cameras[_camera] = _file["".join(["camera_", _camera])]
+        return _table
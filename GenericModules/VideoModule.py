@@ -0,0 +1,152 @@
+import cv2 as cv
+import numpy as np
+import imageio
+from queue import Queue, Full
+from threading import Thread
+from GenericModules.BufferModule import SessionBuffer
+
+
+class VideoEncoder(Thread):
+    """
+    Streaming video encoder for camera frames
+
+    The capture loop queues frames and a background thread encodes them as they arrive, so the session is on disk as a
+    compressed video by the time acquisition stops & saving only drains the queue. Frame (trial) IDs & DAQ buffer IDs
+    are kept in parallel fixed-dtype arrays, one entry per frame, exactly like FrameStore. A writer failing to open or
+    encode stops the thread; its error is raised by the next write or close, which never wait on a stopped encoder.
+
+    Backends:
+
+        opencv: cv.VideoWriter with a fourcc Codec; "FFV1" is lossless, "MJPG" honors Quality (0 - 100)
+        imageio: imageio-ffmpeg with an ffmpeg Codec; "ffv1" is lossless, "libx264" honors Quality as the crf (0 is
+        lossless, ~18 is visually lossless)
+    """
+    def __init__(self, FilePrefix, FrameShape, FrameRate, Backend="opencv", Codec="FFV1", Quality=None,
+                 ExpectedDuration=3600.0, QueueSize=300):
+        Thread.__init__(self, daemon=True)
+        # Collect
+        self.frame_shape = tuple(FrameShape)
+        self.frame_rate = FrameRate  # (units: Hz)
+        self.backend = Backend
+        self.codec = Codec
+        self.quality = Quality
+        self.filename = "".join([FilePrefix, "_Video", ".avi" if Backend == "opencv" else ".mkv"])
+
+        # Parallel per-frame IDs
+        _expected_frames = max(int(np.ceil(ExpectedDuration * FrameRate)), 1)
+        self.frame_ids = SessionBuffer((), np.int32, _expected_frames)
+        self.buffer_ids = SessionBuffer((), np.int64, _expected_frames)
+
+        # Running
+        self.queue = Queue(maxsize=QueueSize)
+        self.num_frames = int()  # frames received
+        self.encoded_frames = int()
+        self.queue_full_events = int()  # times the capture loop had to wait on the encoder
+        self.closed = False
+        self.error = None  # exception that stopped the encoder thread
+        self._writer = None
+
+    def __len__(self):
+        return self.num_frames
+
+    @property
+    def filenames(self):
+        return [self.filename]
+
+    def write(self, Frame, FrameID, BufferID):
+        """
+        Queue one frame for encoding (called from the capture loop)
+
+        The frame is not copied & must not be modified afterwards.
+
+        :param Frame: uint8 frame, (height, width) or (height, width, 3) in BGR
+        :param FrameID: trial (or state) the frame belongs to
+        :param BufferID: DAQ buffer acquired with the frame
+        :rtype: None
+        """
+        if self.closed:
+            return
+        if self.ident is None:
+            self.start()
+        self._raise_error()
+        self.num_frames += 1
+        self.frame_ids.write(FrameID)
+        self.buffer_ids.write(BufferID)
+        try:
+            self.queue.put_nowait(Frame)
+        except Full:
+            self.queue_full_events += 1
+            while not self._put(Frame):
+                self._raise_error()
+
+    def run(self):
+        try:
+            self._open()
+            while True:
+                _frame = self.queue.get()
+                if _frame is None:
+                    break
+                self._encode(_frame)
+                self.encoded_frames += 1
+        except Exception as _error:
+            self.error = _error
+        if self._writer is not None:
+            try:
+                self._release()
+            except Exception as _error:
+                self.error = self.error or _error
+
+    def close(self):
+        """
+        Encode what is left in the queue & finalize the video file
+
+        :rtype: None
+        """
+        if self.closed:
+            return
+        self.closed = True
+        while self.is_alive() and not self._put(None):
+            continue
+        if self.ident is not None:
+            self.join()
+        self._raise_error()
+
+    def _put(self, Item):
+        # Waits for room in the queue only while the encoder thread is alive
+        try:
+            self.queue.put(Item, timeout=0.1)
+            return True
+        except Full:
+            return not self.is_alive() and self.error is None
+
+    def _raise_error(self):
+        if self.error is not None:
+            raise IOError("".join(["Video encoding failed (", self.filename, "): ", repr(self.error)])) from self.error
+
+    def _open(self):
+        _height, _width = self.frame_shape[:2]
+        _color = self.frame_shape.__len__() == 3
+        if self.backend == "opencv":
+            self._writer = cv.VideoWriter(self.filename, cv.VideoWriter_fourcc(*self.codec), self.frame_rate,
+                                          (_width, _height), _color)
+            if not self._writer.isOpened():
+                raise IOError("".join(["Could not open a ", self.codec, " video writer for ", self.filename]))
+            if self.quality is not None:
+                self._writer.set(cv.VIDEOWRITER_PROP_QUALITY, self.quality)
+        else:
+            _parameters = [] if self.quality is None else ["-crf", str(self.quality)]
+            self._writer = imageio.get_writer(self.filename, fps=self.frame_rate, codec=self.codec.lower(),
+                                              macro_block_size=1, pixelformat="yuv444p" if _color else "gray",
+                                              ffmpeg_params=_parameters)
+
+    def _encode(self, Frame):
+        if self.backend == "opencv":
+            self._writer.write(Frame)
+        else:
+            self._writer.append_data(Frame[..., ::-1] if Frame.ndim == 3 else Frame)  # ffmpeg expects RGB
+
+    def _release(self):
+        if self.backend == "opencv":
+            self._writer.release()
+        else:
+            self._writer.close()
@@ -14,10 +14,32 @@ class HardConfig:
         self.sampling_rate = int(1000)  # DAQ sampling rate (units: Hz, integer)
         self.buffer_time = int(100)  # DAQ buffering time (units: ms, integer)
 
+        # Session Buffering Parameters
+        self.session_chunk_duration = int(300)  # growth increment of session buffers (units: s, integer)
+        self.default_session_duration = int(3600)  # expected length of tasks without fixed durations (units: s, integer)
+        self.session_storage = "stream"  # analog & digital persistence: "stream" (writer thread) or "memmap" (file-backed)
+        self.digital_storage = "lines"  # digital lines saved as read ("lines", <name>.npy, 1 byte per sample), "packed"
+        # (<name>_packed.npy, 1 bit per sample) or "edges" (<name>_edges.npz, edge sample indices), see load_digital
+        self.digital_ring_duration = int(30)  # lines as read kept for processing when saved packed or as edges (s)
+        self.session_container = False  # also gather each session into one chunked file (session.bin) once saved;
+        # re-reads & duplicates the saved session, so it stalls the end of the session & doubles its disk use
+        self.session_compression = "zlib"  # compression of the session container chunks: "zlib" or None
+        self.container_chunk_duration = int(10)  # time spanned by each chunk of the session container (units: s)
+
+        # Behavior Timing Parameters
+        self.stage_clock = "wall"  # clock stage durations run on: "wall" (system time) or "samples" (DAQ sample count)
+
+        # Camera Parameters
+        self.process_cameras = False  # run each behavioral camera in its own process (frames shared in memory)
+        self.camera_rois = {"CAM1": None, "CAM2": None, "CAM": None}  # (x, y, width, height) recorded, None for all
+        self.camera_binning = {"CAM1": 1, "CAM2": 1, "CAM": 1}  # mean binning of the recorded region (1, 2 or 4)
+        self.motion_energy_rois = {"CAM2": [None]}  # regions of recorded frames traced online, None for the whole frame
+
         # Analog Input Parameters -- Serves as the master clock
         self.analog_voltage_range = np.array([-10.0, 10.0], dtype=np.float64)
         self.num_analog_in = int(4)
         self.analog_chans_in = "BurrowDAQ/ai0:3"
+        self.analog_storage = "float64"  # "float64" (volts) or "int16" (raw ADC counts & driver scaling, 4x smaller)
         # Imaging Sync
         self.imaging_sync_channel_name = "BurrowDAQ/ai0"
         self.imaging_sync_channel_id = int(0)
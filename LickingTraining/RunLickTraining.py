@@ -1,23 +1,23 @@
 import numpy as np
+from time import perf_counter_ns
 # noinspection PyUnresolvedReferences
-from ctypes import byref
-from PyDAQmx import *
+from GenericModules.DAQBackend import *
 from GenericModules.DAQModules import DigitalGroupReader
 from LickBehaviorConfigurations import LickTrainingConfig
-from HardwareConfiguration import HardConfig
-from GenericModules.SaveModule import Saver, Pickler
-from GenericModules.BehavioralCamera_Slave import BehavCam
+from GenericModules.SaveModule import Pickler
+from GenericModules.AcquisitionModule import AcquisitionEngine
+from GenericModules.BehavioralCamera_Master import create_camera
 
 global DAQmx_Val_RSE, DAQmx_Val_Volts, DAQmx_Val_Rising, DAQmx_Val_ContSamps, DAQmx_Val_Acquired_Into_Buffer
 global DAQmx_Val_GroupByScanNumber, DAQmx_Val_GroupByChannel, DAQmx_Val_ChanForAllLines, DAQmx_Val_OnDemand
 global DAQmx_Val_ChanPerLine  # These are globals for the DAQ Interface & all globals are scary!
 
 
-class DAQtoLickTraining(Task):
+class DAQtoLickTraining(AcquisitionEngine):
     def __init__(self, *args):
-        Task.__init__(self)
-
-        _hardware_config = HardConfig()
+        # Analog Inputs (Master Clock), Buffering, Persistence & Instrumentation
+        AcquisitionEngine.__init__(self, ["Setup", "Training", "End"], ("Water", "Sucrose"))
+        _hardware_config = self.hardware_config
 
         if args:
             self.lick_training_config = args[0]
@@ -46,6 +46,7 @@ class DAQtoLickTraining(Task):
         self.training_started = False
         self.training_complete = False
         self.unsaved = True
+        self.saving = False  # set before the pipeline drains, buffers handled meanwhile must not save again
         self.hold = False
 
         # Data holders
@@ -56,32 +57,8 @@ class DAQtoLickTraining(Task):
         self.running_sucrose_rewards = 0
         self.running_rewards = 0
 
-        # Setup DAQ - General DAQ Parameters - Put into class because might be iterated on
-        self.timeout = _hardware_config.timeout  # timeout parameter must be type floating 64 (units: seconds, double)
-        self.sampling_rate = _hardware_config.sampling_rate  # DAQ sampling rate (units: Hz, integer)
-        self.buffer_time = _hardware_config.buffer_time  # DAQ buffering time (units: ms, integer)
-        self.buffers_per_second = _hardware_config.buffers_per_second # DAQ buffers each second (units: Hz, round integer)
-        # Samples per Buffer (units: samples, round integer) (Comment for below)
-        self.buffer_size = _hardware_config.buffer_size
-        self.totNumBuffers = int()  # integer record of number of buffers collected (running)
-
-        # Setup DAQ - Analog Input
-        self.DAQAnalogInBuffer = np.tile(np.zeros((self.buffer_size,), dtype=np.float64),
-                                         (_hardware_config.num_analog_in, 1))
-        self.numSamplesPerBlock = np.uint32(_hardware_config.num_analog_in * self.buffer_size)
-        self.voltage_range_in = _hardware_config.analog_voltage_range
-        self.units = int32()  # read units (type 32b integer, this implies default units)
-        self.CreateAIVoltageChan(_hardware_config.analog_chans_in, "Analog In", DAQmx_Val_RSE, self.voltage_range_in[0],
-                                 self.voltage_range_in[1], DAQmx_Val_Volts, None)
-        # RSE is reference single-ended, Val_Volts flags voltage units
-        self.CfgSampClkTiming("", self.sampling_rate, DAQmx_Val_Rising, DAQmx_Val_ContSamps, self.buffer_size)
-        # Val rising means on the rising edge, cont samps is continuous sampling
-        self.AutoRegisterEveryNSamplesEvent(DAQmx_Val_Acquired_Into_Buffer, self.buffer_size, 0, name='EveryNCallback')
-        # Callback every buffer_size over time = buffer_size*sampling_rate
-        self.AutoRegisterDoneEvent(0, name='DoneCallback')  # Flag Callback Executed
-
         # Setup DAQ - Digital Output Port 0
-        self.sync = Task()
+        self.sync = self.add_task(Task())
         self.sync.number_of_channels = _hardware_config.num_digital_out_port_0
         self.sync.fill_mode = np.bool_(1)
         self.sync.units = np.int32(1)
@@ -91,7 +68,7 @@ class DAQtoLickTraining(Task):
         self.sync.trial_channel_id = _hardware_config.trial_channel_id
 
         # Setup DAQ - Digital Output Port 1
-        self.permissions = Task()
+        self.permissions = self.add_task(Task())
         self.permissions.number_of_channels = _hardware_config.num_digital_out_port_1
         self.permissions.fill_mode = np.bool_(1)
         self.permissions.units = np.int32(1)
@@ -102,7 +79,7 @@ class DAQtoLickTraining(Task):
         self.permissions_water_channel_id = _hardware_config.permission_water_channel_id
 
         # Setup DAQ  - Digital Output Port 2
-        self.wet_starter = Task()
+        self.wet_starter = self.add_task(Task())
         self.wet_starter.number_of_channels = _hardware_config.num_digital_out_port_2
         self.wet_starter.fill_mode = np.bool_(1)
         self.wet_starter.units = np.int32(1)
@@ -112,36 +89,20 @@ class DAQtoLickTraining(Task):
                                       DAQmx_Val_ChanForAllLines)
 
         # Setup DAQ - Digital Input
-        self.rewards_monitor = Task()
         self.rewards_monitor = DigitalGroupReader(_hardware_config.num_digital_in, _hardware_config.digital_chans_in,
                                                   _hardware_config.timeout, _hardware_config.buffer_size,
                                                   "Reward Monitor")
+        self.add_digital_input(self.rewards_monitor, self.rewards_monitor.read_into, self.rewards_monitor.slot_shape)
         self.water_reward_channel_id = _hardware_config.water_reward_channel_id
         self.sucrose_reward_channel_id = _hardware_config.sucrose_reward_channel_id
         self.licking_water_channel_id = _hardware_config.licking_water_channel_id
         self.licking_sucrose_channel_id = _hardware_config.licking_sucrose_channel_id
 
-        # Prep Data Buffers
-        self.bufferedAnalogDataToSave = np.array(self.DAQAnalogInBuffer.copy(), dtype=np.float64)
-        self.bufferedDigitalDataToSave = np.full((_hardware_config.num_digital_in, self.buffer_size), 0, dtype=np.uint8)
-        self.bufferedStateToSave = np.array(['0'], dtype=str)
-        self.bufferedCurrentSpout = np.array(['0'], dtype=str)
-
         # Grabbed Digital Buffer
-        self.grabbedDigitalBuffer = self.bufferedDigitalDataToSave.copy()
-        self.grabbedAnalogBuffer = self.DAQAnalogInBuffer.copy()
-
-        self.save_module_analog = Saver()
-        self.save_module_analog.filename = self.lick_training_config.data_path + "\\analog.npy"
+        self.grabbedDigitalBuffer = np.full((_hardware_config.num_digital_in, self.buffer_size), 0, dtype=np.uint8)
 
-        self.save_module_digital = Saver()
-        self.save_module_digital.filename = self.lick_training_config.data_path + "\\digital.npy"
-
-        self.save_module_state = Saver()
-        self.save_module_state.filename = self.lick_training_config.data_path + "\\state.npy"
-
-        self.save_module_spout = Pickler()
-        self.save_module_spout.filename = self.lick_training_config.data_path + "\\spout.npy"
+        # Prep Data Buffers, Savers & Processing Thread - Preallocated for the expected session
+        self.prepare_session(self.lick_training_config.data_path, _hardware_config.default_session_duration)
 
         self.save_module_config = Pickler()
         self.save_module_config.filename = self.lick_training_config.data_path + "\\config"
@@ -150,37 +111,23 @@ class DAQtoLickTraining(Task):
         self.save_module_stats.filename = self.lick_training_config.data_path + "\\stats"
 
         if self.cameras_on:
-            self.master_camera = BehavCam(0, 640, 480, "CAM")
+            self.master_camera = create_camera(0, 640, 480, "CAM", False, _hardware_config.process_cameras,
+                                               _hardware_config.camera_rois["CAM"],
+                                               _hardware_config.camera_binning["CAM"])
             self.master_camera.file_prefix = "".join([self.lick_training_config.data_path, "\\", "_cam2_"])
             self.master_camera.isRunning2 = True
             self.master_camera.start()
 
-    def EveryNCallback(self):
-
-        # Read Device 1 Analog Inputs
-        self.ReadAnalogF64(self.buffer_size, self.timeout, DAQmx_Val_GroupByChannel, self.DAQAnalogInBuffer,
-                               self.numSamplesPerBlock, byref(self.units), None)
-
-        # Grab the data
-        self.grabbedAnalogBuffer = self.DAQAnalogInBuffer.copy()
-
-        # Grab Digital Stuff
-        self.rewards_monitor.ReadSignals()
-        self.grabbedDigitalBuffer = self.rewards_monitor.readData.copy()
-
-        # Update buffer count
-        self.totNumBuffers += 1
-
-        # Export
-        self.bufferedAnalogDataToSave = np.append(self.bufferedAnalogDataToSave, self.grabbedAnalogBuffer, axis=1)
-        self.bufferedStateToSave = np.append(self.bufferedStateToSave, self.current_state)
-        self.bufferedDigitalDataToSave = np.append(self.bufferedDigitalDataToSave, self.grabbedDigitalBuffer, axis=1)
-        self.bufferedCurrentSpout = np.append(self.bufferedCurrentSpout, self.current_spout)
+    def on_buffer(self, View):
+        # Runs on the processing thread, once per buffer & in order
+        self.grabbedDigitalBuffer = View.digital[0]  # (channels, samples) view
 
         # Camera
+        _lap = perf_counter_ns()
         if self.cameras_on:
             self.master_camera.currentTrial = self.current_trial
-            self.master_camera.currentBuffer = self.totNumBuffers - 1
+            self.master_camera.currentBuffer = View.index - 1
+        _ = self.instrumentation.lap("camera", _lap)
 
         # Process rewards if training started
         if self.training_started:
@@ -205,7 +152,7 @@ class DAQtoLickTraining(Task):
         self.check_if_finished()
 
         # Report information to the console
-        if self.totNumBuffers % self.print_period == 0:
+        if View.index % self.print_period == 0:
             print("\n ----------------------------------")
             print("".join(["\nRunning Intake: ", str(self.running_rewards), " rewards delivered", " and ", str(self.running_rewards * self.single_lick_volume), " uL consumed"]))
             print("".join(["\nRunning Licks: ", str(self.running_licks)]))
@@ -214,36 +161,9 @@ class DAQtoLickTraining(Task):
             print("".join(["\nRunning Trial Intake: ", str(self.current_trial_rewards)]))
             print("\n ----------------------------------")
 
-        return 0
-
-    @staticmethod
-    def DoneCallback(status):
-        print("Status ", status.value)  # Not sure why we print but that's fine
-        return 0
-
-    def startAcquisition(self):
-        # Analog Inputs
-        self.StartTask() # (Master Clock!!!)
-        # Digital Output
-        self.permissions.StartTask() # Port 1
-        self.wet_starter.StartTask() # Port 2
-
-        # Digital Input
-        self.rewards_monitor.StartTask()
-
-    def clearDAQ(self):
-        self.rewards_monitor.ClearTask()
-        self.permissions.ClearTask()
-        self.wet_starter.ClearTask()
-        self.ClearTask()
-
-    def stopDAQ(self):
-        self.rewards_monitor.StopTask()
-        self.permissions.StopTask()
-        self.wet_starter.StopTask()
-        self.StopTask()
-
     def end_training(self):
+        if self.saving:
+            return  # Reached by a buffer drained while saving (e.g., after graceful_abort)
         self.wet_stop()
         self.restrict_permission()
         self.current_state = "End"
@@ -258,7 +178,7 @@ class DAQtoLickTraining(Task):
         self.training_complete = True
 
     def start_training(self):
-        self.current_state = str(self.current_trial)
+        self.current_state = "Training"
         self.training_started = True
         self.master_camera.is_recording_time = True
         self.start_trial_sync()
@@ -268,7 +188,7 @@ class DAQtoLickTraining(Task):
         self.wet_stop()
         self.restrict_permission()
         self.current_trial += 1
-        self.current_state = str(self.current_trial)
+        self.current_state = "Training"
         self.current_trial_rewards = 0
         self.current_spout = self.spout_index[self.current_trial]
 
@@ -348,18 +268,10 @@ class DAQtoLickTraining(Task):
         self.close()
 
     def save_data(self):
-        print("Saving Analog Data...")
-        self.save_module_analog.bufferedData = self.bufferedAnalogDataToSave.copy()
-        _ = self.save_module_analog.timeToSave()
-        print("Saving Digital Data...")
-        self.save_module_digital.bufferedData = self.bufferedDigitalDataToSave.copy()
-        _ = self.save_module_digital.timeToSave()
-        print("Saving State Data...")
-        self.save_module_state.bufferedData = self.bufferedStateToSave.copy()
-        _ = self.save_module_state.timeToSave()
-        print("Saving Spout Data...")
-        self.save_module_spout.bufferedData = self.bufferedCurrentSpout.copy()
-        _ = self.save_module_spout.timeToSave()
+        if self.saving:
+            return
+        self.saving = True
+        self.save_session()
         print("Saving Config Data...")
         self.save_module_config.pickledPickles = self.lick_training_config
         _ = self.save_module_config.timeToSave()
@@ -374,6 +286,9 @@ class DAQtoLickTraining(Task):
             self.master_camera.save_data()
             while self.master_camera.unsaved:
                 continue
+            self.save_frame_sync({"cam": self.master_camera.file_prefix})
+        self.pack_session({"config": self.lick_training_config, "stats": self.save_module_stats.pickledPickles},
+                          {"cam": self.master_camera.file_prefix} if self.cameras_on else None)
         self.unsaved = False
         print("Finished Saving Data.")
         return
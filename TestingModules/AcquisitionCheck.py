@@ -0,0 +1,140 @@
+from GenericModules import DAQBackend
+from GenericModules.AcquisitionModule import AcquisitionEngine
+from GenericModules.DAQModules import DigitalGroupReader
+from GenericModules.SaveModule import load_analog, load_digital, ScaledAnalog
+from GenericModules.ContainerModule import SessionFile
+from GenericModules.BufferModule import SlotRing
+from tempfile import TemporaryDirectory
+from os import path
+import tracemalloc
+import numpy as np
+import pytest
+
+
+# Needs DAQ_BACKEND=simulated before importing; testing.py checks DAQBackend.device itself
+_simulated_backend = pytest.mark.skipif(DAQBackend.device is None, reason="Needs the simulated DAQ backend")
+
+
+class _ZeroCopyAcquisition(AcquisitionEngine):
+    def __init__(self, DataPath, DigitalStorage="lines"):
+        AcquisitionEngine.__init__(self, ["Setup"])
+        _hardware_config = self.hardware_config
+        _hardware_config.digital_storage = DigitalStorage
+        self.reader = DigitalGroupReader(_hardware_config.num_digital_in, _hardware_config.digital_chans_in,
+                                         _hardware_config.timeout, self.buffer_size, "Digital In")
+        self.add_digital_input(self.reader, self.reader.read_into, self.reader.slot_shape)
+        self.prepare_session(DataPath, 60)
+
+
+class _RawAnalogAcquisition(AcquisitionEngine):
+    def __init__(self, DataPath):
+        AcquisitionEngine.__init__(self, ["Setup"])
+        self.analog_storage = "int16"
+        self.prepare_session(DataPath, 60)
+
+
+@_simulated_backend
+def test_zero_copy_callbacks():
+    """
+    This tests that DAQ callbacks read straight into session slots & allocate nothing in steady state
+
+    :rtype: None
+    """
+    DAQBackend.device.reset()
+    DAQBackend.device.mode = "manual"
+    with TemporaryDirectory() as _directory:
+        DAQ = _ZeroCopyAcquisition(path.join(_directory, "session"))
+        _analog_channels = DAQ.channels
+        _digital_channels = DAQ.reader.channels
+        DAQBackend.device.script(_analog_channels[-1], lambda Samples, Rate: Samples.astype(np.float64))
+        DAQBackend.device.script(_digital_channels[0], lambda Samples, Rate: Samples % 2)
+
+        # Reads land in the slots, laid out (samples, channels)
+        DAQ.StartTask()  # Master clock only, buffers are not processed
+        DAQBackend.device.step(10)
+        _analog = DAQ.bufferedAnalogDataToSave.slot(1)
+        assert(np.array_equal(_analog[:, -1], np.arange(0, DAQ.buffer_size)))
+        assert(np.array_equal(DAQ.bufferedDigitalDataToSave[0].slot(1)[:, 0], np.arange(0, DAQ.buffer_size) % 2))
+
+        # Steady state: nothing allocated by the engine, buffers, instrumentation or pipeline hand-off
+        _engine_files = [tracemalloc.Filter(True, "*" + _module) for _module in
+                         ("AcquisitionModule.py", "BufferModule.py", "LatencyModule.py", "PipelineModule.py",
+                          "DAQModules.py")]
+        tracemalloc.start()
+        DAQBackend.device.step(10)  # Running counters now hold traced objects
+        _before = tracemalloc.take_snapshot().filter_traces(_engine_files)
+        DAQ.instrumentation.reset_gap()  # The snapshot paused the callbacks, which is not an overrun
+        DAQBackend.device.step(200)
+        _after = tracemalloc.take_snapshot().filter_traces(_engine_files)
+        tracemalloc.stop()
+        # Only growth counts: blocks freed elsewhere must not cancel new allocations
+        _allocated = sum(_stat.count_diff for _stat in _after.compare_to(_before, "lineno") if _stat.count_diff > 0)
+        assert(DAQ.bufferedAnalogDataToSave.__len__() == 221)
+        assert(_allocated <= 0)
+        DAQ.StopTask()
+        DAQ.save_modules_digital[0].timeToSave()
+        DAQ.save_module_analog.timeToSave()
+
+
+@_simulated_backend
+def test_raw_analog():
+    """
+    This tests that raw int16 sessions read back as volts through the saved scaling coefficients
+
+    :rtype: None
+    """
+    DAQBackend.device.reset()
+    DAQBackend.device.mode = "manual"
+    with TemporaryDirectory() as _directory:
+        DAQ = _RawAnalogAcquisition(path.join(_directory, "session"))
+        DAQBackend.device.script(DAQ.channels[1], lambda Samples, Rate: np.sin(Samples / 50.0) * 9.0)
+        DAQ.save_module_analog.start()
+        DAQ.pipeline.start()
+        DAQ.StartTask()
+        DAQBackend.device.step(20)
+        DAQ.StopTask()
+        DAQ.save_session()
+        assert(DAQ.bufferedAnalogDataToSave.slot(1).dtype == np.int16)
+        _analog = load_analog(DAQ.save_module_analog.filename)
+        assert(isinstance(_analog, ScaledAnalog))
+        assert(_analog.shape == (4, 21 * DAQ.buffer_size))
+        _samples = np.arange(0, 20 * DAQ.buffer_size)
+        _volts_per_count = 20.0 / 65536
+        assert(np.allclose(_analog[1, DAQ.buffer_size:], np.sin(_samples / 50.0) * 9.0, atol=_volts_per_count))
+        assert(np.allclose(_analog[:, 500:700][1], _analog[1, 500:700]))
+        assert(np.array_equal(np.asarray(_analog)[0], np.zeros(21 * DAQ.buffer_size)))
+        del _analog
+
+
+@_simulated_backend
+def test_pack_session():
+    """
+    This tests that a saved session is gathered into the container with its analog, digital & metadata datasets,
+    whatever the digital storage
+
+    :rtype: None
+    """
+    with TemporaryDirectory() as _directory:
+        for _storage in ("lines", "packed", "edges"):
+            DAQBackend.device.reset()
+            DAQBackend.device.mode = "manual"
+            DAQ = _ZeroCopyAcquisition(path.join(_directory, _storage), _storage)
+            DAQ.hardware_config.session_container = True  # Off by default
+            DAQBackend.device.script(DAQ.channels[-1], lambda Samples, Rate: Samples.astype(np.float64))
+            DAQBackend.device.script(DAQ.reader.channels[0], lambda Samples, Rate: (Samples // 250) % 2)
+            DAQ.startAcquisition()
+            DAQBackend.device.step(30)
+            DAQ.stopDAQ()
+            DAQ.save_session()
+            DAQ.pack_session({"config": {"animal": "Test"}})
+            _lines = (np.arange(30 * DAQ.buffer_size) // 250) % 2
+            assert(isinstance(DAQ.bufferedDigitalDataToSave[0], SlotRing) is (_storage != "lines"))
+            assert(np.array_equal(load_digital(DAQ.save_modules_digital[0].filename)[0, DAQ.buffer_size:], _lines))
+            with SessionFile(DAQ.container_filename) as SF:
+                assert(SF.shape("analog") == (31 * DAQ.buffer_size, DAQ.hardware_config.num_analog_in))
+                assert(np.array_equal(SF.read("analog", DAQ.buffer_size, None, -1), np.arange(30 * DAQ.buffer_size)))
+                assert(SF.shape("digital") == (31 * DAQ.buffer_size, DAQ.hardware_config.num_digital_in))
+                assert(np.array_equal(SF.read("digital", DAQ.buffer_size, None, 0), _lines))
+                assert(SF.read("metadata")["buffer"].tolist() == list(range(31)))
+                assert(SF.load_object("config") == {"animal": "Test"})
+                assert(SF.load_object("hardware_config").sampling_rate == DAQ.sampling_rate)
@@ -0,0 +1,108 @@
+from GenericModules.BufferModule import SessionBuffer, SlotRing, SharedFrameRing, expected_buffers
+from GenericModules.MetadataModule import CodeTable, buffer_record_dtype
+import numpy as np
+import pytest
+
+
+def test_session_buffer_growth():
+    """
+    This tests that session buffers grow in chunks without moving previously written slots
+
+    :rtype: None
+    """
+    SB = SessionBuffer((100, 4), np.float64, 3, 2)
+    _first_slot = SB.write(np.ones((100, 4)))
+    for _buffer in range(1, 8):
+        SB.write(np.full((100, 4), _buffer))
+    assert(SB.__len__() == 8)
+    assert(SB.capacity == 9)
+    assert(SB.chunks.__len__() == 4)
+    assert(np.shares_memory(_first_slot, SB.chunks[0]))
+    assert(SB.slot(-1)[0, 0] == 7)
+    assert(SB.data.shape == (8, 100, 4))
+
+    # Several slots at once, across chunks
+    Events = SessionBuffer((), np.int64, 3, 2)
+    Events.extend(np.arange(4))
+    Events.extend(np.arange(4, 9))
+    assert(Events.data.tolist() == list(range(9)))
+    assert(Events.chunks.__len__() == 4)
+
+
+def test_slot_ring():
+    """
+    This tests that slot rings keep the newest slots under their session indices & refuse overwritten ones
+
+    :rtype: None
+    """
+    SR = SlotRing((100, 4), np.uint8, 3)
+    for _buffer in range(8):
+        SR.write(np.full((100, 4), _buffer))
+    assert(SR.__len__() == 8)
+    assert(SR.slot(5)[0, 0] == 5 and SR.slot(7)[0, 0] == 7 and SR.slot(-1)[0, 0] == 7)
+    with pytest.raises(IndexError):
+        SR.slot(4)
+    with pytest.raises(IndexError):
+        SR.slot(8)
+
+
+def test_session_buffer_samples():
+    """
+    This tests the (channels, samples) layout consumed by the save paths
+
+    :rtype: None
+    """
+    _analog = np.arange(400, dtype=np.float64).reshape(4, 100)
+    SB = SessionBuffer((100, 4), np.float64, expected_buffers(0.2, 10))
+    SB.write(_analog.T)
+    SB.write(_analog.T + 400)
+    _samples = SB.as_samples()
+    assert(_samples.shape == (4, 200))
+    assert(np.array_equal(_samples[:, :100], _analog))
+    assert(np.array_equal(_samples[:, 100:], _analog + 400))
+
+    States = SessionBuffer((), "<U16", 1)
+    States.write("Habituation")
+    States.write("PreferenceTest")
+    assert(States.as_samples().tolist() == ["Habituation", "PreferenceTest"])
+
+
+def test_buffer_records():
+    """
+    This tests per-buffer records & the vectorized state masks built from their codes
+
+    :rtype: None
+    """
+    Codes = CodeTable(["Setup", "Habituation", "PreferenceTest"])
+    Records = SessionBuffer((), buffer_record_dtype, 2)
+    for _buffer, _state in enumerate(["Setup", "Habituation", "Habituation", "PreferenceTest", "Unknown"]):
+        Records.write((_buffer, Codes.code(_state), 0, 0, _buffer * 100000000))
+    assert(buffer_record_dtype.itemsize == 16)
+    assert(Records.data["buffer"].tolist() == [0, 1, 2, 3, 4])
+    assert(Codes.name(Records.data["state"][-1]) == "None")
+    assert(Codes.mask(Records.data["state"], "Habituation").tolist() == [False, True, True, False, False])
+    _samples = Codes.sample_mask(Records.data["state"], "Habituation", 100)
+    assert(_samples.shape == (500, ))
+    assert(_samples.sum() == 200)
+
+
+def test_shared_frame_ring():
+    """
+    This tests that frames written to the shared ring are read back by name with their metadata
+
+    :rtype: None
+    """
+    Writer = SharedFrameRing((48, 64), 4)
+    Reader = SharedFrameRing((48, 64), 4, Name=Writer.name)
+    assert(Reader.latest() is None)
+    for _frame_number in range(10):
+        Writer.write(np.full((48, 64), _frame_number, dtype=np.uint8), _frame_number * 33333333, _frame_number // 3)
+    _frame, _metadata = Reader.latest()
+    assert(Reader.frames_written == 10)
+    assert(np.all(_frame == 9))
+    assert(_metadata == (9, 9 * 33333333, 3))
+    _out = np.zeros((48, 64), dtype=np.uint8)
+    assert(Reader.latest(_out)[0] is _out)
+    Reader.close()
+    Writer.close()
+    Writer.unlink()
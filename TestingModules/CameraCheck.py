@@ -0,0 +1,24 @@
+from GenericModules.BehavioralCamera_Master import CameraProcess, forwarded_defaults
+from GenericModules.BehavioralCamera_Slave import BehavCam
+
+
+def test_camera_process_defaults():
+    """
+    This tests that forwarded camera attributes read the BehavCam defaults until set & only forward changes
+
+    :rtype: None
+    """
+    _cam = BehavCam(0, 48, 64, "CAM")
+    CP = CameraProcess(0, 48, 64, "CAM", Gray=True)
+    try:
+        for _name in forwarded_defaults:
+            assert(getattr(CP, _name) == getattr(_cam, _name))
+        assert(CP.is_recording_time is False)
+        assert(CP.commands.empty())  # ROI & binning left at their defaults are not resent
+        CP.is_recording_time = False
+        CP.is_recording_time = True
+        assert(CP.commands.get(timeout=1.0) == ("set", "is_recording_time", True))
+        assert(CP.is_recording_time is True)
+    finally:
+        CP.ring.close()
+        CP.ring.unlink()
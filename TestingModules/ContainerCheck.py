@@ -0,0 +1,39 @@
+from GenericModules.ContainerModule import SessionContainer, SessionFile
+from GenericModules.MetadataModule import buffer_record_dtype
+from tempfile import TemporaryDirectory
+from os import path
+import numpy as np
+
+
+def test_session_container():
+    """
+    This tests that any time range of any channel, records & objects read back from the chunked container
+
+    :rtype: None
+    """
+    _analog = np.random.rand(2500, 4)
+    _digital = np.zeros((2500, 2), dtype=np.uint8)
+    _digital[700:1300, 1] = 1
+    _records = np.zeros(26, dtype=buffer_record_dtype)
+    _records["buffer"] = np.arange(26)
+    for _compression in ("zlib", None):
+        with TemporaryDirectory() as _directory:
+            _filename = path.join(_directory, "session.bin")
+            with SessionContainer(_filename, _compression) as SC:
+                SC.create_dataset("analog", (4, ), np.float64, 1000, 1000.0, {"channels": "Dev/ai0:3"})
+                for _buffer in np.split(_analog, 25):
+                    SC.append("analog", _buffer)
+                SC.write_dataset("digital", _digital, 1000, 1000.0)
+                SC.write_dataset("metadata", _records, 10, 10.0)
+                SC.write_object("config", {"animal": "EM0086", "sessions": [1, 2]})
+            with SessionFile(_filename) as SF:
+                assert(sorted(SF.datasets) == ["analog", "digital", "metadata"])
+                assert(SF.shape("analog") == (2500, 4))
+                assert(SF.attributes("analog")["channels"] == "Dev/ai0:3")
+                assert(np.array_equal(SF.read("analog"), _analog))
+                assert(np.array_equal(SF.read("analog", 950, 2050, 2), _analog[950:2050, 2]))
+                assert(np.array_equal(SF.read_time("analog", 0.5, 1.25, [0, 3]), _analog[500:1250][:, [0, 3]]))
+                assert(np.array_equal(SF.read("digital", 600, 1400, 1), _digital[600:1400, 1]))
+                assert(np.array_equal(SF.read("metadata", 5, 15), _records[5:15]))
+                assert(SF.read("analog", 2400, 9000).shape == (100, 4))
+                assert(SF.load_object("config") == {"animal": "EM0086", "sessions": [1, 2]})
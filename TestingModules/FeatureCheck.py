@@ -0,0 +1,44 @@
+from GenericModules.FeatureModule import extract_features, extract_cohort, frame_source
+from GenericModules.SaveModule import FrameStore
+from tempfile import TemporaryDirectory
+from os import path, mkdir
+import numpy as np
+
+
+def test_feature_extraction():
+    """
+    This tests pooled feature extraction over original raw sessions & chunked frame stores
+
+    :rtype: None
+    """
+    _frames = np.random.default_rng(0).integers(0, 256, (70, 24, 32), dtype=np.uint8)
+    _expected_mean = _frames[:, 4:16, 8:24].mean(axis=(1, 2))
+    _expected_motion = np.concatenate([[0.0], np.abs(np.diff(_frames.astype(np.int16), axis=0)).mean(axis=(1, 2))])
+    _expected_pupil = np.count_nonzero(_frames[:, :10, :10] < 40, axis=(1, 2))
+    with TemporaryDirectory() as _directory:
+        mkdir(path.join(_directory, "EM0001"))
+        # Original layout: headerless raw frames
+        _raw = path.join(_directory, "EM0001", "_cam1_")
+        _frames.tofile(_raw + "_Frame.npy")
+        # Chunked frame store
+        _chunked = path.join(_directory, "EM0001", "_cam2_")
+        FS = FrameStore(_chunked, (24, 32), 30.0, ChunkDuration=1.0)
+        for _frame in _frames:
+            FS.write(_frame, 1, 0)
+        FS.close()
+        for _prefix in (_raw, _chunked):
+            with open(_prefix + "_meta.txt", "w") as f:
+                f.writelines(["70,24,32", "\n", "0,0,32,24,1"])
+        assert(frame_source(_raw)["kind"] == "raw")
+        assert(frame_source(_chunked)["kind"] == "chunks")
+        for _prefix in (_raw, _chunked):
+            _features = extract_features(_prefix, ROIs=((8, 4, 16, 12), None), PupilROI=(0, 0, 10, 10),
+                                         ChunkFrames=16, Workers=2)
+            assert(list(_features.keys()) == ["mean_0", "mean_1", "motion_0", "motion_1", "pupil_area"])
+            assert(_features["mean_0"].dtype == np.float32)
+            assert(np.allclose(_features["mean_0"], _expected_mean, atol=1e-3))
+            assert(np.allclose(_features["motion_1"], _expected_motion, atol=1e-3))
+            assert(np.array_equal(_features["pupil_area"], _expected_pupil))
+        assert(extract_cohort(_directory, 2).__len__() == 2)
+        with np.load(_chunked + "_features.npz") as _saved:
+            assert(_saved["mean_0"].shape == (70, ))
@@ -0,0 +1,55 @@
+from GenericModules.FrameModule import crop_frame, bin_frame, reduce_frame, reduced_shape, MotionEnergy
+import numpy as np
+
+
+def test_roi_binning():
+    """
+    This tests that regions of interest are views & binning matches block means on gray and color frames
+
+    :rtype: None
+    """
+    _gray = np.random.randint(0, 256, (720, 1280), dtype=np.uint8)
+    _roi = (100, 50, 402, 301)
+    _cropped = crop_frame(_gray, _roi)
+    assert(np.shares_memory(_cropped, _gray))
+    assert(_cropped.shape == (301, 402))
+    for _binning in (2, 4):
+        _binned = reduce_frame(_gray, _roi, _binning)
+        _expected = np.round(_cropped[:_binned.shape[0] * _binning, :_binned.shape[1] * _binning].reshape(
+            _binned.shape[0], _binning, _binned.shape[1], _binning).mean(axis=(1, 3)) + 1e-9)
+        assert(_binned.dtype == np.uint8)
+        assert(_binned.shape == reduced_shape(_gray.shape, _roi, _binning))
+        assert(np.array_equal(_binned, _expected))
+    _color = np.full((480, 640, 3), 255, dtype=np.uint8)
+    assert(bin_frame(_color, 4).shape == (120, 160, 3) == reduced_shape(_color.shape, None, 4))
+    assert(np.all(bin_frame(_color, 4) == 255))
+    assert(bin_frame(_color, 1) is _color)
+
+
+def test_motion_energy():
+    """
+    This tests per-region motion energy, the recorded trace & the rolling history for the GUI
+
+    :rtype: None
+    """
+    ME = MotionEnergy(30.0, ROIs=(None, (0, 0, 64, 48), (64, 48, 64, 48)), Downsample=2, HistoryDuration=1.0)
+    _frame = np.full((96, 128), 100, dtype=np.uint8)
+    ME.update(_frame)
+    ME.record()
+    for _frame_number in range(1, 40):
+        _next = _frame.copy()
+        _next[48:, 64:] = 100 + (_frame_number % 2) * 40  # only the bottom right quadrant flickers
+        assert(np.allclose(ME.update(_next), [10.0, 0.0, 40.0]))
+        ME.record()
+        _frame = _next
+    assert(ME.trace.data.dtype == np.float32)
+    assert(ME.trace.data.shape == (40, 3))
+    assert(np.all(ME.trace.data[0] == 0))
+    assert(ME.recent().shape == (30, 3))
+    assert(ME.recent(0.5).shape == (15, 3))
+    assert(np.allclose(ME.recent(0.1)[:, 2], 40.0))
+
+    # Differences above 128 must not wrap around in uint8
+    ME.update(np.full((96, 128), 10, dtype=np.uint8))
+    assert(np.allclose(ME.update(np.full((96, 128), 250, dtype=np.uint8)), 240.0))
+    assert(np.allclose(ME.update(np.full((96, 128), 10, dtype=np.uint8)), 240.0))
@@ -0,0 +1,99 @@
+from GenericModules.LatencyModule import LatencyHistogram, CallbackInstrumentation, RateCounter, FrameTiming
+from tempfile import TemporaryDirectory
+from os import path
+from time import sleep
+import numpy as np
+
+
+def test_latency_histogram():
+    """
+    This tests that the fixed-size histogram keeps percentiles within its precision
+
+    :rtype: None
+    """
+    LH = LatencyHistogram()
+    _size = LH.counts.shape[0]
+    _values = np.random.default_rng(0).integers(1000, 50000000, 10000)
+    for _value in _values:
+        LH.record(_value)
+    LH.record(20000000000)
+    assert(LH.counts.shape[0] == _size)
+    assert(LH.saturated == 1)
+    assert(LH.count == 10001)
+    for _percentile in (50, 90, 99):
+        _exact = np.percentile(np.append(_values, 20000000000), _percentile)
+        assert(abs(LH.percentile(_percentile) - _exact) / _exact < 0.02)
+
+
+def test_callback_instrumentation():
+    """
+    This tests stage laps, overrun detection & the latency report file
+
+    :rtype: None
+    """
+    CI = CallbackInstrumentation(10)
+    for _buffer in range(5):
+        _start = CI.callback_started()
+        _lap = CI.lap("read", _start)
+        _ = CI.lap("copy", _lap)
+        CI.callback_finished(_start)
+    assert(not CI.overrun)
+    sleep(0.02)  # two buffer periods
+    _start = CI.callback_started()
+    CI.callback_finished(_start)
+    assert(CI.overrun)
+    assert(CI.first_overrun == 6)
+    _report = CI.report()
+    assert(_report["stages"]["read"]["count"] == 5)
+    assert(_report["stages"]["gap"]["count"] == 5)
+    with TemporaryDirectory() as _directory:
+        _filename = path.join(_directory, "latency_report.txt")
+        CI.write_report(_filename)
+        with open(_filename, "r") as f:
+            _lines = f.readlines()
+    assert(_lines[2].startswith("Overrun: True"))
+    assert(_lines.__len__() == 5 + CI.histograms.__len__())
+
+
+def test_rate_counter():
+    """
+    This tests per-window event rates (e.g., capture at 30 fps & preview at 10 fps)
+
+    :rtype: None
+    """
+    Capture = RateCounter()
+    Preview = RateCounter()
+    for _frame in range(91):
+        Capture.tick(_frame * 33333333)
+        if _frame % 3 == 0:
+            Preview.tick(_frame * 33333333)
+    assert(Capture.count == 91)
+    assert(abs(Capture.rate - 30.0) < 0.01)
+    assert(abs(Preview.rate - 10.0) < 0.01)
+
+
+def test_frame_timing():
+    """
+    This tests online gap detection & the per-frame timestamps kept for recorded frames
+
+    :rtype: None
+    """
+    FT = FrameTiming(30.0, ExpectedDuration=1.0)
+    _grab_times = np.arange(100, dtype=np.int64) * 33333333
+    _grab_times[50:] += 3 * 33333333  # three frames dropped
+    _grab_times[80:] += 33333333  # one more
+    for _frame, _grab_time in enumerate(_grab_times):
+        FT.frame_grabbed(_grab_time)
+        FT.frame_recorded(_grab_time, -1 if _frame < 10 else _grab_time // 1000)
+    _report = FT.report()
+    assert(_report["gaps"] == 2)
+    assert(_report["missing_frames"] == 4)
+    assert(_report["first_gap"] == 51)
+    assert(_report["camera_gaps"] == 2)
+    assert(FT.grab_times.data.dtype == np.int64)
+    assert(np.array_equal(FT.grab_times.data, _grab_times))
+    with TemporaryDirectory() as _directory:
+        _filename = path.join(_directory, "_cam1__frame_timing.txt")
+        FT.write_report(_filename)
+        with open(_filename, "r") as f:
+            assert(f.readline().startswith("Frame Rate: 30.0"))
@@ -1,6 +1,8 @@
 from os import getcwd
 import numpy as np
 import pickle as pkl
+from GenericModules.SaveModule import load_digital
+from GenericModules.FeatureModule import frame_source, read_frames
 
 
 # Burrow Preference (Deprecated)
@@ -13,17 +15,24 @@ def test_data_burrow_preference_loading():
     with open("".join([_base_path, "\\", _animal_id, "\\", "behavior_config"]), "rb") as f:
         _config = pkl.load(f)
 
-    _analog = np.load("".join([_base_path, "\\", _animal_id, "\\", "analog.npy"]))
+    _analog = np.load("".join([_base_path, "\\", _animal_id, "\\", "analog.npy"]), mmap_mode="r")
 
-    _digital = np.load("".join([_base_path, "\\", _animal_id, "\\", "digital.npy"]))
+    # (channels, samples) lines whether saved as read or packed (digital_packed.npy)
+    _digital = load_digital("".join([_base_path, "\\", _animal_id, "\\", "digital.npy"]))
 
-    _state = np.load("".join([_base_path, "\\", _animal_id, "\\", "state.npy"]))
+    _metadata = np.load("".join([_base_path, "\\", _animal_id, "\\", "metadata.npy"]))
+
+    with open("".join([_base_path, "\\", _animal_id, "\\", "metadata_codes"]), "rb") as f:
+        _metadata_codes = pkl.load(f)
 
     _cam_1_meta = np.genfromtxt("".join([_base_path, "\\", _animal_id, "\\", "_cam1__meta.txt"]), delimiter=",", dtype=int)
 
-    _cam_1_Frames = np.fromfile("".join([_base_path, "\\", _animal_id, "\\", "_cam1__Frame.npy"]), dtype=np.uint8)
+    # Any recording format (encoded _Video.avi by default, chunked _Frame_0000.npy, ... or _MJPEG.bin) as gray frames
+    _cam_1_source = frame_source("".join([_base_path, "\\", _animal_id, "\\", "_cam1_"]))
+
+    _cam_1_Frames = read_frames(_cam_1_source, 0, _cam_1_source["frames"])
 
-    _cam_1_Frames = _cam_1_Frames.reshape(_cam_1_meta[0], _cam_1_meta[1], _cam_1_meta[2])
+    assert(_cam_1_Frames.shape == (_cam_1_meta[0], _cam_1_meta[1], _cam_1_meta[2]))
 
     _cam_1_FrameIDs = np.load("".join([_base_path, "\\", _animal_id, "\\", "_cam1__FramesIDs.npy"]))
 
@@ -31,9 +40,12 @@ def test_data_burrow_preference_loading():
 
     _cam_2_meta = np.genfromtxt("".join([_base_path, "\\", _animal_id, "\\", "_cam2__meta.txt"]), delimiter=",", dtype=int)
 
-    _cam_2_Frames = np.fromfile("".join([_base_path, "\\", _animal_id, "\\", "_cam2__Frame.npy"]), dtype=np.uint8)
+    # Any recording format (encoded _Video.avi by default, chunked _Frame_0000.npy, ... or _MJPEG.bin) as gray frames
+    _cam_2_source = frame_source("".join([_base_path, "\\", _animal_id, "\\", "_cam2_"]))
+
+    _cam_2_Frames = read_frames(_cam_2_source, 0, _cam_2_source["frames"])
 
-    _cam_2_Frames = _cam_2_Frames.reshape(_cam_2_meta[0], _cam_2_meta[1], _cam_2_meta[2])
+    assert(_cam_2_Frames.shape == (_cam_2_meta[0], _cam_2_meta[1], _cam_2_meta[2]))
 
     _cam_2_FrameIDs = np.load("".join([_base_path, "\\", _animal_id, "\\", "_cam2__FramesIDs.npy"]))
 
@@ -42,4 +54,5 @@ def test_data_burrow_preference_loading():
     with open("".join([_base_path, "\\", _animal_id, "\\", "hardware_config"]), "rb") as f:
         _hardware = pkl.load(f)
 
-    _daq_catch_times = np.load("".join([_base_path, "\\", _animal_id, "\\", "daq_catch_times.npy"]))
+    with open("".join([_base_path, "\\", _animal_id, "\\", "latency_report.txt"]), "r") as f:
+        _latency_report = f.read()
@@ -1,6 +1,7 @@
 from BurrowPreferenceTask.BurrowPreferenceMachine import BurrowPreferenceTask
 from TestingModules.testing_utility_functions import load_pickle_from_file
 from os import getcwd
+from time import process_time, sleep
 
 
 def test_run_burrow_preference_machine():
@@ -46,3 +47,69 @@ def test_burrow_preference_machine_vars():
     assert(BPT.habituation_duration == Config.habituation_duration)
     assert(BPT.behavior_duration == Config.behavior_duration)
     assert(BPT.animal_id == Config.animal_id)
+
+
+def test_burrow_preference_machine_scheduling():
+    """
+    This function assess that the Burrow Preference Machine sleeps between stage deadlines & only graduates in sync
+    with a DAQ buffer
+
+    :rtype: None
+    """
+    Config = load_pickle_from_file("".join([getcwd(), "\\TestingModules\\", "Test_Mouse_BPT.pkl"]))
+    BPT = BurrowPreferenceTask(Config)
+    BPT.retract_duration = 0.5
+    BPT.start()
+    BPT.start_run = True
+    BPT.proceed_sync = True
+    BPT.proceed_sync = False
+    while BPT.state != "Retract":
+        continue
+    _cpu_time = process_time()
+    sleep(1.0)  # Retraction ends & no buffer syncs
+    assert(process_time() - _cpu_time < 0.1)
+    assert(BPT.state == "Retract")
+    BPT.proceed_sync = True
+    BPT.proceed_sync = False
+    while BPT.state != "Habituation":
+        continue
+    assert(BPT.hab_start - BPT.retract_end < 1.0)
+    BPT.state = "End"
+    BPT.saving_complete = True
+
+
+def test_burrow_preference_machine_sample_clock():
+    """
+    This function assess that stages driven by the DAQ sample count begin at exact buffer boundaries
+
+    :rtype: None
+    """
+    Config = load_pickle_from_file("".join([getcwd(), "\\TestingModules\\", "Test_Mouse_BPT.pkl"]))
+    BPT = BurrowPreferenceTask(Config)
+    BPT.use_sample_clock(1000)
+    BPT.start()
+    BPT.start_run = True
+    _transitions = []
+    _samples = 0
+    while BPT.state != "Saving":
+        BPT.proceed_sync = True
+        _state = BPT.state
+        BPT.update_sample_clock(_samples)
+        if BPT.state != _state:
+            _transitions.append((BPT.state, _samples))  # samples of the buffer that triggered the transition
+        BPT.proceed_sync = False
+        _samples += 100
+    BPT.saving_complete = True
+    BPT.join()
+    _retract = 0  # start_run was set before the first buffer
+    _habituation = _retract + BPT.retract_duration * 1000
+    _release = _habituation + int(Config.habituation_duration * 1000)
+    _preference = _release + BPT.release_duration * 1000
+    _saving = _preference + int(Config.behavior_duration * 1000)
+    assert(_transitions == [("Retract", _retract), ("Habituation", _habituation), ("Release", _release),
+                            ("PreferenceTest", _preference), ("Saving", _saving)])
+    assert(BPT.retract_start == _retract / 1000)
+    assert(BPT.hab_start == _habituation / 1000)
+    assert(BPT.release_start == _release / 1000)
+    assert(BPT.pref_start == _preference / 1000)
+    assert(BPT.state == "End")
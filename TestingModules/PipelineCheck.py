@@ -0,0 +1,25 @@
+from GenericModules.PipelineModule import BufferPipeline
+from time import sleep
+
+
+def test_buffer_pipeline():
+    """
+    This tests that a saturated pipeline never blocks the producer & still processes every buffer in order
+
+    :rtype: None
+    """
+    _processed = []
+
+    def _slow_processing(Index):
+        sleep(0.001)
+        _processed.append(Index)
+
+    BP = BufferPipeline(_slow_processing, 100, QueueSize=4)
+    BP.start()
+    for _index in range(1, 101):
+        BP.submit(_index)
+    BP.stop()
+    assert(_processed == list(range(1, 101)))
+    assert(BP.dropped_buffers > 0)
+    assert(BP.max_queue_depth <= 4)
+    assert(BP.report()["processed_buffers"] == 100)
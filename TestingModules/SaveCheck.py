@@ -0,0 +1,173 @@
+from GenericModules.SaveModule import StreamingSaver, MemmapSaver, FrameStore, frame_chunks, JPEGStore, \
+    jpeg_frame, digital_store, PackedDigital, load_digital, \
+    DigitalEdges
+from GenericModules.BufferModule import SlotRing
+from tempfile import TemporaryDirectory
+from os import path
+import numpy as np
+
+
+def test_streaming_saver():
+    """
+    This tests that streamed buffers load as the (channels, samples) session Saver used to write
+
+    :rtype: None
+    """
+    _buffers = [np.random.rand(100, 4) for _ in range(25)]
+    with TemporaryDirectory() as _directory:
+        SS = StreamingSaver((100, 4), np.float64, BlockSize=8192)
+        SS.filename = path.join(_directory, "analog.npy")
+        SS.start()
+        for _buffer in _buffers:
+            SS.put(_buffer)
+        assert(SS.timeToSave() is True)
+        _analog = np.load(SS.filename)
+        assert(_analog.shape == (4, 2500))
+        assert(np.array_equal(_analog, np.concatenate(_buffers, axis=0).T))
+        assert(SS.num_buffers == 25)
+
+
+def test_memmap_saver():
+    """
+    This tests that memory-mapped sessions grow past their preallocation & reopen with mmap_mode='r'
+
+    :rtype: None
+    """
+    _buffers = [np.random.rand(100, 4) for _ in range(7)]
+    with TemporaryDirectory() as _directory:
+        MS = MemmapSaver(path.join(_directory, "analog.npy"), (100, 4), np.float64, 3, 2)
+        for _buffer in _buffers:
+            MS.put(MS.write(_buffer))
+        assert(MS.capacity == 7)
+        assert(MS.timeToSave() is True)
+        _analog = np.load(MS.filename, mmap_mode="r")
+        assert(_analog.shape == (4, 700))
+        assert(np.array_equal(_analog, np.concatenate(_buffers, axis=0).T))
+        del _analog
+
+
+def test_frame_store():
+    """
+    This tests that frames written to the chunked frame store reopen in order with their parallel IDs
+
+    :rtype: None
+    """
+    _frames = np.random.randint(0, 255, (25, 12, 16), dtype=np.uint8)
+    with TemporaryDirectory() as _directory:
+        FS = FrameStore(path.join(_directory, "_cam1_"), (12, 16), 10.0, ChunkDuration=1.0, ExpectedDuration=1.0)
+        for _frame_number, _frame in enumerate(_frames):
+            FS.write(_frame, _frame_number // 10, _frame_number * 3)
+        FS.close()
+        assert(FS.filenames.__len__() == 3)
+        _chunks = frame_chunks(path.join(_directory, "_cam1_"))
+        assert([_chunk.shape[0] for _chunk in _chunks] == [10, 10, 5])
+        assert(np.array_equal(np.concatenate(_chunks, axis=0), _frames))
+        assert(FS.frame_ids.data.tolist() == [_frame_number // 10 for _frame_number in range(25)])
+        assert(FS.buffer_ids.data.dtype == np.int64)
+        assert(np.array_equal(FS.buffer_ids.data, np.arange(25) * 3))
+        del _chunks
+
+
+def test_jpeg_store():
+    """
+    This tests that variable-length payloads are recovered through the frame-offset index
+
+    :rtype: None
+    """
+    _payloads = [np.random.randint(0, 255, (1, np.random.randint(1, 500)), dtype=np.uint8) for _ in range(20)]
+    with TemporaryDirectory() as _directory:
+        JS = JPEGStore(path.join(_directory, "_cam2_"), (480, 640, 3), 30.0, ExpectedDuration=0.2)
+        for _frame_number, _payload in enumerate(_payloads):
+            JS.write(_payload, 2, _frame_number)
+        JS.close()
+        _container = np.memmap(JS.filename, dtype=np.uint8, mode="r")
+        _index = np.load(JS.index_filename)
+        assert(_index.shape == (20, ))
+        assert(_container.shape[0] == JS.bytes_written == sum(_payload.size + 4 for _payload in _payloads))
+        for _frame_number in (0, 7, 19):
+            assert(np.array_equal(jpeg_frame(_container, _index, _frame_number), _payloads[_frame_number][0]))
+        assert(JS.frame_ids.data.tolist() == [2] * 20)
+        del _container
+
+
+def test_packed_digital():
+    """
+    This tests that packed digital lines unpack to the lines as read, whole or one channel at a time
+
+    :rtype: None
+    """
+    _buffers = [np.random.randint(0, 2, (100, 3), dtype=np.uint8) for _ in range(9)]
+    _lines = np.concatenate(_buffers, axis=0).T
+    with TemporaryDirectory() as _directory:
+        for _storage in ("stream", "memmap"):
+            _filename = path.join(_directory, "".join([_storage, ".npy"]))
+            _buffer, _saver = digital_store(_storage, "packed", _filename, (100, 3), np.uint8, 4, 2, 3)
+            _saver.start()
+            for _read in _buffers:
+                _saver.put(_buffer.write(_read))
+            # Only a ring of the newest buffers as read is kept
+            assert(isinstance(_buffer, SlotRing) and _buffer.ring.shape == (3, 100, 3))
+            assert(np.array_equal(_buffer.slot(-1), _buffers[-1]))
+            assert(_saver.timeToSave() is True)
+            assert(not path.exists(_filename))
+            assert(path.getsize(path.join(_directory, "".join([_storage, "_packed.npy"]))) < 4096 + _lines.size // 7)
+            PD = PackedDigital(_filename)
+            assert(PD.__len__() == 900)
+            assert(np.array_equal(PD.unpack(), _lines))
+            assert(np.array_equal(PD.unpack(150, 437), _lines[:, 150:437]))
+            assert(np.array_equal(PD.channel(1), _lines[1]))
+            assert(np.array_equal(PD.channel(2, 150, 437), _lines[2, 150:437]))
+            assert(np.array_equal(load_digital(_filename), _lines))
+            del PD
+
+        # Single lines (gate trigger) & unpacked storage
+        _buffer, _saver = digital_store("stream", "packed", path.join(_directory, "gate.npy"), (100, ), np.uint8, 4)
+        _saver.start()
+        for _read in _buffers:
+            _saver.put(_buffer.write(_read[:, 0]))
+        _saver.timeToSave()
+        assert(np.array_equal(PackedDigital(path.join(_directory, "gate.npy")).channel(0, 95, 205), _lines[0, 95:205]))
+        _buffer, _saver = digital_store("stream", "lines", path.join(_directory, "lines.npy"), (100, 3), np.uint8, 4)
+        _saver.start()
+        for _read in _buffers:
+            _saver.put(_buffer.write(_read))
+        _saver.timeToSave()
+        assert(np.array_equal(np.load(path.join(_directory, "lines.npy")), _lines))
+        assert(np.array_equal(load_digital(path.join(_directory, "lines.npy")), _lines))
+
+
+def test_digital_edges():
+    """
+    This tests that edge-encoded lines expand back to the dense lines & intervals, across buffer boundaries
+
+    :rtype: None
+    """
+    _lines = np.zeros((2, 1000), dtype=np.uint8)
+    _lines[0, 0:7] = 1  # high from the first sample
+    _lines[0, 95:230] = 1  # spans buffer boundaries
+    _lines[0, 400:401] = 1
+    _lines[0, 990:] = 1  # still high at the end
+    _lines[1, 100:200] = 1  # edges exactly on buffer boundaries
+    with TemporaryDirectory() as _directory:
+        _filename = path.join(_directory, "licks.npy")
+        _buffer, _saver = digital_store("stream", "edges", _filename, (100, 2), np.uint8, 10)
+        _saver.start()
+        for _read in np.split(_lines.T, 10):
+            _saver.put(_buffer.write(_read))
+        assert(_saver.timeToSave() is True)
+        DE = DigitalEdges.load(_filename)
+        assert(DE.__len__() == 1000)
+        assert(DE.edges(0)[0].tolist() == [0, 95, 400, 990] and DE.edges(0)[1].tolist() == [7, 230, 401])
+        assert(DE.edges(1)[0].tolist() == [100] and DE.edges(1)[1].tolist() == [200])
+        assert(DE.intervals(0).tolist() == [[0, 7], [95, 230], [400, 401], [990, 1000]])
+        assert(DE.intervals(0, 100, 995).tolist() == [[100, 230], [400, 401], [990, 995]])
+        assert(np.array_equal(DE.dense(0), _lines[0]))
+        assert(np.array_equal(DE.dense(1, 150, 450), _lines[1, 150:450]))
+
+        assert(np.array_equal(DE.unpack(), _lines))
+        assert(np.array_equal(DE.unpack(150, 450), _lines[:, 150:450]))
+        assert(np.array_equal(load_digital(_filename), _lines))
+        # Only a ring of the newest buffers as read is kept, whatever the storage
+        _buffer, _saver = digital_store("memmap", "edges", _filename, (100, 2), np.uint8, 4, 2, 3)
+        assert(isinstance(_buffer, SlotRing) and _buffer.ring.shape == (3, 100, 2))
+        assert(not path.exists(path.join(_directory, "licks_lines.npy")))
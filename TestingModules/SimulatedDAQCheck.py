@@ -0,0 +1,59 @@
+from GenericModules import SimulatedDAQ
+from GenericModules.SimulatedDAQ import Task, int32, pulse_train, steps, DAQmx_Val_RSE, DAQmx_Val_Volts, \
+    DAQmx_Val_Rising, DAQmx_Val_ContSamps, DAQmx_Val_Acquired_Into_Buffer, DAQmx_Val_GroupByChannel, \
+    DAQmx_Val_ChanPerLine
+from ctypes import byref
+import numpy as np
+
+
+class _SimulatedAcquisition(Task):
+    def __init__(self):
+        Task.__init__(self)
+        self.analog = np.zeros((2, 100), dtype=np.float64)
+        self.digital = np.zeros((2, 100), dtype=np.uint8)
+        self.reads = int32()
+        self.buffers = []
+        self.licks = Task()
+        self.licks.CreateDIChan("Sim/port0/line0:1", "Licks", DAQmx_Val_ChanPerLine)
+        self.CreateAIVoltageChan("Sim/ai0:1", "Analog In", DAQmx_Val_RSE, -10.0, 10.0, DAQmx_Val_Volts, None)
+        self.CfgSampClkTiming("", 1000, DAQmx_Val_Rising, DAQmx_Val_ContSamps, 100)
+        self.AutoRegisterEveryNSamplesEvent(DAQmx_Val_Acquired_Into_Buffer, 100, 0, name='EveryNCallback')
+
+    def EveryNCallback(self):
+        self.ReadAnalogF64(100, 10.0, DAQmx_Val_GroupByChannel, self.analog, 200, byref(self.reads), None)
+        self.licks.ReadDigitalLines(100, 10.0, DAQmx_Val_GroupByChannel, self.digital, 200, None, None, None)
+        self.buffers.append((self.analog.copy(), self.digital.copy()))
+        return 0
+
+
+def test_simulated_daq():
+    """
+    This tests that scripted waveforms reach analog & digital reads aligned to the virtual sample clock
+
+    :rtype: None
+    """
+    SimulatedDAQ.device.reset()
+    SimulatedDAQ.device.mode = "manual"
+    SimulatedDAQ.device.script("Sim/ai1", steps((0.0, 0.25), (0.0, 4.9)))  # motor position
+    SimulatedDAQ.device.script("Sim/port0/line1", pulse_train(0.125, 0.02))  # licks at 8 Hz
+    DAQ = _SimulatedAcquisition()
+    DAQ.StartTask()
+    SimulatedDAQ.device.step(10)
+    DAQ.StopTask()
+    assert(DAQ.reads.value == 100)
+    assert(SimulatedDAQ.device.time() == 1.0)
+    _analog = np.concatenate([_buffer[0] for _buffer in DAQ.buffers], axis=1)
+    _digital = np.concatenate([_buffer[1] for _buffer in DAQ.buffers], axis=1)
+    assert(np.all(_analog[0] == 0))
+    assert(np.flatnonzero(_analog[1])[0] == 250)
+    assert(_digital[0].sum() == 0)
+    assert(_digital[1].sum() == 8 * 20)
+
+    SimulatedDAQ.device.reset()
+    SimulatedDAQ.device.mode = "fast"
+    DAQ = _SimulatedAcquisition()
+    DAQ.StartTask()
+    while DAQ.buffers.__len__() < 72000:  # 2 hours
+        pass
+    DAQ.StopTask()
+    assert(SimulatedDAQ.device.time() >= 7200.0)
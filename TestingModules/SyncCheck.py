@@ -0,0 +1,34 @@
+from GenericModules.SyncModule import FrameSyncTable
+from GenericModules.MetadataModule import buffer_record_dtype
+from tempfile import TemporaryDirectory
+from os import path
+import numpy as np
+
+
+def test_frame_sync_table():
+    """
+    This tests frame to sample interpolation & nearest-frame lookups across cameras
+
+    :rtype: None
+    """
+    # 1 kHz sampling, 100 sample buffers & callbacks 2 ms after each buffer completes
+    Records = np.zeros(31, dtype=buffer_record_dtype)
+    Records["buffer"] = np.arange(31)
+    Records["timestamp"] = np.arange(31) * 100000000 + 2000000
+    Records["timestamp"][0] = 0  # placeholder
+    FST = FrameSyncTable.from_records(Records, 100, 1000)
+    _cam1 = FST.add_camera("cam1", np.arange(90) * 33333333 + 2000000)
+    _cam2 = FST.add_camera("cam2", np.arange(30) * 100000000 + 52000000)
+    assert(_cam1.dtype == np.int64)
+    assert(np.all(np.diff(_cam1) >= 0))
+    assert(FST.frame_to_sample("cam1", 3) == 100)
+    assert(FST.frame_to_sample("cam2", 10) == 1050)
+    assert(FST.sample_to_frames(1000) == {"cam1": 30, "cam2": 9})
+    assert(FST.sample_to_frame("cam2", 10 ** 9) == 29)
+    assert(FST.frames_between("cam1", 1000, 2000) == slice(30, 60))
+    with TemporaryDirectory() as _directory:
+        _filename = path.join(_directory, "frame_sync.npz")
+        FST.save(_filename)
+        _loaded = FrameSyncTable.load(_filename)
+    assert(np.array_equal(_loaded.cameras["cam2"], _cam2))
+    assert(_loaded.sampling_rate == 1000)
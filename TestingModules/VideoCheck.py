@@ -0,0 +1,53 @@
+from GenericModules.VideoModule import VideoEncoder
+from tempfile import TemporaryDirectory
+from os import path
+import cv2 as cv
+import numpy as np
+import pytest
+
+
+def test_video_encoder():
+    """
+    This tests that frames encoded in the background decode losslessly with their parallel IDs
+
+    :rtype: None
+    """
+    _frames = np.random.randint(0, 255, (30, 48, 64), dtype=np.uint8)
+    with TemporaryDirectory() as _directory:
+        VE = VideoEncoder(path.join(_directory, "_cam1_"), (48, 64), 30.0, ExpectedDuration=0.5, QueueSize=4)
+        for _frame_number, _frame in enumerate(_frames):
+            VE.write(_frame, 1, _frame_number)
+        VE.close()
+        assert(VE.encoded_frames == 30)
+        assert(np.array_equal(VE.buffer_ids.data, np.arange(30)))
+        _video = cv.VideoCapture(VE.filename)
+        _decoded = []
+        while True:
+            _ret, _frame = _video.read()
+            if not _ret:
+                break
+            _decoded.append(_frame[:, :, 0])
+        _video.release()
+        assert(np.array_equal(np.array(_decoded), _frames))
+
+
+def test_video_encoder_failure():
+    """
+    This tests that a writer failing to open surfaces its error from write & close instead of hanging the capture loop
+
+    :rtype: None
+    """
+    _frame = np.zeros((48, 64), dtype=np.uint8)
+    with TemporaryDirectory() as _directory:
+        for _backend, _codec in (("opencv", "FFV1"), ("imageio", "ffv1")):
+            # The folder does not exist, so neither backend can open its file
+            VE = VideoEncoder(path.join(_directory, "missing", "_cam1_"), (48, 64), 30.0, Backend=_backend,
+                              Codec=_codec, ExpectedDuration=0.5, QueueSize=2)
+            with pytest.raises(IOError):
+                for _frame_number in range(100):
+                    VE.write(_frame, 1, _frame_number)
+            assert(VE.error is not None)
+            assert(not VE.is_alive())
+            assert(VE.encoded_frames == 0)
+            with pytest.raises(IOError):
+                VE.close()
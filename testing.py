@@ -4,6 +4,7 @@ import pytest
 
 # General Duties Imports
 from os import getcwd
+from GenericModules import DAQBackend
 
 # Import Tests
 from TestingModules.testing_utility_functions import load_pickle_from_file
@@ -11,7 +12,8 @@ from TestingModules.CleanUpTests import clean_up_test, pre_clean_test
 
 # Burrow Preference
 from TestingModules.TypeCheck import test_burrow_preference_config
-from TestingModules.MachineCheck import test_run_burrow_preference_machine, test_burrow_preference_machine_vars
+from TestingModules.MachineCheck import test_run_burrow_preference_machine, test_burrow_preference_machine_vars, \
+    test_burrow_preference_machine_scheduling, test_burrow_preference_machine_sample_clock
 from TestingModules.DAQCheck import test_daq_burrow_preference, test_daq_burrow_preference_acquisition, \
     test_daq_burrow_preference_runtime
 
@@ -19,6 +21,23 @@ from TestingModules.DAQCheck import test_daq_burrow_preference, test_daq_burrow_
 from TestingModules.TypeCheck import test_lick_training_config
 from TestingModules.DAQCheck import test_daq_lick, test_daq_lick_acquisition, test_daq_lick_runtime
 
+# Generic Modules
+from TestingModules.BufferCheck import test_session_buffer_growth, test_session_buffer_samples, test_buffer_records, \
+    test_shared_frame_ring, test_slot_ring
+from TestingModules.SaveCheck import test_streaming_saver, test_memmap_saver, test_frame_store, \
+    test_jpeg_store, test_packed_digital, test_digital_edges
+from TestingModules.VideoCheck import test_video_encoder, test_video_encoder_failure
+from TestingModules.CameraCheck import test_camera_process_defaults
+from TestingModules.FrameCheck import test_roi_binning, test_motion_energy
+from TestingModules.FeatureCheck import test_feature_extraction
+from TestingModules.SyncCheck import test_frame_sync_table
+from TestingModules.PipelineCheck import test_buffer_pipeline
+from TestingModules.SimulatedDAQCheck import test_simulated_daq
+from TestingModules.LatencyCheck import test_latency_histogram, test_callback_instrumentation, \
+    test_rate_counter, test_frame_timing
+from TestingModules.AcquisitionCheck import test_zero_copy_callbacks, test_raw_analog, test_pack_session
+from TestingModules.ContainerCheck import test_session_container
+
 
 # Delete existing test directory if exists
 pre_clean_test("".join([getcwd(), "//TestingModules//Data"]))
@@ -30,6 +49,10 @@ test_run_burrow_preference_machine()
 
 test_burrow_preference_machine_vars()
 
+test_burrow_preference_machine_scheduling()
+
+test_burrow_preference_machine_sample_clock()
+
 test_daq_burrow_preference()
 
 test_daq_burrow_preference_acquisition()
@@ -45,5 +68,66 @@ test_daq_lick_acquisition()
 
 test_daq_lick_runtime()
 
+# Generic Modules
+test_session_buffer_growth()
+
+test_slot_ring()
+
+test_session_buffer_samples()
+
+test_buffer_records()
+
+test_shared_frame_ring()
+
+test_streaming_saver()
+
+test_memmap_saver()
+
+test_frame_store()
+
+test_jpeg_store()
+
+test_packed_digital()
+
+test_digital_edges()
+
+test_video_encoder()
+
+test_video_encoder_failure()
+
+test_camera_process_defaults()
+
+test_buffer_pipeline()
+
+test_simulated_daq()
+
+test_latency_histogram()
+
+test_callback_instrumentation()
+
+test_rate_counter()
+
+test_frame_timing()
+
+test_session_container()
+
+test_frame_sync_table()
+
+test_roi_binning()
+
+test_motion_energy()
+
+test_feature_extraction()
+
+# Simulated DAQ (skipped unless DAQ_BACKEND=simulated)
+if DAQBackend.device is not None:
+    test_zero_copy_callbacks()
+
+    test_raw_analog()
+
+    test_pack_session()
+else:
+    print("Skipping acquisition checks: set DAQ_BACKEND=simulated to run them")
+
 # Clean up? which doesn't work hence above
 clean_up_test("".join([getcwd(), "//TestingModules//Data"]))